@@ -1,33 +1,80 @@
-import json, requests, re, typing, warnings
-from bs4 import XMLParsedAsHTMLWarning
-warnings.filterwarnings(action='ignore', category=XMLParsedAsHTMLWarning)
-from pyhamtools import LookupLib, Callinfo
-from pyhamtools.frequency import freq_to_band
-from tqdm import tqdm
-from datetime import datetime
+import re, typing, warnings, mmap, os, itertools, time, threading, logging
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
 
-from pymongo import MongoClient
-from config import LOG_LOCATION, MONGO_HOST, MONGO_PORT, QRZ_API_KEY, QRZ_PASSWORD, QRZ_USERNAME, WORK_ON_UNCONFIRMED_QSO
+from pymongo import MongoClient, UpdateOne, DeleteMany, ASCENDING
+from pymongo.collection import Collection
+from bson import ObjectId
+import static_data
+from db_stats import mongo_listeners
+from config import LOG_LOCATION, MONGO_HOST, MONGO_PORT, QRZ_API_KEY, QRZ_PASSWORD, QRZ_USERNAME, QRZ_LOGBOOK_URL, WORK_ON_UNCONFIRMED_QSO, ADIF_BATCH_SIZE
 
+# pyhamtools, requests, bs4 and tqdm are slow to import, so they are imported where they are used
+# and QRZ login happens the first time it's needed instead of when this module is imported
 call_info2 = None
-if QRZ_USERNAME:
-    lookup_lib2 = LookupLib(lookuptype='qrz', username=QRZ_USERNAME, pwd=QRZ_PASSWORD)
-    call_info2 = Callinfo(lookup_lib2)
-lookup_lib = LookupLib(filename='data/cty.plist')
-call_info = Callinfo(lookup_lib)
+call_info2_loaded = False
+call_info2_lock = threading.Lock()
 
-with open('data/countrytodxcc.json') as f:
-    country_to_dxcc: dict = json.load(f)
+def get_call_info():
+    return static_data.get()['call_info']
 
-mongo_client = MongoClient(MONGO_HOST, MONGO_PORT)
+def get_call_info2():
+    global call_info2, call_info2_loaded
+
+    if not QRZ_USERNAME:
+        return None
+
+    with call_info2_lock:
+        if not call_info2_loaded:
+            call_info2_loaded = True
+            from bs4 import XMLParsedAsHTMLWarning
+            warnings.filterwarnings(action='ignore', category=XMLParsedAsHTMLWarning)
+            from pyhamtools import LookupLib, Callinfo
+            try:
+                call_info2 = Callinfo(LookupLib(lookuptype='qrz', username=QRZ_USERNAME, pwd=QRZ_PASSWORD))
+            except KeyboardInterrupt as e:
+                raise e
+            except Exception as e:
+                logging.warning('Failed to login to QRZ: %s', e)
+        return call_info2
+
+mongo_client = MongoClient(MONGO_HOST, MONGO_PORT, event_listeners=mongo_listeners())
 
 db = mongo_client.wsjt
 done_coll = db[f'black_{QRZ_USERNAME}']
+sync_coll = db.sync
+
+# Fields of ADIF that are used when importing log
+ADIF_COLUMNS = [
+    'CALL',
+    'BAND',
+    'FREQ',
+    'MODE',
+    'QSO_DATE',
+    'TIME_ON',
+    'QSO_DATE_OFF',
+    'TIME_OFF',
+    'GRIDSQUARE',
+    'DXCC',
+    'COUNTRY',
+    'CONT',
+    'STATE',
+    'CNTY',
+    'APP_QRZLOG_STATUS',
+    'APP_QRZLOG_LOGID',
+    'LOTW_QSL_SENT',
+    'LOTW_QSL_RCVD'
+]
 
 class AdifHeaderWithoutEOH(Exception):
     """Exception for header found, not terminated with <EOH>"""
     pass
 
+class QRZLogbookError(Exception):
+    """Exception for QRZ Logbook API not returning the log"""
+    pass
+
 def string_band_to_number(band: str) -> typing.Union[float, int]:
     if 'mm' in band.lower():
         band = band[:-2]
@@ -52,158 +99,553 @@ def is_confirmed(data: dict) -> bool:
     
     return False
 
+# Bytes that can follow a value whose length is counted in bytes
+VALUE_END = [b'', b' ', b'\t', b'\r', b'\n', b'<']
+
+def decode_value(adif_bytes: typing.Union[bytes, mmap.mmap], value_start: int, length: int) -> typing.Tuple[str, int]:
+    # Some loggers count the length in bytes and some in characters.
+    # Returns the value and where the value ends in bytes.
+    value_end = value_start + length
+    value = adif_bytes[value_start:value_end]
+    try:
+        value_str = value.decode()
+        if adif_bytes[value_end:value_end+1] in VALUE_END:
+            return value_str, value_end
+    except UnicodeDecodeError:
+        pass
+
+    # One character is at most 4 bytes in UTF-8, so only decode that much
+    value_str = adif_bytes[value_start:value_start+4*length].decode(errors='surrogateescape')[:length]
+    try:
+        return value_str, value_start + len(value_str.encode())
+    except UnicodeEncodeError:
+        # Not UTF-8, every character is one byte
+        return value.decode('latin-1'), value_end
+
+def _read_records(
+    adif_bytes: typing.Union[bytes, mmap.mmap],
+    final: bool,
+    qso: typing.Dict[str, str],
+    headers: typing.Dict[str, str],
+    status: typing.Dict[str, bool],
+    emit: typing.Callable[[typing.Dict[str, str]], None],
+    wanted: typing.Optional[typing.Set[str]] = None
+    ) -> int:
+    # Call emit with every QSO that is complete in adif_bytes, qso is cleared afterwards so emit copies what it keeps.
+    # Only the fields in wanted are decoded, all of them if wanted is None. Header fields are always kept.
+    # If not final, stop at the first field that may continue in the next chunk and return where it starts.
+    cursor = 0
+    length_bytes = len(adif_bytes)
+    keep_all = wanted is None or (status['header'] and not status['eoh'])
+    while cursor < length_bytes:
+        tag_start = adif_bytes.find(b'<', cursor)
+        if tag_start < 0:
+            return length_bytes
+        tag_end = adif_bytes.find(b'>', tag_start)
+        if tag_end < 0:
+            return length_bytes if final else tag_start
+        tag = adif_bytes[tag_start+1:tag_end].split(b':')
+
+        if len(tag) == 1 and tag[0].upper() == b'EOR':
+            emit(qso)
+            qso.clear()
+            cursor = tag_end + 1
+            continue
+
+        if len(tag) == 1 and tag[0].upper() == b'EOH':
+            headers.update(qso)
+            status['eoh'] = True
+            keep_all = wanted is None
+            qso.clear()
+            cursor = tag_end + 1
+            continue
+
+        if len(tag) < 2 or not tag[0] or not tag[1].isdigit():
+            cursor = tag_start + 1
+            continue
+
+        length = int(tag[1])
+        if not final and tag_end + 4*length + 2 > length_bytes:
+            return tag_start
+        field = tag[0].upper().decode()
+        if keep_all or field in wanted:
+            qso[field], cursor = decode_value(adif_bytes, tag_end + 1, length)
+            continue
+        cursor = tag_end + 1 + length
+        if adif_bytes[cursor:cursor+1] not in VALUE_END:
+            # Skipped without decoding, unless the length may be in characters
+            _, cursor = decode_value(adif_bytes, tag_end + 1, length)
+
+    return cursor
+
+def _scan_adif(
+    chunks: typing.Iterable[typing.Union[bytes, str]],
+    headers: typing.Optional[typing.Dict[str, str]],
+    emit: typing.Callable[[typing.Dict[str, str]], None],
+    wanted: typing.Optional[typing.Set[str]] = None
+    ) -> typing.Iterator[None]:
+    # Call emit with every QSO as soon as it is complete, only keeping the unfinished part of the chunks.
+    # Yields after every chunk, so the caller can pass on what was emitted before reading the next one.
+    # The ADIF header fields are put in headers.
+    if headers is None:
+        headers = {}
+    qso: typing.Dict[str, str] = {}
+    status = {'eoh': False, 'header': False, 'started': False}
+
+    buffer = b''
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if not status['started']:
+            # Like ADIF file, input that doesn't start with a field has header
+            first_mo = re.match(rb'\s*(\S)', chunk)
+            if not first_mo:
+                continue
+            status['started'] = True
+            status['header'] = first_mo.group(1) != b'<'
+        buffer = buffer + chunk if buffer else chunk
+        cursor = _read_records(buffer, False, qso, headers, status, emit, wanted)
+        buffer = buffer[cursor:]
+        yield
+    _read_records(buffer, True, qso, headers, status, emit, wanted)
+    yield
+
+    if status['header'] and not status['eoh']:
+        raise AdifHeaderWithoutEOH()
+
+def iter_adif(
+    chunks: typing.Iterable[typing.Union[bytes, str]],
+    headers: typing.Optional[typing.Dict[str, str]] = None
+    ) -> typing.Iterator[typing.Dict[str, str]]:
+    # Yield every QSO with all of its fields as a dict, the import uses iter_columns instead
+    qsos: typing.List[typing.Dict[str, str]] = []
+    for _ in _scan_adif(chunks, headers, lambda qso: qsos.append(dict(qso))):
+        yield from qsos
+        qsos.clear()
+
+def iter_columns(
+    chunks: typing.Iterable[typing.Union[bytes, str]],
+    columns: typing.List[str] = ADIF_COLUMNS,
+    batch_size: int = ADIF_BATCH_SIZE,
+    headers: typing.Optional[typing.Dict[str, str]] = None
+    ) -> typing.Iterator[typing.Dict[str, np.ndarray]]:
+    # Scan the ADIF once and only keep the fields in columns, yield string columns of batch_size QSO.
+    # Set batch_size to 0 to get all QSO in one batch. Missing field is an empty string.
+    result: typing.Dict[str, list] = {k: [] for k in columns}
+    values = list(result.items())
+    count = result[columns[0]]
+
+    def emit(qso: typing.Dict[str, str]):
+        for k, v in values:
+            v.append(qso.get(k, ''))
+
+    def batch(size: int) -> typing.Dict[str, np.ndarray]:
+        arrays = {k: np.array(v[:size], dtype=str) for k, v in values}
+        for _, v in values:
+            del v[:size]
+        return arrays
+
+    for _ in _scan_adif(chunks, headers, emit, set(columns)):
+        while batch_size and len(count) >= batch_size:
+            yield batch(batch_size)
+    if count:
+        yield batch(len(count))
+
+def adif_file_chunks(filename: str, chunk_size: int = 1024*1024) -> typing.Iterator[bytes]:
+    # Read the ADIF file from mmap one chunk at a time, so the whole file is never copied to memory
+    if not os.path.getsize(filename):
+        return
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        for i in range(0, len(m), chunk_size):
+            yield m[i:i+chunk_size]
+
 def read_from_string(adif_bytes: typing.Union[bytes, str]):
-    # The ADIF file header keys and values, if any.
-    if isinstance(adif_bytes, str):
-        adif_bytes = adif_bytes.encode()
     adif_headers: typing.Dict[str, typing.Any] = {}
-    
-    header_field_re = re.compile(b'<((eoh)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
-    field_re = re.compile(b'<((eor)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
-    
-    qsos: typing.List[typing.Dict[str, typing.Any]] = []
-    cursor = 0
-    if adif_bytes[0] != b'<'[0] or re.search(b'<eoh>', adif_bytes, re.IGNORECASE):
-        # Input has ADIF header. Read all header fields.
-        eoh_found = False
-        while(not eoh_found):
-            header_field_mo = header_field_re.search(adif_bytes, cursor)
-            if header_field_mo:
-                if header_field_mo.group(2):
-                    eoh_found = True
-                    cursor = header_field_mo.end(0)
-                else:
-                    field = header_field_mo.group(3).upper()
-                    value_start = header_field_mo.end(0)
-                    value_end = value_start + int(header_field_mo.group(4))
-                    value = adif_bytes[value_start:value_end]
-                    adif_headers[field.decode()] = value.decode()
-                    cursor = value_end
-            else:
-                raise AdifHeaderWithoutEOH()
-                
-        
-    qso: typing.Dict[str, typing.Any] = {}
-    field_mo = field_re.search(adif_bytes, cursor)
-    while(field_mo):
-        if field_mo.group(2):
-            # <eor> found:
-            qsos.append(qso)
-            qso: typing.Dict[str, typing.Any] = {}
-            cursor = field_mo.end(0)
-        else:
-            # Field found:
-            field = field_mo.group(3).upper()
-            value_start = field_mo.end(0)
-            value_end = value_start + int(field_mo.group(4).decode())
-            try:
-                value = adif_bytes[value_start:value_end]
-                qso[field.decode()] = value.decode()
-            except:
-                value = (adif_bytes[value_start:].decode())[:value_end-value_start]
-                qso[field.decode()] = value
-            cursor = value_end
-        field_mo = field_re.search(adif_bytes, cursor)
+    qsos: typing.List[typing.Dict[str, typing.Any]] = list(iter_adif([adif_bytes], adif_headers))
 
     return (qsos, adif_headers)
 
-def main(data_str: str):
+def qrz_adif_chunks(chunks: typing.Iterable[bytes]) -> typing.Iterator[bytes]:
+    # QRZ Logbook API returns RESULT=OK&COUNT=...&ADIF=... with < and > escaped
+    buffer = b''
+    head = b''
+    adif_found = False
+    for chunk in chunks:
+        buffer += chunk
+        if not adif_found:
+            if len(head) < 1024:
+                head += chunk[:1024-len(head)]
+            adif_start = buffer.find(b'ADIF=')
+            if adif_start < 0:
+                buffer = buffer[-4:]
+                continue
+            adif_found = True
+            buffer = buffer[adif_start+5:]
+        # Don't cut &lt; or &gt; between chunks
+        cut = buffer.rfind(b'&', max(len(buffer)-3, 0))
+        if cut < 0:
+            cut = len(buffer)
+        yield buffer[:cut].replace(b'&lt;', b'<').replace(b'&gt;', b'>')
+        buffer = buffer[cut:]
 
-    data, _ = read_from_string(data_str)
+    if adif_found:
+        yield buffer.replace(b'&lt;', b'<').replace(b'&gt;', b'>')
+        return
 
-    for d in tqdm(data):
-        if d.get('MODE', None) not in ['FT8', 'FT4']:
-            continue
+    # No log is RESULT=FAIL with COUNT=0, anything else without ADIF is an error
+    result = parse_qs(head.decode(errors='replace'))
+    if result.get('RESULT', [''])[0] != 'OK' and result.get('COUNT', [''])[0] != '0':
+        raise QRZLogbookError(result.get('REASON', [head.decode(errors='replace')])[0])
 
-        confirmed = is_confirmed(d)
-        if WORK_ON_UNCONFIRMED_QSO and not confirmed:
-            continue
+def fetch_qrz_log(option: str = '', chunk_size: int = 64*1024) -> typing.Iterator[typing.Dict[str, np.ndarray]]:
+    # Yield batches of QSO columns from QRZ Logbook while it is still downloading
+    import requests
 
-        inserted_data = {
-            'QSOID': f'{d["QSO_DATE"]}{d["TIME_ON"][:4]}-{d["QSO_DATE_OFF"]}{d["TIME_OFF"][:4]}',
-            'timestamp': datetime.strptime(f'{d["QSO_DATE_OFF"]}{d["TIME_OFF"][:4]}+0000', '%Y%m%d%H%M%z').timestamp(),
-            'callsign': d['CALL'].replace('_', '/'),
-            'mode': d.get('MODE', 'FT8'),
-            'confirmed': confirmed
-        }
+    data = f'KEY={QRZ_API_KEY}&ACTION=FETCH'
+    if option:
+        data += f'&OPTION={option}'
+    try:
+        with requests.post(QRZ_LOGBOOK_URL, data=data, stream=True) as res:
+            if not res.ok:
+                raise QRZLogbookError(f'HTTP {res.status_code}')
+            yield from iter_columns(qrz_adif_chunks(res.iter_content(chunk_size)))
+    except requests.RequestException as e:
+        raise QRZLogbookError(str(e)) from e
+
+def sync_qrz_log(config: str = '', fetch: typing.Callable[[str], typing.Iterable[typing.Dict[str, np.ndarray]]] = fetch_qrz_log) -> typing.Dict[str, float]:
+    # Only get QSO modified since the last sync, in pages ordered by logid
+    # The position is saved after every page, so an interrupted sync continues where it stopped
+    # Everything is downloaded again if config is different from the last sync
+    sync_id = f'qrz_{QRZ_USERNAME}'
+    watermark = sync_coll.find_one({'_id': sync_id}) or {}
+    # Nothing to replace when starting from empty collection
+    replace_logid = bool(done_coll.estimated_document_count())
+    if not replace_logid or watermark.get('config', '') != config:
+        watermark = {}
+    create_indexes(done_coll)
+
+    # QRZ only compares the date, go one day back in case of different timezone
+    next_modsince = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+    modsince = watermark.get('modsince', None)
+    after_logid = watermark.get('after_logid', 0)
+
+    stats = {'qso': 0, 'round_trips': 0, 'seconds': 0, 'pages': 0}
+    start = time.perf_counter()
+    while True:
+        option = f'AFTERLOGID:{after_logid},MAX:{ADIF_BATCH_SIZE}'
+        if modsince:
+            option = f'MODSINCE:{modsince},{option}'
+        batches = list(fetch(option))
+        num_qso = sum(len(columns['CALL']) for columns in batches)
+        stats['pages'] += 1
+        if num_qso:
+            page_stats = main(batches, replace_logid)
+            stats['qso'] += page_stats['qso']
+            stats['round_trips'] += page_stats['round_trips']
+
+        logids = [int(logid) for columns in batches for logid in columns['APP_QRZLOG_LOGID'].tolist() if logid.isdigit()]
+        if not logids or num_qso < ADIF_BATCH_SIZE:
+            break
+        after_logid = max(logids)
+        sync_coll.update_one({'_id': sync_id}, {'$set': {'modsince': modsince, 'after_logid': after_logid, 'config': config}}, upsert=True)
+
+    sync_coll.update_one({'_id': sync_id}, {'$set': {'modsince': next_modsince, 'after_logid': 0, 'config': config}}, upsert=True)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def qsos_to_columns(qsos: typing.Iterable[typing.Dict[str, str]], columns: typing.List[str] = ADIF_COLUMNS) -> typing.Dict[str, np.ndarray]:
+    # For QSO that are already dicts, missing field is an empty string
+    result: typing.Dict[str, list] = {k: [] for k in columns}
+    for qso in qsos:
+        for k in columns:
+            result[k].append(qso.get(k, ''))
 
+    return {k: np.array(v, dtype=str) for k, v in result.items()}
+
+def read_columns(adif_bytes: typing.Union[bytes, str], columns: typing.List[str] = ADIF_COLUMNS) -> typing.Dict[str, np.ndarray]:
+    for batch in iter_columns([adif_bytes], columns, 0):
+        return batch
+    return {k: np.array([], dtype=str) for k in columns}
+
+def _to_float(values: np.ndarray) -> np.ndarray:
+    try:
+        return np.where(values == '', 'nan', values).astype(float)
+    except ValueError:
+        def parse(value: str) -> float:
+            try:
+                return float(value)
+            except ValueError:
+                return np.nan
+        return np.array([parse(v) for v in values], dtype=float)
+
+def convert_columns(columns: typing.Dict[str, np.ndarray]) -> typing.Dict[str, np.ndarray]:
+
+    result = {}
+
+    date_off = columns['QSO_DATE_OFF']
+    time_off = columns['TIME_OFF'].astype('U4')
+    result['valid'] = (np.char.str_len(date_off) == 8) & np.char.isdigit(date_off) & \
+        (np.char.str_len(time_off) == 4) & np.char.isdigit(time_off)
+
+    # Same as datetime.strptime(f'{QSO_DATE_OFF}{TIME_OFF[:4]}+0000', '%Y%m%d%H%M%z').timestamp()
+    date_int = np.where(result['valid'], date_off, '19700101').astype(np.int64)
+    time_int = np.where(result['valid'], time_off, '0000').astype(np.int64)
+    months = (date_int//10000 - 1970)*12 + date_int//100%100 - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + (date_int%100 - 1)
+    result['timestamp'] = (days.astype('datetime64[s]').astype(np.int64) + time_int//100*3600 + time_int%100*60).astype(float)
+
+    result['QSOID'] = np.char.add(
+        np.char.add(np.char.add(columns['QSO_DATE'], columns['TIME_ON'].astype('U4')), '-'),
+        np.char.add(date_off, time_off)
+    )
+    result['callsign'] = np.char.replace(columns['CALL'], '_', '/')
+
+    # Same as is_confirmed but for all QSO at once
+    result['confirmed'] = np.isin(columns['APP_QRZLOG_STATUS'], ['C', '']) | \
+        ((columns['LOTW_QSL_SENT'] == 'Y') & (columns['LOTW_QSL_RCVD'] == 'Y'))
+
+    # Band only need to be calculated once for every unique frequency
+    from pyhamtools.frequency import freq_to_band
+    band = np.empty(len(date_off), dtype=object)
+    frequencies, frequencies_index = np.unique(_to_float(columns['FREQ']), return_inverse=True)
+    frequencies_band = []
+    for f in frequencies:
         try:
-            inserted_data['band'] = freq_to_band(float(d['FREQ'])*1000)['band']
+            frequencies_band.append(freq_to_band(f*1000)['band'])
         except:
-            inserted_data['band'] = string_band_to_number(d['BAND'])
-            
-        if 'GRIDSQUARE' in d:
-            inserted_data['grid'] = d['GRIDSQUARE']
+            frequencies_band.append(None)
+    band[:] = np.array(frequencies_band, dtype=object)[frequencies_index.reshape(-1)]
+
+    no_band = np.equal(band, None)
+    if no_band.any():
+        bands, bands_index = np.unique(columns['BAND'][no_band], return_inverse=True)
+        bands_number = np.empty(len(bands), dtype=object)
+        bands_number[:] = [string_band_to_number(b) for b in bands]
+        band[no_band] = bands_number[bands_index.reshape(-1)]
+    result['band'] = band
+
+    result['dxcc'] = np.where(columns['DXCC'] == '', '0', columns['DXCC']).astype(np.int64)
+    result['county'] = np.array([c[3:] for c in columns['CNTY']], dtype=str)
+
+    return result
+
+def create_indexes(collection: Collection):
+    collection.create_index([('callsign', ASCENDING), ('band', ASCENDING), ('QSOID', ASCENDING)])
+    collection.create_index('logid')
+
+def copy_logged(collection: Collection, since: ObjectId):
+    # QSO logged by receiver have no QRZ logid
+    for d in done_coll.find({'_id': {'$gte': since}, 'logid': {'$exists': False}}):
+        collection.replace_one({'_id': d['_id']}, d, upsert=True)
+
+def replace_log(data: typing.Union[bytes, str, typing.Iterable[typing.Dict[str, np.ndarray]]]) -> typing.Dict[str, float]:
+    # Import into a staging collection and swap it with done_coll at once
+    # Receiver keeps seeing the old log while importing, and still has it if the import fails
+    start = ObjectId()
+    staging_coll = db[f'{done_coll.name}_staging']
+    staging_coll.drop()
+    create_indexes(staging_coll)
+
+    try:
+        stats = main(data, collection=staging_coll)
+
+        # QSO logged by receiver while importing may not be in the log yet
+        copied = ObjectId()
+        copy_logged(staging_coll, start)
+        # Copy again right before the swap, only what was logged while copying
+        # QSO logged between this copy and the rename is still lost, it comes back with the next import or sync
+        copy_logged(staging_coll, copied)
+
+        staging_coll.rename(done_coll.name, dropTarget=True)
+    except:
+        staging_coll.drop()
+        raise
+
+    return stats
+
+def main(
+        data: typing.Union[bytes, str, typing.Iterable[typing.Dict[str, np.ndarray]]],
+        replace_logid: bool = False,
+        collection: typing.Optional[Collection] = None
+    ) -> typing.Dict[str, float]:
+    # data is the ADIF, or batches of columns from iter_columns
+
+    if isinstance(data, (bytes, str)):
+        data = iter_columns([data])
+
+    stats = {'qso': 0, 'round_trips': 0, 'seconds': 0}
+    locations = {}
+    us_states = {}
+    start = time.perf_counter()
+
+    from tqdm import tqdm
+
+    with tqdm(unit='QSO') as progress:
+        for columns in data:
+            num_qso, round_trips = import_columns(columns, locations, us_states, replace_logid, collection)
+            stats['qso'] += num_qso
+            stats['round_trips'] += round_trips
+            progress.update(len(columns['CALL']))
+
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def get_callsign_location(callsign: str) -> dict:
+    try:
+        return get_call_info().get_all(callsign)
+    except:
+        call_info2 = get_call_info2()
+        if call_info2:
+            try:
+                return call_info2.get_all(callsign)
+            except:
+                pass
+    return {}
+
+def get_callsign_state(callsign: str) -> dict:
+    call_info2 = get_call_info2()
+    if call_info2:
         try:
-            location_data = call_info.get_all(d['CALL'])
+            return call_info2.get_all(callsign)
         except:
-            if call_info2:
-                try:
-                    location_data = call_info2.get_all(d['CALL'])
-                except:
-                    location_data = {}
-
-        if 'COUNTRY' in d:
-            inserted_data['country'] = d['COUNTRY']
+            pass
+    return {}
+
+def import_columns(
+        columns: typing.Dict[str, np.ndarray],
+        locations: typing.Optional[typing.Dict[str, dict]] = None,
+        us_states: typing.Optional[typing.Dict[str, dict]] = None,
+        replace_logid: bool = False,
+        collection: typing.Optional[Collection] = None
+    ) -> typing.Tuple[int, int]:
+    # Returns the number of QSO written and the number of round trips to database
+    # locations and us_states cache the lookup of every callsign, pass the same dicts to share them between batches
+    # Set replace_logid when merging modified QSO, the old version with the same QRZ logid is deleted
+    # Writes to done_coll if collection is not given
+    if locations is None:
+        locations = {}
+    if us_states is None:
+        us_states = {}
+    if collection is None:
+        collection = done_coll
+    country_to_dxcc = static_data.get()['country_to_dxcc']
+
+    converted = convert_columns(columns)
+
+    selected = converted['valid'] & np.isin(columns['MODE'], ['FT8', 'FT4'])
+    if WORK_ON_UNCONFIRMED_QSO:
+        selected &= converted['confirmed']
+    selected_index = np.flatnonzero(selected)
+
+    # Only convert the selected rows to python objects, pymongo can't encode numpy types
+    rows = {k: v[selected_index].tolist() for k, v in columns.items()}
+    rows.update({k: v[selected_index].tolist() for k, v in converted.items()})
+
+    # Same QSO can appear more than once in a log, merge them like consecutive $set would do
+    documents: typing.Dict[tuple, dict] = {}
+    for i in range(len(selected_index)):
+        inserted_data = {
+            'QSOID': rows['QSOID'][i],
+            'timestamp': rows['timestamp'][i],
+            'callsign': rows['callsign'][i],
+            'mode': rows['MODE'][i],
+            'confirmed': rows['confirmed'][i],
+            'band': rows['band'][i]
+        }
+
+        if rows['GRIDSQUARE'][i]:
+            inserted_data['grid'] = rows['GRIDSQUARE'][i]
+        if rows['APP_QRZLOG_LOGID'][i].isdigit():
+            inserted_data['logid'] = int(rows['APP_QRZLOG_LOGID'][i])
+
+        callsign = rows['CALL'][i]
+        location_data = {}
+        if not (rows['COUNTRY'][i] and rows['CONT'][i]):
+            if callsign not in locations:
+                locations[callsign] = get_callsign_location(callsign)
+            location_data = locations[callsign]
+
+        if rows['COUNTRY'][i]:
+            inserted_data['country'] = rows['COUNTRY'][i]
         elif location_data:
             inserted_data['country'] = location_data['country']
 
         if inserted_data.get('country', None) == 'United States':
             state_data = {}
 
-            if 'STATE' in d:
-                inserted_data['state'] = d['STATE']
-            elif call_info2:
-                try:
-                    state_data = call_info2.get_all(d['CALL'])
-                except:
-                    pass
+            if rows['STATE'][i]:
+                inserted_data['state'] = rows['STATE'][i]
+            elif QRZ_USERNAME:
+                if callsign not in us_states:
+                    us_states[callsign] = get_callsign_state(callsign)
+                state_data = us_states[callsign]
                 if 'state' in state_data:
                     inserted_data['state'] = state_data['state']
 
-            if 'CNTY' in d:
-                inserted_data['county'] = d['CNTY'][3:]
+            if rows['CNTY'][i]:
+                inserted_data['county'] = rows['county'][i]
             elif 'county' in state_data:
                 inserted_data['county'] = state_data['county']
 
-        if 'CONT' in d:
-            inserted_data['continent'] = d['CONT']
+        if rows['CONT'][i]:
+            inserted_data['continent'] = rows['CONT'][i]
         elif location_data:
             inserted_data['continent'] = location_data['continent']
         elif inserted_data.get('country', None) == 'United States':
             inserted_data['continent'] = 'NA'
 
-        if 'DXCC' in d:
-            inserted_data['dxcc'] = int(d['DXCC'])
-        elif inserted_data['country'] and inserted_data['country'] in country_to_dxcc:
+        if rows['DXCC'][i]:
+            inserted_data['dxcc'] = rows['dxcc'][i]
+        elif inserted_data.get('country', None) in country_to_dxcc:
             inserted_data['dxcc'] = country_to_dxcc[inserted_data['country']]
-        
-        done_coll.update_one({
-            'callsign': inserted_data['callsign'],
-            'band': inserted_data['band'],
-            'QSOID': inserted_data['QSOID']
+
+        key = (inserted_data['callsign'], inserted_data['band'], inserted_data['QSOID'])
+        if key in documents:
+            documents[key].update(inserted_data)
+        else:
+            documents[key] = inserted_data
+
+    operations = [
+        UpdateOne({
+            'callsign': callsign,
+            'band': band,
+            'QSOID': qso_id
             },
             {'$set': inserted_data},
             upsert=True
         )
+        for (callsign, band, qso_id), inserted_data in documents.items()
+    ]
+
+    if replace_logid:
+        # A modified QSO can have different callsign, band or time, or not be selected anymore
+        new_keys = {d['logid']: key for key, d in documents.items() if 'logid' in d}
+        for logid in set(columns['APP_QRZLOG_LOGID'].tolist()):
+            if not logid.isdigit():
+                continue
+            query = {'logid': int(logid)}
+            if int(logid) in new_keys:
+                callsign, band, qso_id = new_keys[int(logid)]
+                query['$nor'] = [{'callsign': callsign, 'band': band, 'QSOID': qso_id}]
+            operations.append(DeleteMany(query))
+
+    if not operations:
+        return 0, 0
+
+    collection.bulk_write(operations, ordered=False)
+    return len(documents), 1
 
 if __name__ == '__main__':
     print('Start getting the logs...')
+    stats = None
     if QRZ_API_KEY:
-        res = requests.post('https://logbook.qrz.com/api',data=f'KEY={QRZ_API_KEY}&ACTION=FETCH')
-        if res.ok:
-            result_str = res.text.replace('&lt;','<').replace('&gt;','>').replace('\n', ' ')
-            result_adif = re.search(r'ADIF=(.*<eor>)', result_str)
-            if result_adif:
-                print('DONE!')
-                data_str = result_adif.group(1)
-                print('Emptying the database...')
-                done_coll.delete_many({})
-                print('DONE!')
-                print('Start putting to database...')
-                main(data_str)
+        batches = fetch_qrz_log()
+        first_batch = next(batches, None)
+        if first_batch:
+            print('Start putting to database...')
+            stats = replace_log(itertools.chain([first_batch], batches))
     elif LOG_LOCATION:
-        with open(LOG_LOCATION, encoding='latin-1') as f:
-            data_str = f.read()
-        main(data_str)
+        stats = main(iter_columns(adif_file_chunks(LOG_LOCATION)))
+    if stats:
+        print(f'{stats["qso"]} QSO in {stats["round_trips"]} round trips, {stats["qso"]/max(stats["seconds"], 1e-9):.0f} QSO/s')
     print('DONE!')
\ No newline at end of file
@@ -0,0 +1,91 @@
+# Throughput of writing an imported ADIF log to database
+# Run from the repository root: python -m benchmarks.adif_import --qso 10000
+# Uses mongomock by default, pass --mongo to write to the MongoDB in config (collection is dropped afterwards)
+# mongomock scans the whole collection for every upsert, so keep --qso small without --mongo
+import argparse, time, typing
+
+import numpy as np
+
+import adif_parser
+import static_data
+from adif_parser import read_columns, convert_columns, get_callsign_location
+from config import LOG_LOCATION, MONGO_HOST, MONGO_PORT, WORK_ON_UNCONFIRMED_QSO
+from benchmarks.adif_loader import scale_log
+
+def import_one_by_one(data_str: str) -> typing.Tuple[int, int]:
+    # The way adif_parser.import_columns wrote the log before bulk_write
+    columns = read_columns(data_str)
+    converted = convert_columns(columns)
+
+    selected = converted['valid'] & np.isin(columns['MODE'], ['FT8', 'FT4'])
+    if WORK_ON_UNCONFIRMED_QSO:
+        selected &= converted['confirmed']
+    selected_index = np.flatnonzero(selected)
+    rows = {k: v[selected_index].tolist() for k, v in columns.items()}
+    rows.update({k: v[selected_index].tolist() for k, v in converted.items()})
+    country_to_dxcc = static_data.get()['country_to_dxcc']
+
+    for i in range(len(selected_index)):
+        inserted_data = {
+            'QSOID': rows['QSOID'][i],
+            'timestamp': rows['timestamp'][i],
+            'callsign': rows['callsign'][i],
+            'mode': rows['MODE'][i],
+            'confirmed': rows['confirmed'][i],
+            'band': rows['band'][i]
+        }
+        location_data = get_callsign_location(rows['CALL'][i])
+        inserted_data['country'] = rows['COUNTRY'][i] or location_data.get('country', None)
+        inserted_data['continent'] = rows['CONT'][i] or location_data.get('continent', None)
+        if inserted_data['country'] in country_to_dxcc:
+            inserted_data['dxcc'] = country_to_dxcc[inserted_data['country']]
+
+        adif_parser.done_coll.update_one({
+            'callsign': inserted_data['callsign'],
+            'band': inserted_data['band'],
+            'QSOID': inserted_data['QSOID']
+            },
+            {'$set': inserted_data},
+            upsert=True
+        )
+
+    return len(selected_index), len(selected_index)
+
+def import_bulk(data_str: str) -> typing.Tuple[int, int]:
+    stats = adif_parser.main(data_str)
+    return stats['qso'], stats['round_trips']
+
+def measure(name: str, func: typing.Callable[[str], typing.Tuple[int, int]], data_str: str, num_qso: int) -> float:
+    adif_parser.done_coll.delete_many({})
+    start = time.perf_counter()
+    num_written, round_trips = func(data_str)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24} {elapsed:8.2f} s {num_qso/elapsed:12.0f} QSO/s {round_trips:10} round trips {num_written:10} written')
+    return elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--qso', type=int, default=10000, help='number of QSO after scaling up the log')
+    parser.add_argument('--log', default=LOG_LOCATION, help='ADIF file to scale up')
+    parser.add_argument('--mongo', action='store_true', help='use the MongoDB in config instead of mongomock')
+    args = parser.parse_args()
+
+    if args.mongo:
+        from pymongo import MongoClient
+        coll = MongoClient(MONGO_HOST, MONGO_PORT).wsjt['benchmark_adif_import']
+    else:
+        import mongomock
+        coll = mongomock.MongoClient().wsjt['benchmark_adif_import']
+    coll.create_index([('callsign', 1), ('band', 1), ('QSOID', 1)])
+    adif_parser.done_coll = coll
+
+    with open(args.log, encoding='latin-1') as f:
+        data_str, num_qso = scale_log(f.read(), args.qso)
+    print(f'{num_qso} QSO, {len(data_str)/1024/1024:.1f} MB')
+
+    try:
+        before = measure('update_one per QSO', import_one_by_one, data_str, num_qso)
+        after = measure('bulk_write', import_bulk, data_str, num_qso)
+        print(f'Speed up: {before/after:.1f}x')
+    finally:
+        coll.drop()
@@ -0,0 +1,77 @@
+# Throughput of ADIF import before writing to database
+# Run from the repository root: python -m benchmarks.adif_loader --qso 200000
+import argparse, re, time, typing
+from datetime import datetime
+
+from pyhamtools.frequency import freq_to_band
+
+from config import LOG_LOCATION
+from adif_parser import read_from_string, read_columns, convert_columns, is_confirmed, string_band_to_number, iter_columns
+
+def scale_log(data_str: str, num_qso: int) -> typing.Tuple[str, int]:
+    eoh_mo = re.search(r'<eoh>', data_str, re.IGNORECASE)
+    header = data_str[:eoh_mo.end(0)] if eoh_mo else ''
+    body = data_str[eoh_mo.end(0):] if eoh_mo else data_str
+    body_qso = len(re.findall(r'<eor>', body, re.IGNORECASE))
+
+    repeat = max(1, -(-num_qso//body_qso))
+    return header + body*repeat, body_qso*repeat
+
+def convert_records(data_str: str) -> int:
+    # The way adif_parser.main converted the log before read_columns
+    data, _ = read_from_string(data_str)
+
+    num_qso = 0
+    for d in data:
+        if d.get('MODE', None) not in ['FT8', 'FT4']:
+            continue
+        is_confirmed(d)
+        f'{d["QSO_DATE"]}{d["TIME_ON"][:4]}-{d["QSO_DATE_OFF"]}{d["TIME_OFF"][:4]}'
+        datetime.strptime(f'{d["QSO_DATE_OFF"]}{d["TIME_OFF"][:4]}+0000', '%Y%m%d%H%M%z').timestamp()
+        d['CALL'].replace('_', '/')
+        try:
+            freq_to_band(float(d['FREQ'])*1000)['band']
+        except:
+            string_band_to_number(d['BAND'])
+        num_qso += 1
+
+    return num_qso
+
+def convert_arrays(data_str: str) -> int:
+    columns = read_columns(data_str)
+    converted = convert_columns(columns)
+
+    return int(converted['valid'].sum())
+
+def convert_stream(data_str: str) -> int:
+    # Like downloading from QRZ, the log comes in chunks and is converted in batches
+    data_bytes = data_str.encode()
+    chunks = (data_bytes[i:i+64*1024] for i in range(0, len(data_bytes), 64*1024))
+
+    num_qso = 0
+    for columns in iter_columns(chunks):
+        num_qso += int(convert_columns(columns)['valid'].sum())
+
+    return num_qso
+
+def measure(name: str, func: typing.Callable[[str], int], data_str: str, num_qso: int) -> float:
+    start = time.perf_counter()
+    func(data_str)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24} {elapsed:8.2f} s {num_qso/elapsed:12.0f} QSO/s')
+    return elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--qso', type=int, default=200000, help='number of QSO after scaling up the log')
+    parser.add_argument('--log', default=LOG_LOCATION, help='ADIF file to scale up')
+    args = parser.parse_args()
+
+    with open(args.log, encoding='latin-1') as f:
+        data_str, num_qso = scale_log(f.read(), args.qso)
+    print(f'{num_qso} QSO, {len(data_str)/1024/1024:.1f} MB')
+
+    before = measure('per record', convert_records, data_str, num_qso)
+    after = measure('columnar', convert_arrays, data_str, num_qso)
+    measure('streaming', convert_stream, data_str, num_qso)
+    print(f'Speed up: {before/after:.1f}x')
@@ -0,0 +1,160 @@
+# Latency of every decode in receiver, message history written through against written behind
+# and a check that the locator and message of a rejected decode are still remembered, exits with status 1 when not
+# Run from the repository root: python -m benchmarks.decode_latency --decodes 5000
+# Uses mongomock and fakeredis by default, pass --live to use the MongoDB and Redis in config
+# (benchmark collections and Redis database 15 are dropped afterwards)
+# QRZ lookups are disabled, every generated callsign is a valid callsign
+import argparse, random, statistics, struct, sys, time, typing
+
+import receiver
+import static_data
+import wsjtx
+from config import MONGO_HOST, MONGO_PORT, REDIS_HOST, REDIS_PORT
+
+MY_CALLSIGN = 'YD0BJJ'
+PREFIXES = ['K', 'W', 'N', 'DL', 'G', 'F', 'I', 'EA', 'JA', 'VK', 'ZL', 'PY', 'LU', 'OH', 'SM', 'UA', 'BV', 'HL', 'YB', 'ZS']
+
+def pack_string(value: str) -> bytes:
+    encoded = value.encode()
+    return struct.pack('!I', len(encoded)) + encoded
+
+def decode_packet(message: str, time_ms: int, snr: int, delta_frequency: int) -> bytes:
+    return (
+        struct.pack('!III', wsjtx.WS_MAGIC, wsjtx.WS_SCHEMA, wsjtx.PacketType.DECODE.value)
+        + pack_string('WSJT-X')
+        + struct.pack('!?IidI', True, time_ms, snr, 0.1, delta_frequency)
+        + pack_string('~')
+        + pack_string(message)
+        + struct.pack('!??', False, False)
+    )
+
+def generate_decodes(num_decodes: int, num_stations: int, per_period: int, seed: int) -> typing.List[bytes]:
+    rnd = random.Random(seed)
+    callsigns = sorted({
+        f'{rnd.choice(PREFIXES)}{rnd.randint(0, 9)}{"".join(rnd.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=rnd.randint(2, 3)))}'
+        for _ in range(num_stations)
+    })
+    receiver.valid_callsign = set(callsigns)
+
+    packets = []
+    for i in range(num_decodes):
+        callsign = rnd.choice(callsigns)
+        to = rnd.choice([MY_CALLSIGN] + callsigns)
+        message = rnd.choice([
+            f'CQ {callsign} JO31',
+            f'CQ {callsign} JO31',
+            f'{to} {callsign} JO31',
+            f'{to} {callsign} -10',
+            f'{to} {callsign} R-10',
+            f'{to} {callsign} RR73'
+        ])
+        time_ms = 1000*(3600 + 15*(i//per_period))
+        packets.append(decode_packet(message, time_ms, rnd.randint(-24, 5), rnd.randint(300, 2700)))
+    return packets
+
+def write_through(callsign: str, band: int, mode: str, data: dict):
+    # The way receiver wrote message before the write behind buffer
+    receiver.MESSAGE_CACHE.setdefault((callsign, band, mode), {}).update(data)
+    receiver.message_coll.update_one(
+        {'callsign': callsign, 'band': band, 'mode': mode},
+        {'$set': dict(data)},
+        upsert=True
+    )
+
+def reset(db, states):
+    for name in ['calls', 'message', 'filtered', 'grid', 'black']:
+        db[f'benchmark_{name}'].delete_many({})
+    receiver.MESSAGE_CACHE.clear()
+    receiver.MESSAGE_DIRTY.clear()
+    receiver.MESSAGE_UNREAD.clear()
+    receiver.GRID_CACHE.clear()
+    receiver.GRID_DIRTY.clear()
+    receiver.REJECTED_CACHE.clear()
+    receiver.LOCAL_STATES.update({'period': 0, 'current_callsign': '', 'states_completed': True, 'admission_ready': True})
+    states.r.flushdb()
+    states.change_states(band=20, mode='FT8', my_callsign=MY_CALLSIGN, min_db=-20, max_tries=3, num_tries_call_busy=2)
+
+def connect(live: bool) -> typing.Tuple[typing.Any, receiver.States]:
+    states = receiver.STATES_LIST['']
+    if live:
+        import redis
+        from pymongo import MongoClient
+        db = MongoClient(MONGO_HOST, MONGO_PORT).wsjt
+        states.r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=15, decode_responses=True)
+    else:
+        import fakeredis, mongomock
+        db = mongomock.MongoClient().wsjt
+        states.r = fakeredis.FakeRedis(decode_responses=True)
+    receiver.call_coll = db.benchmark_calls
+    receiver.message_coll = db.benchmark_message
+    receiver.filtered_coll = db.benchmark_filtered
+    receiver.grid_coll = db.benchmark_grid
+    receiver.done_coll = db.benchmark_black
+    receiver.message_coll.create_index([('callsign', 1), ('band', 1), ('mode', 1)])
+    receiver.get_call_info2 = lambda: None
+    receiver.set_static_data(static_data.get())
+    return db, states
+
+def drop(db, states):
+    for name in ['calls', 'message', 'filtered', 'grid', 'black']:
+        db.drop_collection(f'benchmark_{name}')
+    states.r.flushdb()
+    receiver.MESSAGE_POOL.shutdown()
+
+def measure(name: str, packets: typing.List[bytes], db, states) -> typing.List[float]:
+    reset(db, states)
+    ip_from = ('127.0.0.1', 2237)
+    latencies = []
+    for packet in packets:
+        start = time.perf_counter()
+        receiver.process_wsjt(packet, ip_from, states)
+        latencies.append(time.perf_counter() - start)
+    receiver.flush_messages(wait=True)
+
+    latencies_ms = sorted(l*1000 for l in latencies)
+    print(
+        f'{name:<16} mean {statistics.mean(latencies_ms):7.3f} ms  p50 {latencies_ms[len(latencies_ms)//2]:7.3f} ms  '
+        f'p95 {latencies_ms[int(len(latencies_ms)*0.95)]:7.3f} ms  max {latencies_ms[-1]:8.3f} ms  '
+        f'{db.benchmark_message.count_documents({}):6} message'
+    )
+    return latencies_ms
+
+def check_rejected_grid(db, states) -> bool:
+    # Locator of a decode that is rejected is still remembered, like before the cheap rejections ran first
+    reset(db, states)
+    callsign = sorted(receiver.valid_callsign)[0]
+    receiver.process_wsjt(decode_packet(f'CQ {callsign} JO31', 1000*3600, -24, 1500), ('127.0.0.1', 2237), states)
+    receiver.flush_messages(wait=True)
+    grid = (db.benchmark_grid.find_one({'callsign': callsign}) or {}).get('grid', None)
+    message = db.benchmark_message.find_one({'callsign': callsign, 'band': 20, 'mode': 'FT8'}) or {}
+    print(f'Rejected CQ with a grid: grid {grid}, message {message.get("Message", None)}')
+    return grid == 'JO31' and message.get('Message', None) == f'CQ {callsign} JO31'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--decodes', type=int, default=5000, help='number of decodes')
+    parser.add_argument('--stations', type=int, default=300, help='number of different callsigns')
+    parser.add_argument('--per-period', type=int, default=30, help='number of decodes every period')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--live', action='store_true', help='use the MongoDB and Redis in config instead of mongomock and fakeredis')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    db, states = connect(args.live)
+
+    packets = generate_decodes(args.decodes, args.stations, args.per_period, args.seed)
+    print(f'{len(packets)} decodes from {len(receiver.valid_callsign)} callsigns, {args.per_period} every period')
+
+    write_behind = receiver.set_message
+    try:
+        receiver.set_message = write_through
+        before = measure('write through', packets, db, states)
+        receiver.set_message = write_behind
+        after = measure('write behind', packets, db, states)
+        print(f'Speed up: {statistics.mean(before)/statistics.mean(after):.2f}x mean')
+        if not check_rejected_grid(db, states):
+            sys.exit(1)
+    finally:
+        drop(db, states)
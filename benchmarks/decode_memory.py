@@ -0,0 +1,104 @@
+# Memory of decodes in receiver over a busy hour on the band, measured with tracemalloc
+# Run from the repository root: python -m benchmarks.decode_memory --per-period 40
+# Uses mongomock and fakeredis by default, pass --live to use the MongoDB and Redis in config
+import argparse, time, tracemalloc, typing
+
+import receiver
+import wsjtx
+from decode_record import DecodeRecord, LOCATION_FIELDS, QUEUE_FIELDS
+from benchmarks.decode_latency import connect, drop, generate_decodes, reset
+
+# Fields added by filter_decode and completing_data, with the value of a usual CQ
+COMPLETED_DATA = {
+    'country': 'United States',
+    'dxcc': 291,
+    'continent': 'NA',
+    'isNewCallsign': True,
+    'isNewDXCC': False,
+    'isVIPDXCC': False,
+    'isValid': True,
+    'band': 20,
+    'mode': 'FT8',
+    'tries': 3,
+    'max_transmit_count': 6,
+    'num_inactive_before_cut': 3,
+    'importance': 1.25,
+    'expired': False,
+    'tried': False,
+    'isReemerging': False,
+    'isSpam': False,
+    'isEven': True,
+    'skipGrid': True,
+    'nextTx': 'SNR',
+    'timestamp': 1700000000.0,
+    'expiresAt': None,
+    'spamUntil': None
+}
+
+def as_dict(packet: wsjtx.WSDecode) -> dict:
+    # The way process_wsjt kept the decode before DecodeRecord
+    data = dict(packet.as_dict())
+    data.update(receiver.parsing_message(packet.Message))
+    data.update(COMPLETED_DATA)
+    return data
+
+def as_record(packet: wsjtx.WSDecode) -> DecodeRecord:
+    data = DecodeRecord.from_packet(packet.as_dict(), receiver.parsing_message(packet.Message))
+    data.update(COMPLETED_DATA)
+    return data
+
+def measure_kept(name: str, func: typing.Callable[[wsjtx.WSDecode], typing.Any], packets: typing.List[wsjtx.WSDecode]) -> int:
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = [func(packet) for packet in packets]
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<24} {current/len(kept):8.0f} bytes/decode {current/1024:10.0f} KiB {elapsed*1e6/len(kept):8.2f} us/decode')
+    return current
+
+def measure_receiver(packets: typing.List[bytes], db, states):
+    reset(db, states)
+    ip_from = ('127.0.0.1', 2237)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for packet in packets:
+        receiver.process_wsjt(packet, ip_from, states)
+    elapsed = time.perf_counter() - start
+    receiver.flush_messages(wait=True)
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    print(
+        f'{"process_wsjt":<24} {elapsed*1000/len(packets):8.3f} ms/decode {peak/1024:8.0f} KiB peak '
+        f'{current/1024:8.0f} KiB kept {len(receiver.MESSAGE_CACHE):6} message in memory'
+    )
+    for stat in snapshot.statistics('filename')[:5]:
+        print(f'    {stat.size/1024:8.0f} KiB {stat.count:8} blocks {stat.traceback[0].filename}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=int, default=60, help='length of the replayed band activity')
+    parser.add_argument('--stations', type=int, default=500, help='number of different callsigns')
+    parser.add_argument('--per-period', type=int, default=40, help='number of decodes every period')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--live', action='store_true', help='use the MongoDB and Redis in config instead of mongomock and fakeredis')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    db, states = connect(args.live)
+    num_decodes = args.minutes*4*args.per_period
+    packets = generate_decodes(num_decodes, args.stations, args.per_period, args.seed)
+    print(f'{num_decodes} decodes in {args.minutes} minutes from {len(receiver.valid_callsign)} callsigns')
+    print(f'{len(LOCATION_FIELDS) + len(QUEUE_FIELDS)} fields added after parsing')
+
+    try:
+        decoded = [wsjtx.ft8_decode(packet) for packet in packets]
+        kept_dict = measure_kept('dict', as_dict, decoded)
+        kept_record = measure_kept('DecodeRecord', as_record, decoded)
+        print(f'DecodeRecord uses {kept_record/kept_dict:.0%} of the memory of dict')
+        measure_receiver(packets, db, states)
+    finally:
+        drop(db, states)
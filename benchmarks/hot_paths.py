@@ -0,0 +1,319 @@
+# Time of every hot path of receiver, transmitter and adif_parser, compared with a stored baseline
+# Run from the repository root: python -m benchmarks.hot_paths --save log/hot_paths.json
+# then after a change: python -m benchmarks.hot_paths --compare log/hot_paths.json
+# which exits with status 1 when the median of a hot path is slower than the baseline by more than --threshold
+# Uses mongomock and fakeredis, QRZ lookups are disabled, every generated callsign is a valid callsign
+# Baselines are only comparable on the same machine and Python version
+import argparse, contextlib, functools, io, json, platform, random, statistics, sys, time, typing
+
+import adif_parser
+import receiver
+import transmitter
+import wsjtx
+from config import LOG_LOCATION, MAX_FREQUENCY, MIN_FREQUENCY
+from decode_record import DecodeRecord
+from benchmarks.decode_latency import MY_CALLSIGN, connect, reset
+from benchmarks.simulator import load_callsigns
+
+# A setup returns (run, number of calls in run, prepare), prepare is called before every round and is not timed
+Setup = typing.Callable[[], typing.Tuple[typing.Callable[[], typing.Any], int, typing.Optional[typing.Callable[[], typing.Any]]]]
+
+BENCHMARKS: typing.Dict[str, Setup] = {}
+
+# Messages of every decode type, {0} is the caller, {1} the called station and {2} the grid
+DECODE_KINDS = {
+    'cq': 'CQ {0} {2}',
+    'grid': '{1} {0} {2}',
+    'snr': '{1} {0} -12',
+    'rsnr': '{1} {0} R-08',
+    'rr73': '{1} {0} RR73',
+    'to_me': '%s {0} {2}' % MY_CALLSIGN
+}
+
+PACKET_TIME = 3600*1000
+NUM_STATIONS = 200
+
+def benchmark(name: str) -> typing.Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def located_callsigns(num_stations: int) -> typing.Set[str]:
+    # Callsigns without location are rejected before the expensive part of process_wsjt
+    callsigns = load_callsigns(4*num_stations, random.Random(1))
+    return set([c for c in callsigns if receiver.get_location_data(c)][:num_stations])
+
+def messages(kind: str, rnd: random.Random) -> typing.List[str]:
+    callsigns = sorted(receiver.valid_callsign)
+    return [
+        DECODE_KINDS[kind].format(callsign, rnd.choice(callsigns), f'{rnd.choice("JKLMNO")}{rnd.choice("LMNOPQ")}{rnd.randint(10, 99)}')
+        for callsign in callsigns
+    ]
+
+def decode_packet(message: str, rnd: random.Random) -> bytes:
+    packet = wsjtx.WSDecode()
+    packet.New = True
+    packet.Time = PACKET_TIME
+    packet.SNR = rnd.randint(-20, 5)
+    packet.DeltaTime = 0.1
+    packet.DeltaFrequency = rnd.randint(MIN_FREQUENCY, MAX_FREQUENCY)
+    packet.Mode = '~'
+    packet.Message = message
+    return packet.raw()
+
+def packets() -> typing.Dict[str, bytes]:
+    # One packet of every type receiver gets from WSJT-X
+    rnd = random.Random(1)
+    heartbeat = wsjtx.WSHeartbeat()
+    heartbeat.Version = '2.6.1'
+    heartbeat.Revision = 'hot_paths'
+
+    status = wsjtx.WSStatus()
+    status.Frequency = 14074000
+    status.Mode = 'FT8'
+    status.TXMode = 'FT8'
+    status.DeCall = MY_CALLSIGN
+    status.DeGrid = 'OI33'
+    status.DXCall = 'JA1ABC'
+    status.TXEnabled = True
+    status.LastTxMsg = f'JA1ABC {MY_CALLSIGN} -10'
+
+    logged = wsjtx.WSLogged()
+    logged.DateOff = 2460000
+    logged.TimeOff = PACKET_TIME
+    logged.DXCall = 'JA1ABC'
+    logged.DXGrid = 'PM95'
+    logged.DialFrequency = 14074000
+    logged.Mode = 'FT8'
+    logged.ReportSent = '-10'
+    logged.DateOn = logged.DateOff
+    logged.TimeOn = PACKET_TIME - 60*1000
+
+    adif = wsjtx.WSADIF()
+    adif.ADIF = f'<call:6>JA1ABC <gridsquare:4>PM95 <mode:3>FT8 <band:3>20m <station_callsign:6>{MY_CALLSIGN} <eor>'
+
+    wspr = wsjtx.WSWSPRDecode()
+    wspr.New = True
+    wspr.Time = PACKET_TIME
+    wspr.SNR = -20
+    wspr.DeltaTime = 0.5
+    wspr.Frequency = 14097050
+    wspr.Drift = 0
+    wspr.Callsign = 'JA1ABC'
+    wspr.Grid = 'PM95'
+    wspr.Power = 37
+
+    return {
+        'heartbeat': heartbeat.raw(),
+        'status': status.raw(),
+        'decode': decode_packet('CQ JA1ABC PM95', rnd),
+        'clear': wsjtx.WSClear().raw(),
+        'logged': logged.raw(),
+        'close': wsjtx.WSClose().raw(),
+        'wspr_decode': wspr.raw(),
+        'logged_adif': adif.raw()
+    }
+
+def setup_ft8_decode(data: bytes) -> typing.Tuple[typing.Callable[[], typing.Any], int, None]:
+    return functools.partial(wsjtx.ft8_decode, data), 1, None
+
+for name, data in packets().items():
+    BENCHMARKS[f'ft8_decode.{name}'] = functools.partial(setup_ft8_decode, data)
+
+@benchmark('parsing_message')
+def setup_parsing_message():
+    rnd = random.Random(1)
+    all_messages = [m for kind in DECODE_KINDS for m in messages(kind, rnd)[:20]]
+    return lambda: [receiver.parsing_message(m) for m in all_messages], len(all_messages), None
+
+def decode_records(kind: str, rnd: random.Random) -> typing.List[DecodeRecord]:
+    records = []
+    for message in messages(kind, rnd):
+        packet = wsjtx.ft8_decode(decode_packet(message, rnd))
+        records.append(DecodeRecord.from_packet(packet.as_dict(), receiver.parsing_message(message)))
+    return records
+
+@benchmark('completing_data')
+def setup_completing_data():
+    rnd = random.Random(1)
+    records = []
+    additional_data = {'band': 20, 'mode': 'FT8', 'tries': 3, 'max_transmit_count': 6, 'num_inactive_before_cut': 3}
+
+    def prepare():
+        # New records every round, so the location is looked up instead of read from the previous round
+        records[:] = decode_records('cq', rnd)
+
+    def run():
+        for record in records:
+            receiver.completing_data(record, additional_data, 0)
+
+    return run, NUM_STATIONS, prepare
+
+@benchmark('filter_cq')
+def setup_filter_cq():
+    rnd = random.Random(1)
+    states = receiver.STATES_LIST['']
+    additional_data = {'band': 20, 'mode': 'FT8', 'tries': 3, 'max_transmit_count': 6, 'num_inactive_before_cut': 3}
+    records = decode_records('cq', rnd)
+    for record in records:
+        receiver.completing_data(record, additional_data, 0)
+
+    def prepare():
+        reset(*DATABASE)
+        states.change_states(new_grid=True, new_dxcc=True)
+
+    return lambda: [receiver.filter_cq(record, states) for record in records], len(records), prepare
+
+def setup_process_wsjt(kind: str):
+    rnd = random.Random(1)
+    states = receiver.STATES_LIST['']
+    ip_from = ('127.0.0.1', 2237)
+    decodes = [decode_packet(m, rnd) for m in messages(kind, rnd)]
+
+    def prepare():
+        receiver.flush_messages(wait=True)
+        reset(*DATABASE)
+        receiver.LOCAL_STATES['my_callsign'] = MY_CALLSIGN
+
+    def run():
+        for data in decodes:
+            receiver.process_wsjt(data, ip_from, states)
+
+    return run, len(decodes), prepare
+
+for kind in DECODE_KINDS:
+    BENCHMARKS[f'process_wsjt.{kind}'] = functools.partial(setup_process_wsjt, kind)
+
+@benchmark('calculate_best_frequency')
+def setup_calculate_best_frequency():
+    rnd = random.Random(1)
+    frequencies = [MIN_FREQUENCY, MAX_FREQUENCY] + [rnd.randint(MIN_FREQUENCY, MAX_FREQUENCY) for _ in range(30)]
+    return functools.partial(transmitter.calculate_best_frequency, frequencies), 1, None
+
+@benchmark('get_states')
+def setup_get_states():
+    states = receiver.STATES_LIST['']
+    keys = ('band', 'mode', 'num_inactive_before_cut', 'num_tries_call_busy', 'max_tries', 'min_db')
+    return lambda: states.get_states(*keys), 1, None
+
+@benchmark('change_states')
+def setup_change_states():
+    states = receiver.STATES_LIST['']
+    values = {
+        'my_callsign': MY_CALLSIGN,
+        'my_grid': 'OI33',
+        'dx_callsign': 'JA1ABC',
+        'dx_grid': 'PM95',
+        'tx_enabled': True,
+        'decoding': False,
+        'txdf': 1500,
+        'rxdf': 1500,
+        'tx_even': True
+    }
+    return lambda: states.change_states(**values), 1, None
+
+@benchmark('adif.read_from_string')
+def setup_read_from_string():
+    with open(ARGS.log, 'rb') as f:
+        data = f.read()
+    return functools.partial(adif_parser.read_from_string, data), 1, None
+
+@benchmark('adif.main')
+def setup_adif_main():
+    # mongomock scans the collection for every upsert, so only the first QSO of the log are imported
+    with open(ARGS.log, 'rb') as f:
+        qsos, _ = adif_parser.read_from_string(f.read())
+    qsos = qsos[:ARGS.adif_qso]
+    coll = DATABASE[0].benchmark_adif
+
+    def prepare():
+        coll.drop()
+        adif_parser.create_indexes(coll)
+
+    def run():
+        with contextlib.redirect_stderr(io.StringIO()):
+            adif_parser.main([adif_parser.qsos_to_columns(qsos)], collection=coll)
+
+    return run, len(qsos), prepare
+
+def measure(setup: Setup, rounds: int, min_time: float) -> typing.List[float]:
+    # Seconds per call of every round, functions without prepare are repeated until a round takes min_time
+    run, count, prepare = setup()
+    number = 1
+    if prepare is None:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            if time.perf_counter() - start >= min_time:
+                break
+            number *= 2
+
+    results = []
+    for _ in range(rounds + 1):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        results.append((time.perf_counter() - start)/number/count)
+    # The first round warms up caches
+    return results[1:]
+
+def compare(results: typing.Dict[str, dict], baseline: dict, threshold: float) -> typing.List[str]:
+    regressed = []
+    for name, result in results.items():
+        if name not in baseline['results']:
+            print(f'{name:<28} {result["median"]*1e6:12.2f} us   not in baseline')
+            continue
+        before = baseline['results'][name]['median']
+        change = result['median']/before - 1
+        status = 'REGRESSED' if change > threshold else 'ok'
+        if status != 'ok':
+            regressed.append(name)
+        print(f'{name:<28} {before*1e6:12.2f} us {result["median"]*1e6:12.2f} us {change*100:+8.1f} %  {status}')
+    return regressed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--save', help='write the results as JSON baseline to this file')
+    parser.add_argument('--compare', help='baseline to compare with, exits with status 1 when a hot path regressed')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown of the median, 0.25 is 25 %%')
+    parser.add_argument('--filter', default='', help='only run hot paths containing this text')
+    parser.add_argument('--rounds', type=int, default=15, help='number of timed rounds of every hot path')
+    parser.add_argument('--min-time', type=float, default=0.02, help='minimum seconds of a round of the fast hot paths')
+    parser.add_argument('--log', default=LOG_LOCATION, help='ADIF file for the adif_parser hot paths')
+    parser.add_argument('--adif-qso', type=int, default=300, help='number of QSO imported by adif.main')
+    ARGS = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    adif_parser.call_info2_loaded = True
+    DATABASE = connect(False)
+    reset(*DATABASE)
+    receiver.valid_callsign = located_callsigns(NUM_STATIONS)
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if ARGS.filter not in name:
+            continue
+        values = measure(setup, ARGS.rounds, ARGS.min_time)
+        results[name] = {'median': statistics.median(values), 'min': min(values), 'rounds': len(values)}
+        if not ARGS.compare:
+            print(f'{name:<28} median {results[name]["median"]*1e6:12.2f} us  min {results[name]["min"]*1e6:12.2f} us')
+    receiver.MESSAGE_POOL.shutdown()
+
+    if ARGS.save:
+        with open(ARGS.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f, indent=2)
+        print(f'Baseline written to {ARGS.save}')
+
+    if ARGS.compare:
+        with open(ARGS.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, ARGS.threshold)
+        if regressed:
+            print(f'{len(regressed)} hot paths slower than the baseline by more than {ARGS.threshold*100:.0f} %: {", ".join(regressed)}')
+            sys.exit(1)
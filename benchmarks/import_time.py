@@ -0,0 +1,54 @@
+# Import time of every entry point, measured with python -X importtime in a new process
+# Run from the repository root: python -m benchmarks.import_time
+import argparse, os, re, subprocess, sys, time, typing
+
+import static_data
+
+ENTRY_POINTS = ['receiver', 'transmitter', 'adif_parser', 'static_data']
+
+def import_time(module: str) -> typing.Tuple[int, typing.List[typing.Tuple[int, str]]]:
+    # Returns cumulative microseconds of the module and of every module imported by it
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        mo = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if mo:
+            modules.append((int(mo.group(2)), mo.group(4)))
+    total = next(t for t, name in modules if name == module)
+    return total, sorted(modules, reverse=True)
+
+def measure(name: str, func: typing.Callable[[], typing.Any], repeat: int) -> float:
+    elapsed = min(timed(func) for _ in range(repeat))
+    print(f'{name:<40} {elapsed*1000:10.1f} ms')
+    return elapsed
+
+def timed(func: typing.Callable[[], typing.Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs, the fastest is reported')
+    parser.add_argument('--top', type=int, default=5, help='number of slowest imports shown for every entry point')
+    args = parser.parse_args()
+
+    for module in ENTRY_POINTS:
+        runs = [import_time(module) for _ in range(args.repeat)]
+        total, modules = min(runs)
+        print(f'import {module:<33} {total/1000:10.1f} ms')
+        for t, name in [m for m in modules if m[1] not in [module, 'site']][:args.top]:
+            print(f'    {name:<36} {t/1000:10.1f} ms')
+
+    # Static data is loaded once by every process, compare snapshot with parsing the data files
+    static_data.load()
+    measure('compile static data', static_data.compile_static_data, args.repeat)
+    measure('load snapshot', static_data.load, args.repeat)
@@ -0,0 +1,168 @@
+# Disk use and query time of the decode journal of logger.py against grepping the rotated message.log
+# Run from the repository root: python -m benchmarks.journal_query --decodes 300000
+# The same decodes are written to message.log rotating every --max-bytes like logger.py did, and to a journal
+# compressed every --segment-bytes, both in a temporary directory
+# Every query is a callsign over the whole log, a time range, and a callsign in a time range
+import argparse, gzip, logging, os, random, re, tempfile, time, typing
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from handler import LOG_FORMAT
+from journal import JournalWriter, query
+
+# Same callsigns as benchmarks.decode_latency, not imported so receiver doesn't connect to the database
+MY_CALLSIGN = 'YD0BJJ'
+PREFIXES = ['K', 'W', 'N', 'DL', 'G', 'F', 'I', 'EA', 'JA', 'VK', 'ZL', 'PY', 'LU', 'OH', 'SM', 'UA', 'BV', 'HL', 'YB', 'ZS']
+
+HOST = '127.0.0.1:2237'
+TEXT_TIME = re.compile(r'^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)')
+
+class RollingFileHandler(RotatingFileHandler):
+    # How logger.py rotated message.log, to message.log.1, message.log.2 and so on without removing any
+
+    def __init__(self, filename: str, maxBytes: int = 0):
+        self.last_backup_cnt = 0
+        super().__init__(filename=filename, maxBytes=maxBytes)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.last_backup_cnt += 1
+        self.rotate(self.baseFilename, f'{self.baseFilename}.{self.last_backup_cnt}')
+        self.stream = self._open()
+
+def generate_records(num_decodes: int, num_stations: int, per_period: int, seed: int, start: float) -> typing.List[dict]:
+    rnd = random.Random(seed)
+    callsigns = sorted({
+        f'{rnd.choice(PREFIXES)}{rnd.randint(0, 9)}{"".join(rnd.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=rnd.randint(2, 3)))}'
+        for _ in range(num_stations)
+    })
+    records = []
+    for i in range(num_decodes):
+        now = start + 15*(i//per_period) + 13 + rnd.random()
+        if i % per_period == 0:
+            records.append({
+                'time': now - 13, 'kind': 'tx', 'host': HOST, 'band': 20, 'mode': 'FT8', 'freq': 1500,
+                'msg': f'CQ {MY_CALLSIGN} OI33'
+            })
+        callsign = rnd.choice(callsigns)
+        to = rnd.choice([MY_CALLSIGN] + callsigns)
+        message = rnd.choice([
+            f'CQ {callsign} JO31',
+            f'CQ {callsign} JO31',
+            f'{to} {callsign} JO31',
+            f'{to} {callsign} -10',
+            f'{to} {callsign} R-10',
+            f'{to} {callsign} RR73'
+        ])
+        period = time.gmtime(now - 13)
+        records.append({
+            'time': now, 'kind': 'rx', 'host': HOST, 'band': 20, 'mode': 'FT8', 'freq': rnd.randint(300, 2700),
+            'utc': time.strftime('%H%M%S', period), 'dt': round(rnd.uniform(-0.5, 1.5), 1), 'snr': rnd.randint(-24, 5),
+            'md': '~', 'msg': message
+        })
+    return records
+
+def write_text(directory: str, records: typing.List[dict], max_bytes: int) -> float:
+    # Same lines and rotation as logger.py wrote to log/message.log
+    handler = RollingFileHandler(os.path.join(directory, 'message.log'), maxBytes=max_bytes)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    begin = time.perf_counter()
+    for r in records:
+        if r['kind'] == 'rx':
+            msg, args = '[HOST: %s] [RX] [MODE: %s] [BAND: %s] [FREQUENCY: %s] [UTC: %s] [DT: %s] [DB: %s] %s %s', (
+                r['host'], r['mode'], r['band'], r['freq'], r['utc'], r['dt'], r['snr'], r['md'], r['msg']
+            )
+        else:
+            msg, args = '[HOST: %s] [TX] [MODE: %s] [BAND: %s] [FREQUENCY: %s] %s', (
+                r['host'], r['mode'], r['band'], r['freq'], r['msg']
+            )
+        handler.handle(logging.makeLogRecord({
+            'msg': msg, 'args': args, 'levelname': 'INFO', 'levelno': logging.INFO,
+            'created': r['time'], 'msecs': (r['time'] % 1)*1000
+        }))
+    handler.close()
+    return time.perf_counter() - begin
+
+def write_journal(directory: str, records: typing.List[dict], segment_bytes: int) -> float:
+    begin = time.perf_counter()
+    journal = JournalWriter(directory, segment_bytes)
+    for r in records:
+        journal.write(r)
+    # Waits for the segments being compressed
+    journal.close()
+    return time.perf_counter() - begin
+
+def grep_text(directory: str, callsign: str, since: float, until: float) -> int:
+    # What finding a callsign took before, reading every message.log.N
+    found = 0
+    since_text = datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M:%S')
+    until_text = datetime.fromtimestamp(until).strftime('%Y-%m-%d %H:%M:%S')
+    pattern = re.compile(rf'\b{re.escape(callsign)}\b') if callsign else None
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            for line in f:
+                if pattern is not None and not pattern.search(line):
+                    continue
+                m = TEXT_TIME.match(line)
+                if m and since_text <= m.group(1) <= until_text:
+                    found += 1
+    return found
+
+def directory_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+def timed(function: typing.Callable[[], int], repeat: int) -> typing.Tuple[int, float]:
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        found = function()
+        best = min(best, time.perf_counter() - begin)
+    return found, best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--decodes', type=int, default=300000, help='number of decodes')
+    parser.add_argument('--stations', type=int, default=3000, help='number of different callsigns')
+    parser.add_argument('--per-period', type=int, default=30, help='number of decodes every period')
+    parser.add_argument('--max-bytes', type=int, default=10*1024*1024, help='size of message.log before it is rotated')
+    parser.add_argument('--segment-bytes', type=int, default=8*1024*1024, help='size of a journal segment before it is compressed')
+    parser.add_argument('--repeat', type=int, default=3, help='every query is run this many times, the fastest is shown')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.time() - 86400*30
+    records = generate_records(args.decodes, args.stations, args.per_period, args.seed, start)
+    end = records[-1]['time']
+    callsign = next(r for r in records[len(records)//2:] if r['kind'] == 'rx')['msg'].split()[1]
+    middle = start + (end - start)/2
+    print(f'{len(records)} records over {(end - start)/3600:.1f} hours, query callsign {callsign}')
+
+    with tempfile.TemporaryDirectory() as text_directory, tempfile.TemporaryDirectory() as journal_directory:
+        text_seconds = write_text(text_directory, records, args.max_bytes)
+        journal_seconds = write_journal(journal_directory, records, args.segment_bytes)
+        text_size = directory_size(text_directory)
+        journal_size = directory_size(journal_directory)
+        print(f'{"message.log":<12} {text_size/1024/1024:8.1f} MB in {len(os.listdir(text_directory)):>3} files, written in {text_seconds:6.2f} s')
+        print(
+            f'{"journal":<12} {journal_size/1024/1024:8.1f} MB in {len(os.listdir(journal_directory)):>3} files, written in {journal_seconds:6.2f} s '
+            f'(compression included), {text_size/journal_size:.1f}x smaller'
+        )
+        # Compressed as a whole for comparison, like gzip of message.log.N
+        with open(os.path.join(text_directory, 'message.log'), 'rb') as f:
+            data = f.read()
+        print(f'{"":<12} gzip of the whole message.log is {len(data)/len(gzip.compress(data)):.1f}x smaller')
+
+        queries = [
+            ('callsign', callsign, 0, float('inf')),
+            ('1 hour', '', middle, middle + 3600),
+            ('callsign 1h', callsign, middle - 1800, middle + 1800)
+        ]
+        for name, q_callsign, since, until in queries:
+            text_found, text_best = timed(lambda: grep_text(text_directory, q_callsign, since, min(until, end + 1)), args.repeat)
+            journal_found, journal_best = timed(lambda: sum(1 for _ in query(journal_directory, q_callsign, since, until)), args.repeat)
+            print(
+                f'{name:<12} grep {1000*text_best:8.1f} ms ({text_found} lines)  '
+                f'journal {1000*journal_best:8.1f} ms ({journal_found} records)  {text_best/journal_best:5.1f}x faster'
+            )
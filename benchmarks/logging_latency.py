@@ -0,0 +1,70 @@
+# Latency of every decode in receiver while every log record is written, logging inside the packet loop
+# against the queue and writer thread of handler.start_logging
+# Run from the repository root: python -m benchmarks.logging_latency --decodes 5000 --max-bytes 65536
+# Records of every level are written to a log in a temporary directory rotating every --max-bytes,
+# the console output goes to /dev/null
+# Uses mongomock and fakeredis by default, pass --live to use the MongoDB and Redis in config
+# (benchmark collections and Redis database 15 are dropped afterwards)
+import argparse, logging, os, statistics, tempfile, time, typing
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from handler import LOG_FORMAT, BatchRotatingFileHandler, BatchStreamHandler, start_logging
+from benchmarks.decode_latency import connect, drop, generate_decodes, measure
+
+def log_inline(location: str, max_bytes: int, console: typing.TextIO):
+    # The way receiver logged before the queue, formatted, written and rotated by the thread logging the record
+    handlers = [RotatingFileHandler(location, maxBytes=max_bytes, backupCount=5), logging.StreamHandler(console)]
+    logging.basicConfig(format=LOG_FORMAT, level=logging.DEBUG, handlers=handlers, force=True)
+
+def log_queued(location: str, max_bytes: int, console: typing.TextIO) -> QueueListener:
+    return start_logging(BatchRotatingFileHandler(location, maxBytes=max_bytes, backupCount=5), BatchStreamHandler(console))
+
+def log_calls(name: str, num_calls: int):
+    # Time spent by the thread logging a record like the one receiver logs for every decode
+    latencies = []
+    for i in range(num_calls):
+        start = time.perf_counter()
+        logging.info(
+            '[RX] [MODE: %s] [BAND: %s] [FREQUENCY: %s] [DB: %s] %s',
+            'FT8', 20, 300 + i%2400, -10, f'CQ K{i%10}ABC FN31'
+        )
+        latencies.append(time.perf_counter() - start)
+    latencies_us = sorted(l*1e6 for l in latencies)
+    print(
+        f'{name + " log call":<16} mean {statistics.mean(latencies_us):7.2f} us  p50 {latencies_us[len(latencies_us)//2]:7.2f} us  '
+        f'p99 {latencies_us[int(len(latencies_us)*0.99)]:7.2f} us  max {latencies_us[-1]:8.1f} us'
+    )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--decodes', type=int, default=5000, help='number of decodes')
+    parser.add_argument('--stations', type=int, default=300, help='number of different callsigns')
+    parser.add_argument('--per-period', type=int, default=30, help='number of decodes every period')
+    parser.add_argument('--log-calls', type=int, default=50000, help='number of records logged without decoding')
+    parser.add_argument('--max-bytes', type=int, default=64*1024, help='size of the log before it is rotated')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--live', action='store_true', help='use the MongoDB and Redis in config instead of mongomock and fakeredis')
+    args = parser.parse_args()
+
+    db, states = connect(args.live)
+    packets = generate_decodes(args.decodes, args.stations, args.per_period, args.seed)
+    console = open(os.devnull, 'w')
+    try:
+        for name, setup in [('inline', log_inline), ('queue', log_queued)]:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, 'receiver.log')
+                listener = setup(location, args.max_bytes, console)
+                measure(name, packets, db, states)
+                log_calls(name, args.log_calls)
+                start = time.perf_counter()
+                if listener is not None:
+                    listener.stop()
+                logging.getLogger().handlers.clear()
+                print(
+                    f'{"":<16} writer done {1000*(time.perf_counter() - start):8.1f} ms after the last decode, '
+                    f'{sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))//1024} KB in '
+                    f'{len(os.listdir(directory))} files'
+                )
+    finally:
+        console.close()
+        drop(db, states)
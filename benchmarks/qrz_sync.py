@@ -0,0 +1,123 @@
+# Time of QRZ Logbook sync at receiver start, full download against incremental
+# Run from the repository root: python -m benchmarks.qrz_sync --qso 5000
+# Serves the log from a local stand-in for QRZ Logbook API and writes to mongomock
+import argparse, collections, threading, time, typing
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import mongomock
+
+import adif_parser
+from adif_parser import iter_adif, sync_qrz_log
+from config import LOG_LOCATION
+from benchmarks.adif_loader import scale_log
+
+def write_adif(qsos: typing.List[typing.Dict[str, str]]) -> str:
+    return ''.join(
+        ''.join(f'<{k}:{len(v.encode())}>{v}' for k, v in qso.items() if k != 'MODIFIED') + '<EOR>\n'
+        for qso in qsos
+    )
+
+class QRZStandIn:
+    """QRZ Logbook API FETCH with MODSINCE, AFTERLOGID and MAX options, records ordered by logid"""
+    def __init__(self, qsos: typing.List[typing.Dict[str, str]]):
+        self.qsos = qsos
+        self.requests: typing.List[str] = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+                option = parse_qs(body).get('OPTION', [''])[0]
+                stand_in.requests.append(option)
+                result = stand_in.fetch(option).encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(result)))
+                self.end_headers()
+                self.wfile.write(result)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def fetch(self, option: str) -> str:
+        options = dict(o.split(':', 1) for o in option.split(',') if ':' in o)
+        modsince = options.get('MODSINCE', '')
+        after_logid = int(options.get('AFTERLOGID', 0))
+        result = sorted((
+            qso for qso in self.qsos
+            if int(qso['APP_QRZLOG_LOGID']) > after_logid and qso['MODIFIED'] >= modsince
+        ), key=lambda qso: int(qso['APP_QRZLOG_LOGID']))
+        if 'MAX' in options:
+            result = result[:int(options['MAX'])]
+        if not result:
+            return 'RESULT=FAIL&REASON=no log entries found&COUNT=0'
+        adif = write_adif(result).replace('<', '&lt;').replace('>', '&gt;')
+        return f'RESULT=OK&COUNT={len(result)}&ADIF={adif}'
+
+    def close(self):
+        self.server.shutdown()
+
+def measure(name: str, stand_in: QRZStandIn) -> typing.Dict[str, float]:
+    num_requests = len(stand_in.requests)
+    start = time.perf_counter()
+    stats = sync_qrz_log()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24} {elapsed:8.2f} s {stats["qso"]:10} QSO {len(stand_in.requests) - num_requests:6} requests {adif_parser.done_coll.count_documents({}):10} in database')
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--qso', type=int, default=5000, help='number of QSO after scaling up the log')
+    parser.add_argument('--log', default=LOG_LOCATION, help='ADIF file to scale up')
+    parser.add_argument('--modified', type=int, default=20, help='number of QSO modified and added between syncs')
+    args = parser.parse_args()
+
+    with open(args.log, encoding='latin-1') as f:
+        data_str, _ = scale_log(f.read(), args.qso)
+
+    # Every repeated QSO gets its own logid and a different day, so it's a different QSO
+    qsos = list(iter_adif([data_str]))
+    repeated = collections.Counter()
+    for i, qso in enumerate(qsos):
+        qso['APP_QRZLOG_LOGID'] = str(i + 1)
+        qso['MODIFIED'] = '2000-01-01'
+        key = (qso.get('CALL', ''), qso.get('QSO_DATE', ''), qso.get('TIME_ON', ''))
+        shift = timedelta(days=repeated[key])
+        repeated[key] += 1
+        for k in ['QSO_DATE', 'QSO_DATE_OFF']:
+            if len(qso.get(k, '')) == 8 and qso[k].isdigit():
+                qso[k] = (datetime.strptime(qso[k], '%Y%m%d') + shift).strftime('%Y%m%d')
+    print(f'{len(qsos)} QSO')
+
+    db = mongomock.MongoClient().wsjt
+    adif_parser.done_coll = db['benchmark_qrz_sync']
+    adif_parser.sync_coll = db.sync
+
+    stand_in = QRZStandIn(qsos)
+    adif_parser.QRZ_LOGBOOK_URL = stand_in.url
+    try:
+        full = measure('full', stand_in)
+
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        num_qso = len(qsos)
+        ft8_qsos = [qso for qso in qsos if qso.get('MODE', None) == 'FT8']
+        for qso in ft8_qsos[:args.modified]:
+            qso['GRIDSQUARE'] = 'AA00'
+            qso['MODIFIED'] = today
+        for qso in ft8_qsos[-args.modified:]:
+            added = dict(qso, APP_QRZLOG_LOGID=str(len(qsos) + 1), MODIFIED=today, CALL=f'{qso["CALL"]}/P')
+            qsos.append(added)
+        incremental = measure('incremental', stand_in)
+        measure('nothing changed', stand_in)
+
+        num_modified = adif_parser.done_coll.count_documents({'grid': 'AA00'})
+        num_added = adif_parser.done_coll.count_documents({'logid': {'$gt': num_qso}})
+        print(f'{num_modified} QSO modified, {num_added} QSO added')
+        print(f'Speed up: {full["seconds"]/incremental["seconds"]:.1f}x')
+    finally:
+        stand_in.close()
@@ -0,0 +1,101 @@
+# Completed QSOs per hour of receiver and transmitter against stations making QSOs (benchmarks/traffic.py)
+# Run from the repository root: python -m benchmarks.qso_throughput --hours 2 --behaviours 0.5 0.4 0.1
+# Receiver, transmitter and the simulated WSJT-X run in one process on a simulated clock, so hours of band
+# activity take seconds and the same seed gives the same QSOs
+# Uses mongomock and fakeredis by default, pass --live to use the MongoDB and Redis in config
+# (benchmark collections and Redis database 15 are dropped afterwards)
+import argparse, random, time
+
+import receiver
+import transmitter
+from clock import ReplayClock
+from config import *
+from states import TIMING
+from benchmarks.decode_latency import connect, drop
+from benchmarks.replay import TransmitterClock, advance, prepare, read_commands
+from benchmarks.simulator import MY_CALLSIGN, MY_GRID, Simulator
+from benchmarks.traffic import TrafficModel
+
+class LocalSimulator(Simulator):
+    """Simulator calling receiver.process_wsjt directly, commands are read from the socket of prepare"""
+
+    def __init__(self, args: argparse.Namespace, band: TrafficModel, clock: ReplayClock, states: receiver.States):
+        self.states = states
+        self.ip_from = ('127.0.0.1', WSJTX_PORT)
+        super().__init__(args, band, clock)
+        self.verbose = args.verbose
+        # No datagram goes through the network
+        self.metrics.udp = {}
+
+    def connect(self):
+        self.sink = prepare(self.states, self.clock)
+
+    def command(self, data: bytes):
+        self.process(data, self.clock.now())
+
+    def send_raw(self, data: bytes):
+        receiver.process_wsjt(data, self.ip_from, self.states)
+        read_commands(self.sink, self.command)
+
+    def wait(self, until: float):
+        if self.running:
+            advance(self.clock, until, self.states, self.sink, self.command)
+
+def classify(callsign: str) -> str:
+    # Why transmitter left the callsign, from the flags receiver set in the queue
+    data = receiver.call_coll.find_one({'callsign': callsign})
+    if not data:
+        return 'removed'
+    if data.get('isSpam', False):
+        return 'spam'
+    if data.get('tried', False):
+        return 'tries'
+    if data.get('expired', False):
+        return 'inactive'
+    return 'switched'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=1, help='simulated hours of band activity')
+    parser.add_argument('--decodes', type=int, default=30, help='maximum number of decodes every period')
+    parser.add_argument('--stations', type=int, default=300, help='number of stations on the band')
+    parser.add_argument('--behaviours', type=float, nargs=3, default=[0.6, 0.3, 0.1], metavar=('ANSWER', 'BUSY', 'SILENT'),
+        help='weights of stations answering us, busy with others and never hearing us')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='print every transmission')
+    parser.add_argument('--live', action='store_true', help='use the MongoDB and Redis in config instead of mongomock and fakeredis')
+    args = parser.parse_args()
+    args.mode = 'FT8'
+    args.spread = None
+    args.callsign = MY_CALLSIGN
+    args.grid = MY_GRID
+    args.pid = []
+    args.periods = int(args.hours*3600//TIMING['FT8']['half'])
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    db, states = connect(args.live)
+    transmitter.call_coll = receiver.call_coll
+    transmitter.filtered_coll = receiver.filtered_coll
+    transmitter.done_coll = receiver.done_coll
+
+    band = TrafficModel(args.stations, args.behaviours, random.Random(args.seed))
+    receiver.valid_callsign = set(band.stations)
+    # Starts at the beginning of an even period
+    clock = ReplayClock(1_700_000_100)
+    receiver.CLOCK = clock
+    transmitter.CLOCK = TransmitterClock(clock)
+
+    simulator = LocalSimulator(args, band, clock, states)
+    simulator.metrics.classify = classify
+    try:
+        print(f'{args.hours} hours of {len(band.stations)} stations, behaviours answer/busy/silent {args.behaviours}')
+        start = time.perf_counter()
+        simulator.run()
+        receiver.flush_messages(wait=True)
+        simulator.metrics.summary()
+        print(f'Simulated in {time.perf_counter() - start:.1f} s')
+    finally:
+        simulator.sink.close()
+        drop(db, states)
@@ -0,0 +1,187 @@
+# Replay datagrams captured by receiver (CAPTURE_LOCATION in config) into receiver and transmitter
+# Run from the repository root: python -m benchmarks.replay log/capture.bin --speed max
+# Time in receiver and transmitter follows the capture, so the queue decisions are the same on every run
+# Uses mongomock and fakeredis by default, pass --live to use the MongoDB and Redis in config
+# (benchmark collections and Redis database 15 are dropped afterwards)
+import argparse, hashlib, json, socket, statistics, time, typing
+
+import receiver
+import transmitter
+import wsjtx
+from capture import read_capture
+from clock import Clock, ReplayClock
+from config import *
+from benchmarks.decode_latency import connect, drop
+
+class TransmitterClock(Clock):
+    """Transmitter runs in its own thread, so its sleeps don't hold up the time of receiver"""
+
+    def __init__(self, clock: ReplayClock):
+        self.clock = clock
+
+    def now(self) -> float:
+        return self.clock.now()
+
+    def sleep(self, seconds: float):
+        pass
+
+def parse_speed(value: str) -> float:
+    return 0 if value == 'max' else float(value)
+
+def prepare(states: receiver.States, clock: ReplayClock) -> socket.socket:
+    # Same states as receiver.init and transmitter.init, commands are sent to a local socket instead of WSJT-X
+    for coll in [receiver.call_coll, receiver.message_coll, receiver.filtered_coll, receiver.grid_coll, receiver.done_coll]:
+        coll.delete_many({})
+    receiver.MESSAGE_CACHE.clear()
+    receiver.MESSAGE_DIRTY.clear()
+    receiver.MESSAGE_UNREAD.clear()
+    receiver.GRID_CACHE.clear()
+    receiver.GRID_DIRTY.clear()
+    receiver.REJECTED_CACHE.clear()
+    states.r.flushdb()
+    states.new_grid = NEW_GRID
+    states.new_dxcc = NEW_DXCC
+    states.min_db = MIN_DB
+    states.num_inactive_before_cut = NUM_INACTIVE_BEFORE_CUT
+    states.num_tries_call_busy = NUM_TRIES_CALL_BUSY
+    states.num_disable_transmit = NUM_DISABLE_TRANSMIT
+    states.max_tries = MAX_TRIES
+    states.receiver_started = True
+    receiver.LOCAL_STATES.update({
+        'my_callsign': '',
+        'states_completed': False,
+        'current_callsign': '',
+        'current_tx': '',
+        'period': 0,
+        'admission_ready': True,
+        'replay_requested': False,
+        'compacted': clock.now()
+    })
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.setblocking(False)
+    states.change_states(
+        ip = '127.0.0.1',
+        port = sink.getsockname()[1]
+    )
+    transmitter.IS_EVEN = None
+    transmitter.init(states)
+    return sink
+
+def read_commands(sink: socket.socket, handler: typing.Callable[[bytes], None]):
+    # Commands receiver and transmitter sent to WSJT-X
+    while True:
+        try:
+            data = sink.recv(4096)
+        except BlockingIOError:
+            return
+        handler(data)
+
+def record_decision(decisions: typing.List[dict], clock: Clock) -> typing.Callable[[bytes], None]:
+    # The commands that change the QSO are kept as decisions
+    def handler(data: bytes):
+        now = clock.now()
+        packet = wsjtx.ft8_decode(data)
+        if isinstance(packet, wsjtx.WSReply):
+            decisions.append({'time': now, 'command': 'reply', 'message': packet.Message})
+        elif isinstance(packet, wsjtx.WSHaltTx):
+            decisions.append({'time': now, 'command': 'halt'})
+        elif isinstance(packet, wsjtx.WSEnableTx) and packet.NewTxMsgIdx in [5, 8, 9]:
+            decisions.append({'time': now, 'command': {5: 'log_qso', 8: 'disable_tx', 9: 'enable_tx'}[packet.NewTxMsgIdx]})
+    return handler
+
+def advance(clock: ReplayClock, until: float, states: receiver.States, sink: socket.socket, handler: typing.Callable[[bytes], None], transmit: bool = True):
+    # Transmitter looks for the next callsign right before every period, like transmitter.main
+    half = TIMING['FT8']['half']
+    if transmit:
+        boundary = (clock.now() + 0.2)//half*half + half - 0.2
+        while boundary <= until:
+            clock.advance(boundary)
+            transmitter.transmitting(clock.now(), states)
+            read_commands(sink, handler)
+            boundary += half
+
+    # Receiver writes back the queue when there is no packet for a while
+    if until - clock.now() >= 0.5 and (EXPIRED_TIME or RELEASE_FROM_SPAM_TIME):
+        if until - receiver.LOCAL_STATES['compacted'] >= receiver.COMPACT_INTERVAL:
+            clock.advance(until - 0.5)
+            receiver.compact_queue(clock.now())
+
+    clock.advance(until)
+
+def replay(records: typing.List[typing.Tuple[float, bytes]], states: receiver.States, speed: float, transmit: bool) -> typing.Tuple[typing.Dict[str, typing.List[float]], typing.List[dict]]:
+    clock = ReplayClock(records[0][0], speed)
+    receiver.CLOCK = clock
+    transmitter.CLOCK = TransmitterClock(clock)
+    sink = prepare(states, clock)
+    ip_from = ('127.0.0.1', WSJTX_PORT)
+
+    costs: typing.Dict[str, typing.List[float]] = {}
+    decisions: typing.List[dict] = []
+    handler = record_decision(decisions, clock)
+    for timestamp, data in records:
+        advance(clock, timestamp, states, sink, handler, transmit)
+        packet_type = wsjtx.PacketType(wsjtx.SHEAD.unpack_from(data)[2]).name
+        start = time.perf_counter()
+        receiver.process_wsjt(data, ip_from, states)
+        costs.setdefault(packet_type, []).append(time.perf_counter() - start)
+        read_commands(sink, handler)
+
+    receiver.flush_messages(wait=True)
+    sink.close()
+    return costs, decisions
+
+def print_costs(costs: typing.Dict[str, typing.List[float]], elapsed: float):
+    total = 0
+    for packet_type, values in sorted(costs.items()):
+        values_ms = sorted(v*1000 for v in values)
+        total += sum(values)
+        print(
+            f'{packet_type:<12} {len(values_ms):7} packets  mean {statistics.mean(values_ms):7.3f} ms  '
+            f'p50 {values_ms[len(values_ms)//2]:7.3f} ms  p95 {values_ms[int(len(values_ms)*0.95)]:7.3f} ms  '
+            f'max {values_ms[-1]:8.3f} ms'
+        )
+    num_packets = sum(len(v) for v in costs.values())
+    print(f'{num_packets} packets processed in {total:.2f} s ({num_packets/total:.0f} packets/s), replayed in {elapsed:.2f} s')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('capture', help='file written by receiver when CAPTURE_LOCATION is set')
+    parser.add_argument('--speed', type=parse_speed, default=0, help='1 for real time, N for N times faster or max (default)')
+    parser.add_argument('--no-transmitter', action='store_true', help='only replay into receiver')
+    parser.add_argument('--decisions', help='write replies, logged QSO and enable/disable transmit as JSON lines to this file')
+    parser.add_argument('--live', action='store_true', help='use the MongoDB and Redis in config instead of mongomock and fakeredis')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    records = list(read_capture(args.capture))
+    if not records:
+        raise SystemExit(f'No packet in {args.capture}')
+    print(f'{len(records)} packets over {records[-1][0] - records[0][0]:.0f} s')
+
+    db, states = connect(args.live)
+    transmitter.call_coll = receiver.call_coll
+    transmitter.filtered_coll = receiver.filtered_coll
+    transmitter.done_coll = receiver.done_coll
+
+    try:
+        start = time.perf_counter()
+        costs, decisions = replay(records, states, args.speed, not args.no_transmitter)
+        print_costs(costs, time.perf_counter() - start)
+
+        digest = hashlib.sha1(json.dumps(decisions).encode()).hexdigest()
+        print(
+            f'{sum(d["command"] == "reply" for d in decisions)} replies  '
+            f'{sum(d["command"] == "log_qso" for d in decisions)} logged QSO  '
+            f'{db.benchmark_calls.count_documents({})} in queue  decisions {digest[:12]}'
+        )
+        print('Rejected ' + '  '.join(f'{k} {v}' for k, v in receiver.FILTER_COUNTER.items()))
+        if args.decisions:
+            with open(args.decisions, 'w') as f:
+                for d in decisions:
+                    f.write(json.dumps(d) + '\n')
+    finally:
+        drop(db, states)
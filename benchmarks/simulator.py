@@ -0,0 +1,629 @@
+# WSJT-X simulator to load test receiver and transmitter without a radio
+# Run from the repository root while receiver (and transmitter) are running:
+#   python -m benchmarks.simulator --decodes 200 --pid $(pgrep -f receiver.py)
+# Sends heartbeats, statuses and decodes to WSJTX_IP:WSJTX_PORT in real time like WSJT-X does,
+# and reacts to Reply, Enable Tx, Halt Tx, Free Text, Replay and Close from receiver and transmitter.
+# Press Ctrl+C or pass --periods to stop and print reply latency, UDP drops and CPU usage.
+# Pass --traffic to have the stations make QSOs (benchmarks/traffic.py) instead of sending random messages.
+import argparse, bisect, csv, os, random, re, select, socket, statistics, struct, typing
+from datetime import datetime, timezone
+
+import wsjtx
+from clock import Clock
+from config import MULTICAST, VALID_CALLSIGN_LOCATION, WSJTX_IP, WSJTX_PORT
+from states import TIMING
+
+MY_CALLSIGN = 'YD0BJJ'
+MY_GRID = 'OI33'
+PREFIXES = ['K', 'W', 'N', 'DL', 'G', 'F', 'I', 'EA', 'JA', 'VK', 'ZL', 'PY', 'LU', 'OH', 'SM', 'UA', 'BV', 'HL', 'YB', 'ZS']
+CQ_EXTRA = ['DX', 'NA', 'EU', 'AS', 'POTA', 'TEST']
+HEARTBEAT_INTERVAL = 15
+
+# Dial frequency of 20 meters, the band of a simulated run
+DIAL_FREQUENCY = {
+    'FT4': 14080000,
+    'FT8': 14074000
+}
+
+# Mode character in decode packet
+DECODE_MODE = {
+    'FT4': '+',
+    'FT8': '~'
+}
+
+# Seconds of transmission, decodes start at the end of receiving and spread over the decoding time
+MODE_TIMING = {
+    'FT4': {
+        'transmit': 5.04,
+        'decode_start': 6.3,
+        'decode_spread': 0.8,
+        'late_start': 1.0
+    },
+    'FT8': {
+        'transmit': 12.64,
+        'decode_start': 12.9,
+        'decode_spread': 1.6,
+        'late_start': 2.0
+    }
+}
+
+# Weight of every kind of message heard on the band
+MESSAGE_MIX = [
+    ('CQ', 30),
+    ('CQ_EXTRA', 5),
+    ('GRID', 15),
+    ('SNR', 15),
+    ('RSNR', 12),
+    ('RR73', 12),
+    ('73', 11)
+]
+
+grid_regex = re.compile(r'^[A-R]{2}\d{2}$')
+report_regex = re.compile(r'^[-+]\d{2}$')
+rreport_regex = re.compile(r'^R[-+]\d{2}$')
+
+class Station(object):
+    __slots__ = ('callsign', 'grid', 'snr', 'delta_frequency', 'even')
+
+    def __init__(self, callsign: str, grid: str, snr: int, delta_frequency: int, even: bool):
+        self.callsign = callsign
+        self.grid = grid
+        self.snr = snr
+        self.delta_frequency = delta_frequency
+        self.even = even
+
+def format_report(snr: int) -> str:
+    return f'{max(-30, min(snr, 30)):+03d}'
+
+def load_callsigns(num_stations: int, rnd: random.Random) -> typing.List[str]:
+    # Callsigns in the list of valid callsign pass validation in receiver without QRZ lookup
+    callsigns = []
+    if VALID_CALLSIGN_LOCATION and os.path.exists(VALID_CALLSIGN_LOCATION):
+        with open(VALID_CALLSIGN_LOCATION) as f:
+            callsigns = [r[0] for r in csv.reader(f) if r]
+    if len(callsigns) >= num_stations:
+        return rnd.sample(callsigns, num_stations)
+
+    callsigns = set(callsigns)
+    while len(callsigns) < num_stations:
+        callsigns.add(f'{rnd.choice(PREFIXES)}{rnd.randint(0, 9)}{"".join(rnd.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=rnd.randint(2, 3)))}')
+    return sorted(callsigns)
+
+def reply_message(clicked: str, my_callsign: str, my_grid: str, report: str, skip_grid: bool, use_RR73: bool) -> typing.Tuple[str, str, str]:
+    # Message generated by WSJT-X after double click on a decode, returns (message, dx callsign, dx grid)
+    words = clicked.replace('<', '').replace('>', '').split()
+    if not words:
+        return '', '', ''
+
+    if words[0] == 'CQ':
+        grid = words[-1] if len(words) > 2 and grid_regex.match(words[-1]) else ''
+        dx_callsign = words[-2] if grid else words[-1]
+        tail = ''
+    else:
+        dx_callsign = words[1] if len(words) > 1 else words[0]
+        tail = words[2] if len(words) > 2 else ''
+        grid = tail if grid_regex.match(tail) else ''
+        if words[0] != my_callsign:
+            tail = ''
+
+    if tail in ['RR73', 'RRR', '73']:
+        return f'{dx_callsign} {my_callsign} 73', dx_callsign, grid
+    if rreport_regex.match(tail):
+        return f'{dx_callsign} {my_callsign} {"RR73" if use_RR73 else "RRR"}', dx_callsign, grid
+    if report_regex.match(tail):
+        return f'{dx_callsign} {my_callsign} R{report}', dx_callsign, grid
+    if tail or skip_grid:
+        return f'{dx_callsign} {my_callsign} {report}', dx_callsign, grid
+    return f'{dx_callsign} {my_callsign} {my_grid}', dx_callsign, grid
+
+def answer_message(message: str, my_callsign: str, report: str) -> str:
+    # Message sent back by the station we are calling
+    words = message.split()
+    if len(words) < 3 or words[1] != my_callsign:
+        return ''
+
+    dx_callsign, tail = words[0], words[2]
+    if tail == '73':
+        return ''
+    if tail in ['RR73', 'RRR']:
+        return f'{my_callsign} {dx_callsign} 73'
+    if rreport_regex.match(tail):
+        return f'{my_callsign} {dx_callsign} RR73'
+    if report_regex.match(tail):
+        return f'{my_callsign} {dx_callsign} R{report}'
+    return f'{my_callsign} {dx_callsign} {report}'
+
+class BandActivity(object):
+    """Stations heard on the band, every station transmits in the same period parity"""
+
+    def __init__(self, num_stations: int, to_me: float, answer_rate: float, rnd: random.Random):
+        self.rnd = rnd
+        self.to_me = to_me
+        self.answer_rate = answer_rate
+        self.stations: typing.Dict[str, Station] = {}
+        for callsign in load_callsigns(num_stations, rnd):
+            self.stations[callsign] = Station(
+                callsign,
+                f'{rnd.choice("ABCDEFGHIJKLMNOPQR")}{rnd.choice("ABCDEFGHIJKLMNOPQR")}{rnd.randint(0, 9)}{rnd.randint(0, 9)}',
+                rnd.randint(-24, 10),
+                rnd.randint(200, 2900),
+                rnd.random() < 0.5
+            )
+        self.by_parity = {
+            even: [s for s in self.stations.values() if s.even == even]
+            for even in [True, False]
+        }
+        self.kinds = [k for k, _ in MESSAGE_MIX]
+        self.cumulative_weights = []
+        total = 0
+        for _, w in MESSAGE_MIX:
+            total += w
+            self.cumulative_weights.append(total)
+        self.answers: typing.Dict[int, typing.List[typing.Tuple[Station, str]]] = {}
+
+    def message(self, station: Station, my_callsign: str) -> str:
+        kind = self.kinds[bisect.bisect(self.cumulative_weights, self.rnd.random()*self.cumulative_weights[-1])]
+        if kind == 'CQ':
+            return f'CQ {station.callsign} {station.grid}'
+        if kind == 'CQ_EXTRA':
+            return f'CQ {self.rnd.choice(CQ_EXTRA)} {station.callsign} {station.grid}'
+
+        if self.rnd.random() < self.to_me:
+            to = my_callsign
+        else:
+            to = self.rnd.choice(self.by_parity[not station.even]).callsign if self.by_parity[not station.even] else my_callsign
+        report = format_report(self.rnd.randint(-24, 10))
+        return {
+            'GRID': f'{to} {station.callsign} {station.grid}',
+            'SNR': f'{to} {station.callsign} {report}',
+            'RSNR': f'{to} {station.callsign} R{report}',
+            'RR73': f'{to} {station.callsign} RR73',
+            '73': f'{to} {station.callsign} 73'
+        }[kind]
+
+    def hear(self, message: str, period: int, my_callsign: str):
+        # The station we are calling answers in the next period
+        words = message.split()
+        station = self.stations.get(words[0], None) if words else None
+        if station is None or self.rnd.random() >= self.answer_rate:
+            return
+        answer = answer_message(message, my_callsign, format_report(self.rnd.randint(-24, 10)))
+        if answer:
+            self.answers.setdefault(period + 1, []).append((station, answer))
+
+    def decodes(self, period: int, num_decodes: int, my_callsign: str) -> typing.List[typing.Tuple[str, int, float, int]]:
+        # (message, snr, delta time, delta frequency) of every decode in a period
+        stations = self.by_parity[period%2 == 0]
+        result = [
+            (answer, station.snr, round(self.rnd.gauss(0.1, 0.2), 1), station.delta_frequency)
+            for station, answer in self.answers.pop(period, [])
+        ]
+        # Answer to the period we were transmitting is never heard
+        for p in [p for p in self.answers if p < period]:
+            del self.answers[p]
+
+        num_others = max(num_decodes - len(result), 0)
+        for station in self.rnd.sample(stations, min(num_others, len(stations))):
+            result.append((
+                self.message(station, my_callsign),
+                max(-26, min(station.snr + self.rnd.randint(-3, 3), 20)),
+                round(self.rnd.gauss(0.1, 0.2), 1),
+                station.delta_frequency
+            ))
+        # Decoder finds the strong signals first
+        result.sort(key=lambda d: -d[1])
+        return result
+
+class Metrics(object):
+
+    def __init__(self, pids: typing.List[int], clock: Clock):
+        self.clock = clock
+        self.started = clock.now()
+        self.pids = pids
+        self.sent = {'heartbeat': 0, 'status': 0, 'decode': 0, 'replay': 0, 'logged': 0}
+        self.commands: typing.Dict[str, int] = {}
+        self.reply_latencies: typing.List[float] = []
+        self.decode_ages: typing.List[float] = []
+        self.late_replies = 0
+        self.unmatched_replies = 0
+        self.transmissions = 0
+        self.late_transmissions = 0
+        self.udp = udp_counters()
+        self.cpu = {pid: cpu_seconds(pid) for pid in pids}
+        # Consecutive transmissions to the same callsign
+        self.attempt: typing.Optional[dict] = None
+        self.qso_periods: typing.List[int] = []
+        self.lost: typing.Dict[str, int] = {}
+        # Tells why the callsign was left without QSO, only known when the queue can be read
+        self.classify: typing.Optional[typing.Callable[[str], str]] = None
+
+    def command(self, name: str):
+        self.commands[name] = self.commands.get(name, 0) + 1
+
+    def transmit(self, callsign: str, period: int):
+        if self.attempt and self.attempt['callsign'] == callsign:
+            self.attempt['transmissions'] += 1
+            return
+        self.end_attempt()
+        self.attempt = {'callsign': callsign, 'period': period, 'transmissions': 1, 'logged': None}
+
+    def logged(self, callsign: str, period: int):
+        if self.attempt and self.attempt['callsign'] == callsign and self.attempt['logged'] is None:
+            self.attempt['logged'] = self.attempt['transmissions']
+            self.qso_periods.append(period - self.attempt['period'] + 1)
+
+    def end_attempt(self):
+        if not self.attempt or self.attempt['callsign'] == 'CQ':
+            return
+        if self.attempt['logged'] is None:
+            reason = self.classify(self.attempt['callsign']) if self.classify else 'no QSO'
+            self.lost[reason] = self.lost.get(reason, 0) + self.attempt['transmissions']
+        elif self.attempt['transmissions'] > self.attempt['logged']:
+            self.lost['after QSO'] = self.lost.get('after QSO', 0) + self.attempt['transmissions'] - self.attempt['logged']
+        self.attempt = None
+
+    def summary(self):
+        elapsed = self.clock.now() - self.started
+        self.end_attempt()
+        print()
+        print(f'Simulated {elapsed:.1f} s')
+        print('Sent       ' + '  '.join(f'{k} {v}' for k, v in self.sent.items()))
+        print('Received   ' + ('  '.join(f'{k} {v}' for k, v in sorted(self.commands.items())) or 'nothing'))
+        if self.reply_latencies:
+            latencies = sorted(l*1000 for l in self.reply_latencies)
+            print(
+                f'Reply      {len(latencies)} replies after decoding ended  mean {statistics.mean(latencies):.1f} ms  '
+                f'p50 {latencies[len(latencies)//2]:.1f} ms  p95 {latencies[int(len(latencies)*0.95)]:.1f} ms  '
+                f'max {latencies[-1]:.1f} ms  {self.late_replies} after the period started'
+            )
+        if self.decode_ages:
+            print(
+                f'Replied to decodes sent {statistics.mean(self.decode_ages):.1f} s before on average  '
+                f'{self.unmatched_replies} never sent'
+            )
+        print(f'Transmit   {self.transmissions} periods  {self.late_transmissions} started late')
+        if self.qso_periods:
+            print(
+                f'QSO        {len(self.qso_periods)} logged  {len(self.qso_periods)*3600/elapsed:.1f} per hour  '
+                f'mean {statistics.mean(self.qso_periods):.1f} periods from the first call'
+            )
+        if self.lost:
+            print('Lost       ' + '  '.join(f'{k} {v} periods' for k, v in sorted(self.lost.items())))
+
+        udp = udp_counters()
+        if udp and self.udp:
+            print(
+                f'UDP        receive buffer errors {udp.get("RcvbufErrors", 0) - self.udp.get("RcvbufErrors", 0)}  '
+                f'in errors {udp.get("InErrors", 0) - self.udp.get("InErrors", 0)} (whole system)'
+            )
+        for pid, start in self.cpu.items():
+            end = cpu_seconds(pid)
+            if start is None or end is None:
+                print(f'CPU        pid {pid} not found')
+                continue
+            print(f'CPU        pid {pid} {end - start:.2f} s  {100*(end - start)/elapsed:.1f} %')
+
+def udp_counters() -> typing.Dict[str, int]:
+    # Datagrams dropped because the receive buffer of a socket is full are counted in RcvbufErrors
+    try:
+        with open('/proc/net/snmp') as f:
+            lines = [l.split() for l in f if l.startswith('Udp:')]
+    except OSError:
+        return {}
+    if len(lines) < 2:
+        return {}
+    return dict(zip(lines[0][1:], map(int, lines[1][1:])))
+
+def cpu_seconds(pid: int) -> typing.Optional[float]:
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are the 14th and 15th field, counted from the field after the command name
+    return (int(fields[11]) + int(fields[12]))/os.sysconf('SC_CLK_TCK')
+
+class Simulator(object):
+
+    def __init__(self, args: argparse.Namespace, band: typing.Any = None, clock: typing.Optional[Clock] = None):
+        self.args = args
+        self.half = TIMING[args.mode]['half']
+        self.timing = MODE_TIMING[args.mode]
+        self.rnd = random.Random(args.seed)
+        self.band = band or BandActivity(args.stations, args.to_me, args.answer_rate, self.rnd)
+        self.clock = clock or Clock()
+        self.metrics = Metrics(args.pid, self.clock)
+        self.verbose = True
+        self.connect()
+
+        self.status = {
+            'Frequency': DIAL_FREQUENCY[args.mode],
+            'Mode': args.mode,
+            'TXMode': args.mode,
+            'DeCall': args.callsign,
+            'DeGrid': args.grid,
+            'RXdf': 1500,
+            'TXdf': 1500,
+            'TxEven': False
+        }
+        self.tx_message = ''
+        self.skip_grid = True
+        self.use_RR73 = True
+        self.tx_end = 0.0
+        self.running = True
+        # Decodes of the latest two periods, to be sent again when replay is requested
+        self.history: typing.Dict[int, typing.List[typing.Tuple[str, int, float, int, float]]] = {}
+        self.sent_at: typing.Dict[str, float] = {}
+        self.decoded_at = 0.0
+
+    def connect(self):
+        if MULTICAST:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('', self.args.port))
+        self.address = (WSJTX_IP, WSJTX_PORT)
+
+    def send_raw(self, data: bytes):
+        self.sock.sendto(data, self.address)
+
+    def send(self, packet: wsjtx._WSPacket, kind: str):
+        self.send_raw(packet.raw())
+        self.metrics.sent[kind] += 1
+
+    def send_heartbeat(self):
+        packet = wsjtx.WSHeartbeat()
+        packet.Version = '2.6.1'
+        packet.Revision = 'simulator'
+        self.send(packet, 'heartbeat')
+
+    def send_status(self, **kwargs):
+        self.status.update(kwargs)
+        packet = wsjtx.WSStatus()
+        for k, v in self.status.items():
+            setattr(packet, k, v)
+        self.send(packet, 'status')
+
+    def decode_packet(self, message: str, snr: int, delta_time: float, delta_frequency: int, period_start: float, new: bool = True) -> bytes:
+        packet = wsjtx.WSDecode()
+        packet.New = new
+        packet.Time = int(period_start%86400*1000)
+        packet.SNR = snr
+        packet.DeltaTime = delta_time
+        packet.DeltaFrequency = delta_frequency
+        packet.Mode = DECODE_MODE[self.args.mode]
+        packet.Message = message
+        return packet.raw()
+
+    def log_qso(self, now: float):
+        dx_callsign = self.status.get('DXCall', '')
+        if not dx_callsign:
+            return
+        qso_time = datetime.fromtimestamp(now, timezone.utc)
+        packet = wsjtx.WSLogged()
+        packet.DateOff = wsjtx.datetime2wsdate(qso_time)
+        packet.TimeOff = int(now%86400*1000)
+        packet.DXCall = dx_callsign
+        packet.DXGrid = self.status.get('DXGrid', '')
+        packet.DialFrequency = self.status['Frequency']
+        packet.Mode = self.args.mode
+        packet.ReportSent = self.status.get('Report', '')
+        packet.DateOn = packet.DateOff
+        packet.TimeOn = max(packet.TimeOff - 4*int(self.half*1000), 0)
+        self.send(packet, 'logged')
+        self.metrics.logged(dx_callsign, int(now//self.half))
+
+        fields = {
+            'CALL': dx_callsign,
+            'GRIDSQUARE': self.status.get('DXGrid', ''),
+            'MODE': self.args.mode,
+            'RST_SENT': self.status.get('Report', ''),
+            'QSO_DATE': qso_time.strftime('%Y%m%d'),
+            'TIME_ON': qso_time.strftime('%H%M%S'),
+            'QSO_DATE_OFF': qso_time.strftime('%Y%m%d'),
+            'TIME_OFF': qso_time.strftime('%H%M%S'),
+            'BAND': '20m',
+            'FREQ': f'{(self.status["Frequency"] + self.status["TXdf"])/1e6:.6f}',
+            'STATION_CALLSIGN': self.args.callsign,
+            'MY_GRIDSQUARE': self.args.grid
+        }
+        packet = wsjtx.WSADIF()
+        packet.ADIF = (
+            '\n<adif_ver:5>3.1.0\n<programid:6>WSJT-X\n<EOH>\n'
+            + ' '.join(f'<{k.lower()}:{len(v)}>{v}' for k, v in fields.items() if v)
+            + ' <EOR>'
+        )
+        self.send(packet, 'logged')
+
+    def process(self, data: bytes, now: float):
+        try:
+            packet = wsjtx.ft8_decode(data)
+        except (IOError, NotImplementedError, struct.error):
+            self.metrics.command('unknown')
+            return
+
+        if isinstance(packet, wsjtx.WSReply):
+            self.metrics.command('reply')
+            sent_at = self.sent_at.get(packet.Message, None)
+            if sent_at is None:
+                self.metrics.unmatched_replies += 1
+            else:
+                self.metrics.decode_ages.append(now - sent_at)
+            if self.decoded_at:
+                self.metrics.reply_latencies.append(now - self.decoded_at)
+            if now%self.half < self.half/2:
+                self.metrics.late_replies += 1
+            self.tx_message, dx_callsign, dx_grid = reply_message(
+                packet.Message,
+                self.args.callsign,
+                self.args.grid,
+                format_report(packet.SNR),
+                self.skip_grid,
+                self.use_RR73
+            )
+            self.send_status(DXCall=dx_callsign, DXGrid=dx_grid, Report=format_report(packet.SNR), GenMsg=self.tx_message)
+
+        elif isinstance(packet, wsjtx.WSEnableTx):
+            self.metrics.command(f'enable_tx_{packet.NewTxMsgIdx}')
+            idx = packet.NewTxMsgIdx
+            if idx == 5:
+                self.log_qso(now)
+                return
+            elif idx == 8:
+                self.status['TXEnabled'] = False
+            elif idx == 9:
+                self.status['TXEnabled'] = True
+            elif idx == 13:
+                self.status['Frequency'] = packet.Frequency
+            elif idx in [14, 15]:
+                self.status['TxEven'] = idx == 14
+            elif idx == 16:
+                self.tx_message = ''
+                self.status.update({'DXCall': '', 'DXGrid': '', 'GenMsg': ''})
+            elif idx == 17:
+                self.skip_grid = packet.SkipGrid
+            elif idx == 18:
+                self.use_RR73 = packet.UseRR73
+            elif idx == 19:
+                self.status['TXdf'] = packet.Offset
+            self.send_status(TxHaltClicked=False)
+
+        elif isinstance(packet, wsjtx.WSHaltTx):
+            self.metrics.command('halt_tx')
+            # Halt Tx turns off Enable Tx, the transmission stops now or at the end of the period
+            self.status['TXEnabled'] = False
+            if not packet.mode and self.status.get('Transmitting', False):
+                self.tx_end = now
+            self.send_status(TxHaltClicked=not packet.mode)
+
+        elif isinstance(packet, wsjtx.WSFreeText):
+            self.metrics.command('free_text')
+            self.tx_message = packet.text
+            self.send_status(GenMsg=packet.text)
+
+        elif isinstance(packet, wsjtx.WSReplay):
+            self.metrics.command('replay')
+            for period in sorted(self.history):
+                for decode in self.history[period]:
+                    self.send_raw(self.decode_packet(*decode, new=False))
+                    self.metrics.sent['replay'] += 1
+
+        elif isinstance(packet, wsjtx.WSClose):
+            self.metrics.command('close')
+            self.running = False
+
+        else:
+            self.metrics.command(packet.__class__.__name__)
+
+    def wait(self, until: float):
+        # Process commands until the time of the next event
+        while self.running:
+            timeout = until - self.clock.now()
+            if timeout <= 0:
+                return
+            fds, _, _ = select.select([self.sock], [], [], timeout)
+            if fds:
+                data, _ = self.sock.recvfrom(4096)
+                self.process(data, self.clock.now())
+
+    def start_transmit(self, period: int, period_start: float, now: float) -> bool:
+        if not self.status.get('TXEnabled', False) or not self.tx_message:
+            return False
+        if (period%2 == 0) != self.status['TxEven']:
+            return False
+        if now - period_start > self.timing['late_start']:
+            return False
+
+        self.metrics.transmissions += 1
+        if now - period_start > 0.5:
+            self.metrics.late_transmissions += 1
+        self.tx_end = period_start + self.timing['transmit']
+        self.band.hear(self.tx_message, period, self.args.callsign)
+        self.metrics.transmit(self.tx_message.split()[0], period)
+        self.send_status(Transmitting=True, LastTxMsg=self.tx_message, TxHaltClicked=False)
+        if self.verbose:
+            print(f'[{datetime.fromtimestamp(now, timezone.utc):%H:%M:%S}] TX {self.tx_message}')
+        return True
+
+    def receive(self, period: int, period_start: float):
+        decodes = self.band.decodes(period, self.args.decodes, self.args.callsign)
+        decode_start = period_start + self.timing['decode_start']
+        spread = self.timing['decode_spread'] if self.args.spread is None else self.args.spread
+
+        self.wait(decode_start)
+        self.send_status(Decoding=True)
+        history = []
+        for i, (message, snr, delta_time, delta_frequency) in enumerate(decodes):
+            self.wait(decode_start + spread*i/max(len(decodes), 1))
+            raw = self.decode_packet(message, snr, delta_time, delta_frequency, period_start)
+            self.send_raw(raw)
+            self.sent_at[message] = self.clock.now()
+            self.metrics.sent['decode'] += 1
+            history.append((message, snr, delta_time, delta_frequency, period_start))
+        self.history[period] = history
+        self.history.pop(period - 2, None)
+        self.decoded_at = self.clock.now()
+        self.wait(decode_start + spread)
+        self.send_status(Decoding=False)
+
+    def run(self):
+        periods = 0
+        last_heartbeat = 0.0
+        self.send_heartbeat()
+        self.send_status()
+        while self.running:
+            now = self.clock.now()
+            period = int(now//self.half)
+            period_start = period*self.half
+            if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                self.send_heartbeat()
+                last_heartbeat = now
+
+            if self.start_transmit(period, period_start, now):
+                # Halt Tx can end the transmission earlier
+                while self.running and self.clock.now() < self.tx_end:
+                    self.wait(min(self.tx_end, self.clock.now() + 0.1))
+                self.send_status(Transmitting=False)
+            else:
+                self.receive(period, period_start)
+
+            self.wait(period_start + self.half)
+            periods += 1
+            if self.args.periods and periods >= self.args.periods:
+                break
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['FT8', 'FT4'], default='FT8')
+    parser.add_argument('--decodes', type=int, default=30, help='number of decodes every period')
+    parser.add_argument('--stations', type=int, default=500, help='number of different callsigns on the band')
+    parser.add_argument('--to-me', type=float, default=0.02, help='probability a message other than CQ is addressed to us')
+    parser.add_argument('--answer-rate', type=float, default=0.6, help='probability the station we are calling answers')
+    parser.add_argument('--spread', type=float, default=None, help='seconds to send decodes of a period, 0 sends all at once')
+    parser.add_argument('--periods', type=int, default=0, help='stop after this number of periods, 0 runs until Ctrl+C')
+    parser.add_argument('--callsign', default=MY_CALLSIGN)
+    parser.add_argument('--grid', default=MY_GRID)
+    parser.add_argument('--port', type=int, default=0, help='local port, receiver locks to the first address it hears')
+    parser.add_argument('--pid', type=int, action='append', default=[], help='process to measure CPU usage, can be repeated')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--traffic', action='store_true', help='stations make QSOs instead of sending random messages')
+    parser.add_argument('--behaviours', type=float, nargs=3, default=[0.6, 0.3, 0.1], metavar=('ANSWER', 'BUSY', 'SILENT'),
+        help='with --traffic, weights of stations answering us, busy with others and never hearing us')
+    args = parser.parse_args()
+
+    band = None
+    if args.traffic:
+        from benchmarks.traffic import TrafficModel
+        band = TrafficModel(args.stations, args.behaviours, random.Random(args.seed))
+    simulator = Simulator(args, band)
+    print(
+        f'Sending {args.decodes} {args.mode} decodes every {TIMING[args.mode]["half"]} s from '
+        f'{len(simulator.band.stations)} callsigns to {WSJTX_IP}:{WSJTX_PORT}'
+    )
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.metrics.summary()
@@ -0,0 +1,211 @@
+# Stations on the band making QSOs with each other and with us, used by the simulator instead of random messages
+# Every station runs the QSO state machine CQ -> GRID -> SNR -> RSNR -> RR73 -> 73, messages are parsed with
+# the same call_types as receiver, so what receiver sees is what the stations answer to
+import random, typing
+
+import wsjtx
+from benchmarks.simulator import format_report, load_callsigns
+
+# Message type a station sends after hearing a message type addressed to it, None ends the QSO
+NEXT_MESSAGE: typing.Dict[str, typing.Optional[str]] = {
+    'CQ': 'GRID',
+    'GRID': 'SNR',
+    'SNR': 'RSNR',
+    'RSNR': 'RR73',
+    'RR73': '73',
+    '73': None
+}
+
+# How a station treats us
+#   answer: answers when it's not in another QSO
+#   busy: mostly in QSO with other stations, rarely answers us
+#   silent: calls CQ but never hears us
+BEHAVIOURS = ['answer', 'busy', 'silent']
+
+def message_type(message: str) -> typing.Tuple[str, typing.Optional[dict]]:
+    for types, c in wsjtx.call_types.items():
+        matching = c.match(message)
+        if matching:
+            data = matching.groupdict()
+            if types == 'R73':
+                return ('73' if data['R73'] == '73' else 'RR73'), data
+            return types, data
+    return '', None
+
+class VirtualStation(object):
+    __slots__ = ('callsign', 'grid', 'snr', 'delta_frequency', 'even', 'behaviour', 'partner', 'last_sent', 'waiting', 'inbox', 'worked')
+
+    def __init__(self, callsign: str, grid: str, snr: int, delta_frequency: int, even: bool, behaviour: str):
+        self.callsign = callsign
+        self.grid = grid
+        self.snr = snr
+        self.delta_frequency = delta_frequency
+        self.even = even
+        self.behaviour = behaviour
+        self.partner = ''
+        self.last_sent = ''
+        self.waiting = 0
+        # Messages addressed to this station heard in the latest period, callsign to message type
+        self.inbox: typing.Dict[str, str] = {}
+        self.worked: typing.Set[str] = set()
+
+class TrafficModel(object):
+    """Stations making QSOs, the station we call answers according to its behaviour"""
+
+    def __init__(
+        self,
+        num_stations: int,
+        behaviour_weights: typing.List[float],
+        rnd: random.Random,
+        cq_rate: float = 0.3,
+        call_rate: float = 0.3,
+        call_me_rate: float = 0.005,
+        patience: int = 3
+    ):
+        self.rnd = rnd
+        self.cq_rate = cq_rate
+        self.call_rate = call_rate
+        self.call_me_rate = call_me_rate
+        self.patience = patience
+        self.stations: typing.Dict[str, VirtualStation] = {}
+        for callsign in load_callsigns(num_stations, rnd):
+            self.stations[callsign] = VirtualStation(
+                callsign,
+                f'{rnd.choice("ABCDEFGHIJKLMNOPQR")}{rnd.choice("ABCDEFGHIJKLMNOPQR")}{rnd.randint(0, 9)}{rnd.randint(0, 9)}',
+                rnd.randint(-24, 10),
+                rnd.randint(200, 2900),
+                rnd.random() < 0.5,
+                rnd.choices(BEHAVIOURS, behaviour_weights)[0]
+            )
+        self.by_parity = {
+            even: [s for s in self.stations.values() if s.even == even]
+            for even in [True, False]
+        }
+        self.period: typing.Optional[int] = None
+        # CQ callers of the latest period, answered by idle stations of the other parity
+        self.cqs: typing.List[VirtualStation] = []
+        self.sent: typing.Dict[int, typing.List[typing.Tuple[VirtualStation, str]]] = {}
+
+    def format(self, station: VirtualStation, to: str, kind: str) -> str:
+        report = format_report(self.rnd.randint(-24, 10))
+        return {
+            'CQ': f'CQ {station.callsign} {station.grid}',
+            'GRID': f'{to} {station.callsign} {station.grid}',
+            'SNR': f'{to} {station.callsign} {report}',
+            'RSNR': f'{to} {station.callsign} R{report}',
+            'RR73': f'{to} {station.callsign} RR73',
+            '73': f'{to} {station.callsign} 73'
+        }[kind]
+
+    def accepts(self, station: VirtualStation, caller: str, my_callsign: str) -> bool:
+        if caller in station.worked:
+            return False
+        if caller != my_callsign:
+            return True
+        if station.behaviour == 'answer':
+            return True
+        return station.behaviour == 'busy' and self.rnd.random() < 0.2
+
+    def next_message(self, station: VirtualStation, my_callsign: str) -> str:
+        if station.partner:
+            heard = station.inbox.get(station.partner, None)
+            kind = NEXT_MESSAGE.get(heard, '') if heard else ''
+            if heard and kind is None:
+                # 73 after our RR73, the QSO is done
+                station.worked.add(station.partner)
+                station.partner = ''
+                return ''
+            if kind:
+                station.waiting = 0
+                if kind == '73':
+                    station.worked.add(station.partner)
+                    partner, station.partner = station.partner, ''
+                    return self.format(station, partner, kind)
+                station.last_sent = self.format(station, station.partner, kind)
+                return station.last_sent
+            # Nothing new from the partner, send the same message again until giving up
+            station.waiting += 1
+            if station.waiting > self.patience:
+                station.partner = ''
+                station.waiting = 0
+            else:
+                return station.last_sent
+
+        callers = [c for c in station.inbox if self.accepts(station, c, my_callsign)]
+        if callers:
+            caller = my_callsign if my_callsign in callers and station.behaviour == 'answer' else self.rnd.choice(callers)
+            kind = NEXT_MESSAGE.get(station.inbox[caller], None)
+            if kind and kind != '73':
+                station.partner = caller
+                station.waiting = 0
+                station.last_sent = self.format(station, caller, kind)
+                return station.last_sent
+
+        if station.behaviour == 'answer' and my_callsign not in station.worked and self.rnd.random() < self.call_me_rate:
+            station.partner = my_callsign
+            station.last_sent = self.format(station, my_callsign, 'GRID')
+            return station.last_sent
+
+        call_rate = self.call_rate*2 if station.behaviour == 'busy' else self.call_rate
+        cqs = [s for s in self.cqs if not s.partner and s.callsign not in station.worked]
+        if cqs and self.rnd.random() < call_rate:
+            called = self.rnd.choice(cqs)
+            station.partner = called.callsign
+            station.last_sent = self.format(station, called.callsign, 'GRID')
+            return station.last_sent
+
+        if self.rnd.random() < self.cq_rate:
+            station.last_sent = self.format(station, '', 'CQ')
+            return station.last_sent
+        return ''
+
+    def step(self, period: int, my_callsign: str):
+        # Every station of this period parity transmits, then the others hear it
+        even = period%2 == 0
+        sent = []
+        for station in self.by_parity[even]:
+            message = self.next_message(station, my_callsign)
+            station.inbox.clear()
+            if message:
+                sent.append((station, message))
+
+        self.cqs = []
+        for station, message in sent:
+            kind, data = message_type(message)
+            if kind == 'CQ':
+                self.cqs.append(station)
+            elif data:
+                called = self.stations.get(data['to'], None)
+                if called is not None and called.even != even:
+                    called.inbox[station.callsign] = kind
+        self.sent[period] = sent
+
+    def hear(self, message: str, period: int, my_callsign: str):
+        # Our transmission, heard by the station we call when it's receiving in this period
+        kind, data = message_type(message)
+        if not data or data['callsign'] != my_callsign:
+            return
+        station = self.stations.get(data['to'], None)
+        if station is None or station.even == (period%2 == 0) or station.behaviour == 'silent':
+            return
+        station.inbox[my_callsign] = kind
+
+    def decodes(self, period: int, num_decodes: int, my_callsign: str) -> typing.List[typing.Tuple[str, int, float, int]]:
+        if self.period is None:
+            self.period = period - 1
+        for p in range(self.period + 1, period + 1):
+            self.step(p, my_callsign)
+            self.sent.pop(p - 1, None)
+        self.period = period
+
+        # Messages to us are always decoded, the weakest of the others are lost when the band is busy
+        sent = sorted(self.sent.get(period, []), key=lambda s: (not s[1].startswith(f'{my_callsign} '), -s[0].snr))
+        return [
+            (
+                message,
+                max(-26, min(station.snr + self.rnd.randint(-3, 3), 20)),
+                round(self.rnd.gauss(0.1, 0.2), 1),
+                station.delta_frequency
+            )
+            for station, message in sent[:num_decodes]
+        ]
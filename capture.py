@@ -0,0 +1,33 @@
+import struct, typing
+
+# Arrival time and length before every datagram
+RECORD_HEADER = struct.Struct('!dH')
+
+class CaptureWriter(object):
+    """Append only file of datagrams received from WSJT-X"""
+
+    def __init__(self, location: str):
+        self.f = open(location, 'ab')
+
+    def write(self, timestamp: float, data: bytes):
+        self.f.write(RECORD_HEADER.pack(timestamp, len(data)))
+        self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+def read_capture(location: str) -> typing.Iterator[typing.Tuple[float, bytes]]:
+    with open(location, 'rb') as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, length = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            # Last record is cut when receiver is killed while writing
+            if len(data) < length:
+                return
+            yield timestamp, data
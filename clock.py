@@ -0,0 +1,39 @@
+import time
+from datetime import datetime
+
+class Clock(object):
+    """Wall clock used by receiver and transmitter, replaced by ReplayClock when captured packets are replayed"""
+
+    def now(self) -> float:
+        return datetime.now().timestamp()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+class ReplayClock(Clock):
+    """Simulated clock that starts at the time of the first captured packet
+
+    Speed 1 runs in real time, speed N runs N times faster and speed 0 never waits
+    """
+
+    def __init__(self, start: float, speed: float = 0):
+        self.current = start
+        self.speed = speed
+        self.started = time.perf_counter()
+        self.start = start
+
+    def now(self) -> float:
+        return self.current
+
+    def sleep(self, seconds: float):
+        self.advance(self.current + seconds)
+
+    def advance(self, until: float):
+        if until <= self.current:
+            return
+        if self.speed:
+            # Wait until the wall clock catches up, so the time spent processing is not added on top
+            delay = self.started + (until - self.start)/self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.current = until
@@ -21,13 +21,14 @@ REDIS_PORT = int(CONNECTION_CONFIG['REDIS_PORT'])
 QRZ_API_KEY = CONNECTION_CONFIG.get('QRZ_API_KEY', '')
 QRZ_USERNAME = CONNECTION_CONFIG.get('QRZ_USERNAME', '')
 QRZ_PASSWORD = CONNECTION_CONFIG.get('QRZ_PASSWORD', '')
+QRZ_LOGBOOK_URL = CONNECTION_CONFIG.get('QRZ_LOGBOOK_URL', 'https://logbook.qrz.com/api')
 # =========================================================================================
 
 
 # Config that can be edited in this script
 # ===================================================================
 # Number of days backward to get logs from qrz
-# Set to 0 to get all logs
+# Set to 0 to sync all logs, only logs modified since the last sync are downloaded
 # restart receiver + transmitter
 NUM_DAYS_LOG = 0
 
@@ -101,6 +102,25 @@ MAX_FREQUENCY = 2200
 # restart receiver + transmitter
 EXPIRED_TIME = 0
 
+# Number of seconds a rejected callsign is remembered
+# so its messages are not processed again until then
+# Set to 0 to disable this feature, 5*60 works well
+# restart receiver + transmitter
+REJECTED_CACHE_TIME = 0
+
+# Number of seconds the queue and transmit counters are kept after receiver stopped,
+# so restarting receiver continues the QSO instead of starting with empty queue
+# Only kept if the first status from WSJT-X has the same callsign, band and mode
+# Set to 0 to disable this feature, 2*60 works well
+# restart receiver + transmitter
+WARM_RESTART_TIME = 0
+
+# Number of seconds the queue of previous band and mode is kept after changing band or mode,
+# so going back to the band continues with the same queue
+# Set to 0 to remove the queue right away when changing band or mode, 10*60 works well
+# restart receiver + transmitter
+BAND_QUEUE_TIME = 0
+
 # Maximum time callsign will be in spam
 # Set to 0 will make the callsign in spam indefinitely
 # Note: restarting receiver will remove callsign from spam
@@ -158,9 +178,20 @@ SORTBY = [
 # Only used for adif_parser.py
 LOG_LOCATION = os.path.join(CURRENT_DIR, 'data', 'log.adi')
 
+# Number of QSO converted and put to database at once when importing log
+ADIF_BATCH_SIZE = 10000
+
 # List of valid callsign based on lotw
 VALID_CALLSIGN_LOCATION = os.path.join(CURRENT_DIR, 'data', 'lotw-user-activity.csv')
 
+# Country file for callsign lookup and mapping from country to DXCC number
+CTY_LOCATION = os.path.join(CURRENT_DIR, 'data', 'cty.plist')
+COUNTRY_TO_DXCC_LOCATION = os.path.join(CURRENT_DIR, 'data', 'countrytodxcc.json')
+
+# Snapshot of all data files above, compiled again when one of them is changed
+# Compile it before starting with python static_data.py
+STATIC_DATA_LOCATION = os.path.join(CURRENT_DIR, 'data', 'static_data.pickle')
+
 # List of receiver callsign that user want to be blacklisted
 # if that callsign is being called by callsign that we wanted
 # Restarting receiver + transmitter is not required (but recommended)
@@ -179,6 +210,41 @@ CALLSIGN_EXCEPTION = os.path.join(CURRENT_DIR, 'data', 'Callsign_Exception.txt')
 # #########################################################################
 DEBUGGING = False
 
+# Every packet receiver gets from WSJT-X is appended to this file with the time it arrived,
+# replay it with python -m benchmarks.replay
+# Set to empty string to disable this feature
+CAPTURE_LOCATION = ''
+
+# Time every stage of receiver (parsing, Redis, MongoDB, country lookup, QRZ, logging),
+# the histograms are logged with the filter counters every period
+STAGE_TIMING = False
+
+# Packet taking more seconds than this is written with the time of every stage and the message,
+# as JSON lines to SLOW_PACKET_LOCATION, or to the log if it's empty (only when STAGE_TIMING is enabled)
+SLOW_PACKET_THRESHOLD = 0.1
+SLOW_PACKET_LOCATION = ''
+
+# Count commands, round trips, bytes and time of MongoDB and Redis by packet type,
+# receiver and transmitter log the summary every period
+DATABASE_STATS = False
+
+# Serve counters of receiver and transmitter in Prometheus text format on http://METRICS_HOST:port/metrics
+# from a background thread, 0 disables it (ports must differ when both are enabled)
+RECEIVER_METRICS_PORT = 0
+TRANSMITTER_METRICS_PORT = 0
+METRICS_HOST = '127.0.0.1'
+
+# Every step of a QSO, from the first decode of the station to the QSO logged by WSJT-X, is appended
+# as JSON lines to this file by receiver and transmitter, empty disables it, report with python qso_trace.py
+QSO_TRACE_LOCATION = ''
+
+# Journal of logger.py, one JSON line for every decode, status change and TX, replacing log/message.log
+# A segment is compressed with an index of time and callsign when it reaches JOURNAL_SEGMENT_BYTES,
+# segments older than JOURNAL_KEEP_DAYS are deleted (0 keeps all), query with python journal.py --callsign
+JOURNAL_LOCATION = os.path.join(CURRENT_DIR, 'log', 'journal')
+JOURNAL_SEGMENT_BYTES = 8*1024*1024
+JOURNAL_KEEP_DAYS = 90
+
 # DON'T CHANGE THIS
 TIMING = {
     'FT4': {
@@ -0,0 +1,162 @@
+import logging, threading, time, typing
+
+import bson
+from pymongo import monitoring
+
+from config import DATABASE_STATS, RECEIVER_METRICS_PORT, TRANSMITTER_METRICS_PORT
+
+# Commands are timed when they are logged or served as metrics
+ENABLED = DATABASE_STATS or bool(RECEIVER_METRICS_PORT or TRANSMITTER_METRICS_PORT)
+
+class Counter(object):
+    __slots__ = ('ops', 'round_trips', 'size', 'seconds')
+
+    def __init__(self):
+        self.ops = 0
+        self.round_trips = 0
+        self.size = 0
+        self.seconds = 0.0
+
+class DatabaseStats(object):
+    """Commands, round trips, bytes and time of MongoDB and Redis, per packet kind and per period
+
+    The kind is set by the thread doing the work, commands of other threads (writing message history) are 'background'
+    Bytes of Redis are the length of the arguments and replies as text, close to the size on the wire
+    """
+
+    def __init__(self, process: str = ''):
+        self.process = process
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.packets: typing.Dict[str, int] = {}
+        self.counters: typing.Dict[typing.Tuple[str, str], Counter] = {}
+        # Histogram of metrics.py observing the time of every command by backend, set when metrics are served
+        self.latency: typing.Any = None
+
+    def begin(self, kind: str):
+        self.local.kind = kind
+        with self.lock:
+            self.packets[kind] = self.packets.get(kind, 0) + 1
+
+    def label(self, packet: typing.Any):
+        self.begin(type(packet).__name__[2:].lower())
+
+    def end(self):
+        self.local.kind = ''
+
+    def add(self, backend: str, ops: int, size: int, seconds: float):
+        kind = getattr(self.local, 'kind', '') or 'background'
+        with self.lock:
+            counter = self.counters.get((backend, kind), None)
+            if counter is None:
+                counter = self.counters[(backend, kind)] = Counter()
+            counter.ops += ops
+            counter.round_trips += 1
+            counter.size += size
+            counter.seconds += seconds
+            if self.latency is not None:
+                self.latency.observe(seconds, (backend,))
+
+    def report(self, period_start: float):
+        # Logs the summary since the previous report and starts counting again
+        period = time.strftime('%H:%M:%S', time.gmtime(period_start))
+        with self.lock:
+            packets, self.packets = self.packets, {}
+            counters, self.counters = self.counters, {}
+
+        totals = {b: sum(c.ops for (k, _), c in counters.items() if k == b) for b in ['mongo', 'redis']}
+        seconds = sum(c.seconds for c in counters.values())
+        logging.info(
+            '[DB] [%s] period %s — %s%s Mongo ops, %s Redis ops, %.2f s DB time',
+            self.process.upper(), period, ''.join(f'{v} {k}, ' for k, v in sorted(packets.items())),
+            totals['mongo'], totals['redis'], seconds
+        )
+        for (backend, kind), c in sorted(counters.items(), key=lambda c: -c[1].seconds):
+            logging.info(
+                '[DB] [%s] [%s] [%s] %s ops, '
+                '%s round trips, %.1f KB, %.1f ms',
+                self.process.upper(), backend.upper(), kind.upper(), c.ops, c.round_trips, c.size/1024, c.seconds*1000
+            )
+
+class NullDatabaseStats(DatabaseStats):
+    """Used when DATABASE_STATS is disabled, every call does nothing except the latency of metrics"""
+
+    def begin(self, kind: str):
+        pass
+
+    def label(self, packet: typing.Any):
+        pass
+
+    def end(self):
+        pass
+
+    def add(self, backend: str, ops: int, size: int, seconds: float):
+        if self.latency is not None:
+            with self.lock:
+                self.latency.observe(seconds, (backend,))
+
+    def report(self, period_start: float):
+        pass
+
+class MongoListener(monitoring.CommandListener):
+
+    def __init__(self, stats: DatabaseStats):
+        self.stats = stats
+        # Size of the command until its reply arrives, by request id
+        self.sizes: typing.Dict[int, int] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self.sizes[event.request_id] = len(bson.encode(event.command))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        size = self.sizes.pop(event.request_id, 0) + len(bson.encode(event.reply))
+        self.stats.add('mongo', 1, size, event.duration_micros/1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.stats.add('mongo', 1, self.sizes.pop(event.request_id, 0), event.duration_micros/1e6)
+
+def text_size(values: typing.Any) -> int:
+    if values is None:
+        return 0
+    if isinstance(values, (list, tuple)):
+        return sum(text_size(v) for v in values)
+    return len(str(values))
+
+def instrument_redis(client: typing.Any) -> typing.Any:
+    # Wraps execute_command and the execute of pipelines of this client, returns the client unchanged when disabled
+    if not ENABLED:
+        return client
+
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def timed_execute_command(*args, **options):
+        start = time.perf_counter()
+        result = execute_command(*args, **options)
+        STATS.add('redis', 1, text_size(args) + text_size(result), time.perf_counter() - start)
+        return result
+
+    def timed_pipeline(*args, **kwargs):
+        p = pipeline(*args, **kwargs)
+        execute = p.execute
+
+        def timed_execute(*args, **kwargs):
+            num_commands = len(p.command_stack)
+            size = sum(text_size(c[0]) for c in p.command_stack)
+            start = time.perf_counter()
+            result = execute(*args, **kwargs)
+            STATS.add('redis', num_commands, size + text_size(result), time.perf_counter() - start)
+            return result
+
+        p.execute = timed_execute
+        return p
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    return client
+
+def mongo_listeners() -> typing.List[monitoring.CommandListener]:
+    return [MongoListener(STATS)] if ENABLED else []
+
+# Process name is set by the main of receiver and transmitter
+STATS: DatabaseStats = DatabaseStats() if DATABASE_STATS else NullDatabaseStats()
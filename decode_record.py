@@ -0,0 +1,140 @@
+import typing
+
+# Fields from WSJT-X decode packet
+DECODE_FIELDS = (
+    'New',
+    'Time',
+    'SNR',
+    'DeltaTime',
+    'DeltaFrequency',
+    'Mode',
+    'Message',
+    'LowConfidence',
+    'OffAir'
+)
+
+# Fields from the regex of parsing_message
+PARSE_FIELDS = (
+    'type',
+    'extra',
+    'callsign',
+    'prefixed_callsign',
+    'prefix',
+    'suffix',
+    'suffix2',
+    'suffix3',
+    'to',
+    'prefixed_to',
+    'prefix_to',
+    'suffix_to',
+    'suffix2_to',
+    'suffix3_to',
+    'grid',
+    'snr',
+    'R73'
+)
+
+# Fields added by filter_decode and completing_data
+LOCATION_FIELDS = (
+    'country',
+    'dxcc',
+    'continent',
+    'isNewCallsign',
+    'isNewDXCC',
+    'isVIPDXCC',
+    'isValid'
+)
+
+# Fields used by transmitter to choose the next callsign
+QUEUE_FIELDS = (
+    'band',
+    'mode',
+    'tries',
+    'max_transmit_count',
+    'num_inactive_before_cut',
+    'importance',
+    'expired',
+    'tried',
+    'isReemerging',
+    'isSpam',
+    'isEven',
+    'skipGrid',
+    'nextTx',
+    'timestamp',
+    'expiresAt',
+    'spamUntil',
+    'traceId'
+)
+
+FIELDS = DECODE_FIELDS + PARSE_FIELDS + LOCATION_FIELDS + QUEUE_FIELDS
+FIELDS_SET = frozenset(FIELDS)
+
+class DecodeRecord(object):
+    """Decode while it's processed by receiver, converted to document only when written to database
+
+    Field that is not set is missing like the key of a dictionary,
+    so receiver uses the record the same way as the document from database
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, data: typing.Optional[dict] = None):
+        if data:
+            self.update(data)
+
+    @classmethod
+    def from_packet(cls, packet_data: dict, parsed_data: dict) -> 'DecodeRecord':
+        record = cls()
+        for k in DECODE_FIELDS:
+            setattr(record, k, packet_data[k])
+        for k, v in parsed_data.items():
+            setattr(record, k, v)
+        return record
+
+    def __getitem__(self, key: str) -> typing.Any:
+        if key not in FIELDS_SET:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: typing.Any):
+        # Unknown field raises AttributeError because there is no __dict__
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in FIELDS_SET and hasattr(self, key)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.as_document()})'
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        if key not in FIELDS_SET:
+            return default
+        return getattr(self, key, default)
+
+    def pop(self, key: str, *default: typing.Any) -> typing.Any:
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        delattr(self, key)
+        return value
+
+    def update(self, data: dict):
+        for k, v in data.items():
+            setattr(self, k, v)
+
+    def keys(self) -> typing.List[str]:
+        return [k for k in FIELDS if hasattr(self, k)]
+
+    def as_document(self) -> dict:
+        document = {}
+        for k in FIELDS:
+            try:
+                document[k] = getattr(self, k)
+            except AttributeError:
+                pass
+        return document
@@ -1,25 +1,77 @@
-from logging.handlers import RotatingFileHandler
-
-class RollingFileHandler(RotatingFileHandler):
-
-    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None, delay=False):
-        self.last_backup_cnt = 0
-        super(RollingFileHandler, self).__init__(filename=filename,
-                                                 mode=mode,
-                                                 maxBytes=maxBytes,
-                                                 backupCount=backupCount,
-                                                 encoding=encoding,
-                                                 delay=delay)
-
-    # override
-    def doRollover(self):
-        if self.stream:
-            self.stream.close()
-            self.stream = None
-        # my code starts here
-        self.last_backup_cnt += 1
-        nextName = "%s.%d" % (self.baseFilename, self.last_backup_cnt)
-        self.rotate(self.baseFilename, nextName)
-        # my code ends here
-        if not self.delay:
-            self.stream = self._open()
\ No newline at end of file
+import atexit, logging, queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '[%(asctime)s] [%(levelname)s] %(message)s'
+
+class BatchMixin(object):
+    """StreamHandler flushes after every record, BatchQueueListener flushes once after writing a batch of records"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+class BatchStreamHandler(BatchMixin, logging.StreamHandler):
+    pass
+
+class BatchRotatingFileHandler(BatchMixin, RotatingFileHandler):
+    pass
+
+class LocalQueueHandler(QueueHandler):
+    """Puts the record in the queue as it is, so the message is formatted by the listener thread
+
+    QueueHandler formats the message before putting it in the queue for other processes, not needed here
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class BatchQueueListener(QueueListener):
+    """Writes every record waiting in the queue, then flushes the handlers once
+
+    Formatting, writing and rotating the log happen in this thread, never in the thread logging the record
+    """
+
+    # Records written before flushing, so a burst of records is still shown soon
+    MAX_BATCH = 100
+
+    def _monitor(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.MAX_BATCH:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopped = False
+            for record in records:
+                if record is self._sentinel:
+                    stopped = True
+                    continue
+                self.handle(record)
+            for handler in self.handlers:
+                if isinstance(handler, BatchMixin):
+                    handler.flush_batch()
+            if stopped:
+                break
+
+    def stop(self):
+        # Also called at exit, after it was already stopped
+        if self._thread is not None:
+            super().stop()
+
+def start_logging(*handlers: logging.Handler) -> BatchQueueListener:
+    # Root logger only puts records in a queue, the handlers are used by the listener thread
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logging.basicConfig(
+        level=min(h.level for h in handlers) or logging.DEBUG,
+        handlers=[LocalQueueHandler(log_queue)],
+        force=True
+    )
+    listener = BatchQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,258 @@
+import argparse, gzip, json, logging, os, re, time, typing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Open segment, plain JSON lines so it survives a crash and can be followed while it's written
+CURRENT = 'current.jsonl'
+
+# Records compressed together, a query only decompresses the blocks matching its time range and callsign
+BLOCK_RECORDS = 2000
+
+GRID = re.compile(r'^[A-R]{2}[0-9]{2}([A-X]{2})?$')
+CALLSIGN = re.compile(r'^[A-Z0-9/]*[0-9][A-Z0-9/]*$')
+ADIF_CALL = re.compile(r'<call:(\d+)(:[^>]*)?>', re.IGNORECASE)
+
+def message_callsigns(message: str) -> typing.List[str]:
+    # Words of the message that look like callsigns, hashed callsigns are written in <>
+    callsigns = []
+    for word in message.upper().split():
+        word = word.strip('<>')
+        if 3 <= len(word) <= 13 and CALLSIGN.match(word) and not GRID.match(word) and any(c.isalpha() for c in word):
+            callsigns.append(word)
+    return callsigns
+
+def record_callsigns(record: dict) -> typing.List[str]:
+    # Callsigns of the message, the DX call of a status and the CALL field of a logged ADIF
+    callsigns = message_callsigns(record.get('msg', ''))
+    if record.get('dx', ''):
+        callsigns.append(record['dx'].upper())
+    call_mo = ADIF_CALL.search(record.get('adif', ''))
+    if call_mo:
+        callsigns.append(record['adif'][call_mo.end():call_mo.end() + int(call_mo.group(1))].upper())
+    return callsigns
+
+def seal(directory: str, source: str) -> typing.Optional[str]:
+    """Compresses the closed segment in blocks and writes the index next to it, returns the name of the segment
+
+    The segment is a gzip file of one member per block, so zcat still reads all of it
+    The index has the time range, offset, length and callsigns of every block
+    """
+    with open(source, 'rb') as f:
+        lines = [l for l in f.read().splitlines() if l.strip()]
+    records = []
+    for line in lines:
+        try:
+            records.append((json.loads(line), line))
+        except ValueError:
+            # Last line is cut when logger is killed while writing
+            continue
+    if not records:
+        os.remove(source)
+        return None
+
+    start = records[0][0]['time']
+    name = 'journal-' + datetime.fromtimestamp(start, timezone.utc).strftime('%Y%m%dT%H%M%S')
+    while os.path.exists(os.path.join(directory, name + '.jsonl.gz')):
+        name += '_'
+
+    blocks = []
+    offset = 0
+    with open(os.path.join(directory, name + '.jsonl.gz.tmp'), 'wb') as f:
+        for i in range(0, len(records), BLOCK_RECORDS):
+            block = records[i:i + BLOCK_RECORDS]
+            data = gzip.compress(b'\n'.join(l for _, l in block) + b'\n')
+            f.write(data)
+            blocks.append({
+                'start': block[0][0]['time'],
+                'end': block[-1][0]['time'],
+                'offset': offset,
+                'length': len(data),
+                'records': len(block),
+                'callsigns': sorted({c for r, _ in block for c in record_callsigns(r)})
+            })
+            offset += len(data)
+
+    index = {'start': start, 'end': records[-1][0]['time'], 'records': len(records), 'blocks': blocks}
+    with open(os.path.join(directory, name + '.idx.json'), 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    # Index is written first, a segment without index is never read
+    os.replace(os.path.join(directory, name + '.jsonl.gz.tmp'), os.path.join(directory, name + '.jsonl.gz'))
+    os.remove(source)
+    return name
+
+def remove_old_segments(directory: str, keep_days: float, now: float):
+    if not keep_days:
+        return
+    for name in os.listdir(directory):
+        if not name.endswith('.idx.json'):
+            continue
+        location = os.path.join(directory, name)
+        try:
+            with open(location) as f:
+                end = json.load(f)['end']
+        except (OSError, ValueError, KeyError):
+            continue
+        if end < now - keep_days*86400:
+            segment = location[:-len('.idx.json')] + '.jsonl.gz'
+            if os.path.exists(segment):
+                os.remove(segment)
+            os.remove(location)
+
+class JournalWriter(object):
+    """One JSON line for every decode, status change and TX, compressed by a background thread after rotation"""
+
+    def __init__(self, directory: str, segment_bytes: int, keep_days: float = 0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.keep_days = keep_days
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal')
+        os.makedirs(directory, exist_ok=True)
+        self.location = os.path.join(directory, CURRENT)
+        # Segments left by the previous run, open or not compressed yet
+        for name in sorted(os.listdir(directory)):
+            if name.startswith('sealing-'):
+                self.pool.submit(self.seal, os.path.join(directory, name))
+        if os.path.exists(self.location):
+            self.rotate()
+        self.f = open(self.location, 'a')
+        self.size = self.f.tell()
+
+    def write(self, record: dict):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        self.f.write(line)
+        self.size += len(line)
+        if self.size >= self.segment_bytes:
+            self.f.close()
+            self.rotate()
+            self.f = open(self.location, 'a')
+            self.size = 0
+
+    def rotate(self):
+        sealed = os.path.join(self.directory, f'sealing-{time.time():.6f}.jsonl')
+        os.replace(self.location, sealed)
+        self.pool.submit(self.seal, sealed)
+
+    def seal(self, sealed: str):
+        try:
+            seal(self.directory, sealed)
+            remove_old_segments(self.directory, self.keep_days, time.time())
+        except:
+            logging.exception('Failed to compress journal!')
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+        self.pool.shutdown()
+
+def read_block(location: str, block: dict) -> typing.List[bytes]:
+    with open(location, 'rb') as f:
+        f.seek(block['offset'])
+        return gzip.decompress(f.read(block['length'])).splitlines()
+
+def line_time(line: bytes) -> float:
+    # Time is the first key written by logger.py, read without decoding the whole line
+    if line.startswith(b'{"time":'):
+        try:
+            return float(line[8:line.index(b',')])
+        except ValueError:
+            pass
+    return json.loads(line)['time']
+
+def query(
+    directory: str,
+    callsign: str = '',
+    since: float = 0,
+    until: float = float('inf'),
+    kinds: typing.Sequence[str] = ()
+) -> typing.Iterator[dict]:
+    """Records of the callsign between since and until in time order, the open segment is read last"""
+    callsign = callsign.upper()
+    needle = callsign.encode()
+
+    def matched(lines: typing.List[bytes]) -> typing.Iterator[dict]:
+        # Lines without the callsign or out of the time range are skipped before decoding them
+        for line in lines:
+            if needle not in line:
+                continue
+            try:
+                if not since <= line_time(line) <= until:
+                    continue
+                record = json.loads(line)
+            except (ValueError, KeyError):
+                # Last line is cut when logger is killed while writing
+                continue
+            if (not kinds or record['kind'] in kinds) and (not callsign or callsign in record_callsigns(record)):
+                yield record
+
+    segments = []
+    for name in os.listdir(directory):
+        if not name.endswith('.idx.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            continue
+        location = os.path.join(directory, name[:-len('.idx.json')] + '.jsonl.gz')
+        if index['end'] < since or index['start'] > until or not os.path.exists(location):
+            continue
+        segments.append((index['start'], location, index))
+
+    for _, location, index in sorted(segments, key=lambda s: s[0]):
+        for block in index['blocks']:
+            if block['end'] < since or block['start'] > until:
+                continue
+            if callsign and callsign not in block['callsigns']:
+                continue
+            yield from matched(read_block(location, block))
+
+    # Segments still being compressed, then the open segment
+    for name in sorted(n for n in os.listdir(directory) if n.startswith('sealing-')) + [CURRENT]:
+        try:
+            with open(os.path.join(directory, name), 'rb') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        yield from matched(lines)
+
+def format_record(record: dict) -> str:
+    # Text like the lines logger.py wrote to message.log
+    when = datetime.fromtimestamp(record['time'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    prefix = f'[{when}] [HOST: {record.get("host", "")}]'
+    if record['kind'] == 'rx':
+        return (
+            f'{prefix} [RX] [MODE: {record["mode"]}] [BAND: {record["band"]}] [FREQUENCY: {record["freq"]}] '
+            f'[UTC: {record["utc"]}] [DT: {record["dt"]}] [DB: {record["snr"]}] {record["md"]} {record["msg"]}'
+        )
+    if record['kind'] == 'tx':
+        return f'{prefix} [TX] [MODE: {record["mode"]}] [BAND: {record["band"]}] [FREQUENCY: {record["freq"]}] {record["msg"]}'
+    if record['kind'] == 'adif':
+        return f'{prefix} LOGGED ADIF: {record["adif"]}'
+    details = ' '.join(f'[{k.upper()}: {v}]' for k, v in record.items() if k not in ['time', 'kind', 'host'])
+    return f'{prefix} [{record["kind"].upper()}] {details}'.rstrip()
+
+def parse_time(value: str) -> float:
+    # UTC date and time, or hours before now
+    try:
+        return time.time() - float(value)*3600
+    except ValueError:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+if __name__ == '__main__':
+    from config import JOURNAL_LOCATION
+    parser = argparse.ArgumentParser(description='Query the decode journal written by logger.py')
+    parser.add_argument('--location', default=JOURNAL_LOCATION)
+    parser.add_argument('--callsign', default='', help='only records with this callsign in the message')
+    parser.add_argument('--since', type=parse_time, default=0, help='UTC time like 2024-05-01T12:00, or hours before now')
+    parser.add_argument('--until', type=parse_time, default=float('inf'), help='UTC time like 2024-05-01T13:00, or hours before now')
+    parser.add_argument('--kind', action='append', default=[], choices=['rx', 'tx', 'status', 'adif', 'open', 'close'],
+        help='only records of this kind, can be repeated')
+    parser.add_argument('--json', action='store_true', help='print the records as JSON lines')
+    args = parser.parse_args()
+    if not os.path.isdir(args.location):
+        parser.error(f'no journal in {args.location}')
+
+    for record in query(args.location, args.callsign, args.since, args.until, args.kind):
+        print(json.dumps(record) if args.json else format_record(record))
@@ -1,16 +1,18 @@
-import os, socket, select, wsjtx, struct, typing
+import socket, select, wsjtx, struct, time, typing
 
 from pyhamtools.frequency import freq_to_band
 
-from config import CURRENT_DIR, MULTICAST, WSJTX_IP, WSJTX_PORT, DEBUGGING
+from config import DEBUGGING, JOURNAL_KEEP_DAYS, JOURNAL_LOCATION, JOURNAL_SEGMENT_BYTES, MULTICAST, WSJTX_IP, WSJTX_PORT
 import logging
-from handler import RollingFileHandler
+from handler import BatchStreamHandler, start_logging
+from journal import JournalWriter
 
 LOCAL_STATES = {
     'band': 0,
     'mode': '',
     'transmitting': False,
-    'current_tx': ''
+    'current_tx': '',
+    'status': None
 }
 
 if MULTICAST:
@@ -23,9 +25,11 @@ sock_wsjt.setblocking(False) # Set socket to non-blocking mode
 sock_wsjt.setblocking(0)
 bind_addr = socket.gethostbyname(WSJTX_IP)
 
-def process_wsjt(_data: bytes, ip_from: tuple):
+def process_wsjt(_data: bytes, ip_from: tuple, journal: JournalWriter):
     global LOCAL_STATES
 
+    now = time.time()
+    host = f'{ip_from[0]}:{ip_from[1]}'
     try:
         packet = wsjtx.ft8_decode(_data)
     except (IOError, NotImplementedError):
@@ -34,11 +38,11 @@ def process_wsjt(_data: bytes, ip_from: tuple):
 
     if isinstance(packet, wsjtx.WSHeartbeat):
 
-        logging.info(f'[HOST: {ip_from[0]}:{ip_from[1]}] Hearbeat...')
+        logging.info('[HOST: %s:%s] Hearbeat...', ip_from[0], ip_from[1])
     
     elif isinstance(packet, wsjtx.WSStatus):
 
-        logging.debug(f'[HOST: {ip_from[0]}:{ip_from[1]}] {packet}')
+        logging.debug('[HOST: %s:%s] %s', ip_from[0], ip_from[1], packet)
         packet_last_tx = packet.LastTxMsg or ''
         isTransmitting = packet.Transmitting and (LOCAL_STATES['current_tx'] != packet_last_tx or LOCAL_STATES['transmitting'] != packet.Transmitting)
 
@@ -47,12 +51,29 @@ def process_wsjt(_data: bytes, ip_from: tuple):
         LOCAL_STATES['band'] = freq_to_band((packet.Frequency or 135000)//1000)['band']
         LOCAL_STATES['mode'] = packet.Mode or ''
 
+        status = {
+            'band': LOCAL_STATES['band'],
+            'mode': LOCAL_STATES['mode'],
+            'dial': packet.Frequency,
+            'dx': packet.DXCall or '',
+            'tx_enabled': packet.TXEnabled,
+            'transmitting': packet.Transmitting
+        }
+        if status != LOCAL_STATES['status']:
+            LOCAL_STATES['status'] = status
+            journal.write({'time': now, 'kind': 'status', 'host': host, **status})
+
         if isTransmitting:
 
             logging.info(
-                f'[HOST: {ip_from[0]}:{ip_from[1]}] [TX] [MODE: {LOCAL_STATES["mode"]}] [BAND: {LOCAL_STATES["band"]}] '
-                f'[FREQUENCY: {packet.TXdf}] {packet.LastTxMsg}'
+                '[HOST: %s:%s] [TX] [MODE: %s] [BAND: %s] '
+                '[FREQUENCY: %s] %s',
+                ip_from[0], ip_from[1], LOCAL_STATES['mode'], LOCAL_STATES['band'], packet.TXdf, packet.LastTxMsg
             )
+            journal.write({
+                'time': now, 'kind': 'tx', 'host': host, 'band': LOCAL_STATES['band'], 'mode': LOCAL_STATES['mode'],
+                'freq': packet.TXdf, 'msg': packet.LastTxMsg
+            })
 
     elif isinstance(packet, wsjtx.WSDecode):
 
@@ -60,20 +81,29 @@ def process_wsjt(_data: bytes, ip_from: tuple):
         minutes, seconds = divmod(remainder, 60)
         
         logging.info(
-            f'[HOST: {ip_from[0]}:{ip_from[1]}] [RX] [MODE: {LOCAL_STATES["mode"]}] [BAND: {LOCAL_STATES["band"]}] '
-            f'[FREQUENCY: {packet.DeltaFrequency}] [UTC: {hours:02d}{minutes:02d}{seconds:02d}] [DT: {packet.DeltaTime}] '
-            f'[DB: {packet.SNR}] {packet.Mode} {packet.Message}'
+            '[HOST: %s:%s] [RX] [MODE: %s] [BAND: %s] '
+            '[FREQUENCY: %s] [UTC: %02d%02d%02d] [DT: %s] '
+            '[DB: %s] %s %s',
+            ip_from[0], ip_from[1], LOCAL_STATES['mode'], LOCAL_STATES['band'],
+            packet.DeltaFrequency, hours, minutes, seconds, packet.DeltaTime, packet.SNR, packet.Mode, packet.Message
         )
+        journal.write({
+            'time': now, 'kind': 'rx', 'host': host, 'band': LOCAL_STATES['band'], 'mode': LOCAL_STATES['mode'],
+            'freq': packet.DeltaFrequency, 'utc': f'{hours:02d}{minutes:02d}{seconds:02d}', 'dt': packet.DeltaTime,
+            'snr': packet.SNR, 'md': packet.Mode, 'msg': packet.Message
+        })
 
     elif isinstance(packet, wsjtx.WSADIF):
-        logging.info(f'[HOST: {ip_from[0]}:{ip_from[1]}] LOGGED ADIF: {packet.ADIF}')
+        logging.info('[HOST: %s:%s] LOGGED ADIF: %s', ip_from[0], ip_from[1], packet.ADIF)
+        journal.write({'time': now, 'kind': 'adif', 'host': host, 'adif': packet.ADIF})
 
     elif isinstance(packet, wsjtx.WSClose):
-        logging.warning(f'[HOST: {ip_from[0]}:{ip_from[1]}] CLOSED!!!')
+        logging.warning('[HOST: %s:%s] CLOSED!!!', ip_from[0], ip_from[1])
         LOCAL_STATES[f'{ip_from[0]}:{ip_from[1]}'] = False
+        journal.write({'time': now, 'kind': 'close', 'host': host})
 
     else:
-        logging.debug(f'[HOST: {ip_from[0]}:{ip_from[1]}] {packet}')
+        logging.debug('[HOST: %s:%s] %s', ip_from[0], ip_from[1], packet)
 
 def init(sock: socket.socket):
 
@@ -93,6 +123,7 @@ def main(sock: socket.socket):
 
     ip_from = None
     socks = [sock]
+    journal = JournalWriter(JOURNAL_LOCATION, JOURNAL_SEGMENT_BYTES, JOURNAL_KEEP_DAYS)
 
     init(sock)
 
@@ -100,30 +131,28 @@ def main(sock: socket.socket):
         try:
             t = select.select(socks, [], [], 0.5)
             fds, _, _ = typing.cast(typing.Tuple[typing.List[socket.socket], list, list], t)
+            if not fds:
+                journal.flush()
             for fdin in fds:
                 _data, ip_from = fdin.recvfrom(1024)
                 ip_str = f'{ip_from[0]}:{ip_from[1]}'
                 if not LOCAL_STATES.get(ip_str, False):
-                    logging.warning(f'[HOST: {ip_str}] OPENED!!!')
+                    logging.warning('[HOST: %s] OPENED!!!', ip_str)
                     LOCAL_STATES[ip_str] = True
-                process_wsjt(_data, ip_from)
+                    journal.write({'time': time.time(), 'kind': 'open', 'host': ip_str})
+                process_wsjt(_data, ip_from, journal)
         except KeyboardInterrupt:
             break
         except:
             logging.exception('Something not right!')
             break
+
+    journal.close()
     
 if __name__ == '__main__':
-    file_handlers = RollingFileHandler(os.path.join(CURRENT_DIR, 'log', 'message.log'), maxBytes=10*1024*1024)
-    file_handlers.setLevel(logging.INFO)
-    stream_handlers = logging.StreamHandler()
+    # Decodes are written to the journal, see journal.py
+    stream_handlers = BatchStreamHandler()
     stream_handlers.setLevel(logging.DEBUG if DEBUGGING else logging.INFO)
-    logging.basicConfig(
-        format='[%(asctime)s] [%(levelname)s] %(message)s',
-        level=logging.DEBUG,
-        handlers=[
-            file_handlers,
-            stream_handlers
-        ])
+    start_logging(stream_handlers)
     
     main(sock_wsjt)
\ No newline at end of file
@@ -0,0 +1,220 @@
+import bisect, logging, threading, typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of latency buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = typing.Tuple[typing.Any, ...]
+Read = typing.Callable[[], typing.Dict[Labels, float]]
+
+def format_labels(names: Labels, values: Labels, extra: str = '') -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric(object):
+
+    def __init__(self, name: str, description: str, kind: str, labelnames: Labels = ()):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.labelnames = labelnames
+
+    def samples(self) -> typing.List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return '\n'.join([f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}'] + self.samples())
+
+class Counter(Metric):
+    """Counter updated by the packet loop, or read from the process when scraped if read is given"""
+
+    def __init__(self, name: str, description: str, labelnames: Labels = (), read: typing.Optional[Read] = None, kind: str = 'counter'):
+        super().__init__(name, description, kind, labelnames)
+        self.values: typing.Dict[Labels, float] = {}
+        self.read = read
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> typing.List[str]:
+        if self.read is None:
+            values = list(self.values.items())
+        else:
+            try:
+                values = list(self.read().items())
+            except Exception:
+                logging.exception('Failed to read %s!', self.name)
+                return []
+        return [f'{self.name}{format_labels(self.labelnames, k)} {v}' for k, v in values]
+
+class Gauge(Counter):
+    """Value read from the process when scraped, so nothing is done by the packet loop"""
+
+    def __init__(self, name: str, description: str, labelnames: Labels = (), read: typing.Optional[Read] = None):
+        super().__init__(name, description, labelnames, read, 'gauge')
+
+class Histogram(Metric):
+
+    def __init__(self, name: str, description: str, labelnames: Labels = (), buckets: typing.Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, description, 'histogram', labelnames)
+        self.buckets = buckets
+        # Count of every bucket, the last one has no upper bound, then the sum
+        self.values: typing.Dict[Labels, typing.List[float]] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        values = self.values.get(labels, None)
+        if values is None:
+            values = self.values[labels] = [0]*(len(self.buckets) + 2)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def samples(self) -> typing.List[str]:
+        samples = []
+        for labels, values in list(self.values.items()):
+            values = list(values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                samples.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            samples.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {values[-1]}')
+            samples.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return samples
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics: typing.Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def add(self, metric: Metric) -> typing.Any:
+        # Same metric is shared when receiver and transmitter are imported by one process
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str, labelnames: Labels = (), read: typing.Optional[Read] = None) -> Counter:
+        counter = self.add(Counter(name, description, labelnames, read))
+        if read is not None:
+            counter.read = read
+        return counter
+
+    def gauge(self, name: str, description: str, labelnames: Labels = (), read: typing.Optional[Read] = None) -> Gauge:
+        gauge = self.add(Gauge(name, description, labelnames, read))
+        if read is not None:
+            gauge.read = read
+        return gauge
+
+    def histogram(self, name: str, description: str, labelnames: Labels = (), buckets: typing.Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(m.render() for m in metrics) + '\n'
+
+REGISTRY = Registry()
+
+def serve(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    # Prometheus text format on http://host:port/metrics, served by a daemon thread
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ['/', '/metrics']:
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: typing.Any):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info('Metrics on http://%s:%s/metrics', host, server.server_address[1])
+    return server
+
+def udp_socket_stats(port: int) -> typing.Dict[str, int]:
+    # Receive queue in bytes and datagrams dropped by the kernel of the UDP socket bound to this port
+    stats = {'receive_queue': 0, 'drops': 0}
+    for location in ['/proc/net/udp', '/proc/net/udp6']:
+        try:
+            with open(location) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if int(fields[1].rsplit(':', 1)[1], 16) != port:
+                        continue
+                    stats['receive_queue'] += int(fields[4].split(':')[1], 16)
+                    stats['drops'] += int(fields[-1])
+        except (OSError, ValueError, IndexError, StopIteration):
+            pass
+    return stats
+
+class TrackedQueue(object):
+    """Queue collection with the importance of every entry kept in memory, so the tiers are counted without a query
+
+    Deleting many entries reads the importance of the whole queue again, it only happens on startup and changing band
+    """
+
+    def __init__(self, collection: typing.Any):
+        self.collection = collection
+        self.importance: typing.Dict[typing.Tuple[str, int, str], float] = {}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.collection, name)
+
+    @staticmethod
+    def key(data: typing.Mapping) -> typing.Optional[typing.Tuple[str, int, str]]:
+        if not all(isinstance(data.get(k, None), (str, int, float)) for k in ['callsign', 'band', 'mode']):
+            return None
+        return (data['callsign'], data['band'], data['mode'])
+
+    def update_one(self, filter: dict, update: dict, *args, **kwargs) -> typing.Any:
+        result = self.collection.update_one(filter, update, *args, **kwargs)
+        key = self.key(filter)
+        if key is not None and (result.matched_count or result.upserted_id is not None):
+            importance = update.get('$set', {}).get('importance', None)
+            with self.lock:
+                if importance is not None or key not in self.importance:
+                    self.importance[key] = importance if importance is not None else self.importance.get(key, 0)
+        return result
+
+    def find_one_and_delete(self, filter: dict, *args, **kwargs) -> typing.Any:
+        result = self.collection.find_one_and_delete(filter, *args, **kwargs)
+        key = self.key(filter)
+        if result and key is not None:
+            with self.lock:
+                self.importance.pop(key, None)
+        return result
+
+    def delete_many(self, filter: dict, *args, **kwargs) -> typing.Any:
+        result = self.collection.delete_many(filter, *args, **kwargs)
+        self.reload()
+        return result
+
+    def reload(self):
+        importance = {}
+        for d in self.collection.find({}, {'callsign': 1, 'band': 1, 'mode': 1, 'importance': 1}):
+            key = self.key(d)
+            if key is not None:
+                importance[key] = d.get('importance', 0)
+        with self.lock:
+            self.importance = importance
+
+    def tiers(self) -> typing.Dict[Labels, float]:
+        # Importance 1 is CQ and calling others, 1.5 is calling us with grid, 4 and above is the end of QSO
+        # Every entry is counted, not only the ones transmitter can pick
+        with self.lock:
+            values = list(self.importance.values())
+        counts: typing.Dict[Labels, float] = {(t,): 0 for t in ['1', '2', '3', '4']}
+        for v in values:
+            counts[(str(min(max(int(v or 0), 1), 4)),)] += 1
+        return counts
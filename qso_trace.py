@@ -0,0 +1,207 @@
+import argparse, json, logging, os, secrets, time, typing
+from collections import OrderedDict
+
+# Steps of a QSO in the order they happen, the report measures the time between each of them
+STEPS = ('decode', 'enqueue', 'reply', 'message', 'r73', 'log', 'logged')
+
+# Why transmitter gave up on a callsign, set by receiver in the queue
+OUTCOMES = ('tried', 'spam', 'inactive')
+
+# Traces kept in memory, the least recently used is forgotten first
+# A forgotten trace continues when the callsign is decoded again, its id is still in the queue
+MAX_TRACES = 5000
+
+class QsoTracer(object):
+    """Steps of every QSO from the first decode of the station to the QSO logged by WSJT-X
+
+    Every step is a JSON line [trace id, time, step, detail], only the first step has the callsign, band and mode
+    The trace id is kept in the queue as traceId, so transmitter adds its replies to the same trace
+    """
+
+    def __init__(self, location: str):
+        self.location = location
+        # Trace id of every callsign, band and mode, until the QSO is logged or given up
+        self.traces: typing.OrderedDict[typing.Tuple[str, int, str], str] = OrderedDict()
+        # First decode of traces not added to queue yet, written with the first enqueue,
+        # so callsign rejected by filter_cq doesn't leave a trace
+        self.pending: typing.OrderedDict[str, typing.Tuple[float, list]] = OrderedDict()
+        # Logged traces, the queue entry still has the trace id while the last messages are exchanged
+        self.closed: typing.OrderedDict[str, bool] = OrderedDict()
+
+    @staticmethod
+    def remember(entries: typing.OrderedDict, key: typing.Any, value: typing.Any):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > MAX_TRACES:
+            entries.popitem(last=False)
+
+    def write(self, trace_id: str, now: float, step: str, detail: typing.Any = None):
+        record = [trace_id, round(now, 3), step] + ([detail] if detail is not None else [])
+        try:
+            # Receiver and transmitter append to the same file, a single write of one line keeps the lines whole
+            with open(self.location, 'a') as f:
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        except OSError:
+            logging.exception('Failed to write QSO trace!')
+
+    def get(self, callsign: str, band: int, mode: str) -> str:
+        return self.traces.get((callsign, band, mode), '')
+
+    def candidate(self, data: typing.Any, latest_data: dict, now: float):
+        # Decode passing every filter keeps the trace of the queue, or starts a new one
+        key = (data['callsign'], data['band'], data['mode'])
+        trace_id = latest_data.get('traceId', None) or self.traces.get(key, None)
+        if trace_id is None:
+            trace_id = secrets.token_hex(6)
+            self.remember(self.pending, trace_id, (now, list(key)))
+        if trace_id not in self.closed:
+            self.remember(self.traces, key, trace_id)
+        data['traceId'] = trace_id
+
+    def enqueue(self, data: typing.Any, now: float):
+        first = self.pending.pop(data.get('traceId', None), None)
+        if first is not None:
+            self.write(data['traceId'], first[0], 'decode', first[1])
+            self.write(data['traceId'], now, 'enqueue', round(data['importance'], 2))
+
+    def step(self, step: str, callsign: str, band: int, mode: str, now: float, detail: typing.Any = None):
+        trace_id = self.get(callsign, band, mode)
+        if trace_id:
+            self.write(trace_id, now, step, detail)
+            if step in OUTCOMES:
+                # Given up by transmitter, kept in the queue with its trace id if it's decoded again
+                self.traces.pop((callsign, band, mode), None)
+
+    def logged(self, callsign: str, band: int, mode: str, now: float):
+        trace_id = self.traces.pop((callsign, band, mode), '')
+        if trace_id:
+            self.pending.pop(trace_id, None)
+            self.remember(self.closed, trace_id, True)
+            self.write(trace_id, now, 'logged')
+
+class NullQsoTracer(QsoTracer):
+    """Used when QSO_TRACE_LOCATION is empty, every call does nothing"""
+
+    def __init__(self):
+        super().__init__('')
+
+    def write(self, trace_id: str, now: float, step: str, detail: typing.Any = None):
+        pass
+
+    def candidate(self, data: typing.Any, latest_data: dict, now: float):
+        pass
+
+    def enqueue(self, data: typing.Any, now: float):
+        pass
+
+    def step(self, step: str, callsign: str, band: int, mode: str, now: float, detail: typing.Any = None):
+        pass
+
+    def logged(self, callsign: str, band: int, mode: str, now: float):
+        pass
+
+def read_traces(location: str) -> typing.Dict[str, list]:
+    traces: typing.Dict[str, list] = {}
+    with open(location) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            traces.setdefault(record[0], []).append(record[1:])
+    for events in traces.values():
+        events.sort(key=lambda e: e[0])
+    return traces
+
+def outcome(events: list) -> str:
+    steps = [e[1] for e in events]
+    if 'logged' in steps:
+        return 'logged'
+    if 'log' in steps:
+        return 'log'
+    for step in reversed(steps):
+        if step in OUTCOMES:
+            return step
+    return 'open'
+
+def percentile(values: typing.List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(p*len(values)), len(values) - 1)]
+
+def step_times(events: list) -> typing.Dict[str, float]:
+    # Time from the previous step to the first time of every step after it
+    first: typing.Dict[str, float] = {}
+    for t, step, *_ in events:
+        if step in STEPS and step not in first:
+            first[step] = t
+    times = {}
+    previous = None
+    for step in STEPS:
+        if step not in first:
+            continue
+        if previous is not None and first[step] >= first[previous]:
+            times[f'{previous} → {step}'] = first[step] - first[previous]
+        previous = step
+    return times
+
+def report(traces: typing.Dict[str, list], half: float):
+    outcomes: typing.Dict[str, typing.List[list]] = {}
+    for events in traces.values():
+        outcomes.setdefault(outcome(events), []).append(events)
+
+    print(f'{len(traces)} traces | ' + ' | '.join(f'{k}: {len(v)}' for k, v in sorted(outcomes.items(), key=lambda o: -len(o[1]))))
+
+    completed = outcomes.get('logged', []) + outcomes.get('log', [])
+    durations = [e[-1][0] - e[0][0] for e in completed]
+    if durations:
+        print(
+            f'Time to complete: mean {sum(durations)/len(durations)/60:.1f} min, p50 {percentile(durations, 0.5)/60:.1f} min, '
+            f'p90 {percentile(durations, 0.9)/60:.1f} min, max {max(durations)/60:.1f} min'
+        )
+        bounds = [0, 1, 2, 5, 10, 30, 60, float('inf')]
+        for lower, upper in zip(bounds, bounds[1:]):
+            count = sum(1 for d in durations if lower*60 <= d < upper*60)
+            label = f'{lower}-{upper} min' if upper != float('inf') else f'{lower}+ min'
+            print(f'  {label:<10} {count:>5} {"#"*round(40*count/len(durations))}')
+
+    print('Periods transmitted per outcome:')
+    for name in ('logged', 'log') + OUTCOMES + ('open',):
+        if name not in outcomes:
+            continue
+        periods = [sum(1 for e in events if e[1] == 'tx') for events in outcomes[name]]
+        print(
+            f'  {name:<9} {len(periods):>5} traces, {sum(periods):>6} periods ({sum(periods)*half/60:.1f} min), '
+            f'mean {sum(periods)/len(periods):.1f}'
+        )
+
+    steps: typing.Dict[str, typing.List[float]] = {}
+    for events in completed:
+        for step, seconds in step_times(events).items():
+            steps.setdefault(step, []).append(seconds)
+    if steps:
+        print('Steps of completed QSOs:')
+        for step, seconds in sorted(steps.items(), key=lambda s: -sum(s[1])/len(s[1])):
+            print(
+                f'  {step:<20} mean {sum(seconds)/len(seconds):>7.1f} s, p90 {percentile(seconds, 0.9):>7.1f} s, '
+                f'{len(seconds)} QSOs'
+            )
+        slowest = max(steps.items(), key=lambda s: sum(s[1])/len(s[1]))
+        print(f'Slowest step: {slowest[0]}')
+
+if __name__ == '__main__':
+    from config import QSO_TRACE_LOCATION, TIMING
+    parser = argparse.ArgumentParser(description='Report of QSO traces written by receiver and transmitter')
+    parser.add_argument('location', nargs='?', default=QSO_TRACE_LOCATION)
+    parser.add_argument('--mode', choices=list(TIMING), default='FT8', help='mode to convert periods to time')
+    parser.add_argument('--since', type=float, default=0, help='only traces starting in the last hours')
+    args = parser.parse_args()
+    if not args.location or not os.path.exists(args.location):
+        parser.error('no QSO trace, set QSO_TRACE_LOCATION in config')
+
+    traces = read_traces(args.location)
+    if args.since:
+        start = time.time() - args.since*3600
+        traces = {k: v for k, v in traces.items() if v[0][0] >= start}
+    report(traces, TIMING[args.mode]['half'])
@@ -1,19 +1,33 @@
-import re, socket, select, wsjtx, struct, requests, typing, time, csv
-
-from datetime import datetime, timedelta
-
-from pyhamtools.locator import latlong_to_locator
-from pyhamtools.frequency import freq_to_band
-
+import socket, select, wsjtx, struct, typing, time, json
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from datetime import datetime, timedelta, timezone
+
+import static_data
+from capture import CaptureWriter
+from clock import Clock
+from db_stats import STATS as DB_STATS
+from metrics import REGISTRY, TrackedQueue, serve, udp_socket_stats
+from decode_record import DecodeRecord
+from pymongo import UpdateOne
+from qso_trace import NullQsoTracer, QsoTracer
+from stage_timer import NullStageTimer, StageTimer
 from states import States
 from config import *
-from adif_parser import main as adif_parser, db, done_coll, call_info, call_info2, country_to_dxcc, read_from_string
+from adif_parser import main as adif_parser, db, done_coll, get_call_info2, read_from_string, fetch_qrz_log, sync_qrz_log, QRZLogbookError
 import logging
-from logging import handlers
+from handler import BatchRotatingFileHandler, BatchStreamHandler, start_logging
 
 IP_LOCK = []
 
-DXCC_EXCEPTION = [country_to_dxcc.get(i,0) for i in DXCC_EXCEPTION]
+# Replaced by ReplayClock when captured packets are replayed, see benchmarks/replay.py
+CLOCK: Clock = Clock()
+
+# Time of every stage of process_wsjt and init, does nothing unless STAGE_TIMING is enabled
+STAGES: StageTimer = StageTimer(SLOW_PACKET_THRESHOLD, SLOW_PACKET_LOCATION) if STAGE_TIMING else NullStageTimer()
+
+# Steps of every QSO, does nothing unless QSO_TRACE_LOCATION is set
+TRACE: QsoTracer = QsoTracer(QSO_TRACE_LOCATION) if QSO_TRACE_LOCATION else NullQsoTracer()
 
 callsign_exc = []
 if CALLSIGN_EXCEPTION:
@@ -35,44 +49,53 @@ if RECEIVER_EXCEPTION:
     except:
         pass
 
-valid_callsign = []
-if VALID_CALLSIGN_LOCATION:
-    try:
-        with open(VALID_CALLSIGN_LOCATION) as f:
-            data = csv.reader(f)
-            for r in data:
-                valid_callsign.append(r[0])
-    except KeyboardInterrupt as e:
-        raise e
-    except:
-        pass
-
-priority_country = {}
-if DXCC_PRIORITY:
-    with open(DXCC_PRIORITY) as f:
-        priority_country_list = f.read().splitlines()
-        length_priority_country_list = len(priority_country_list)
-        priority_country = dict(
-            [
-                (
-                    d,
-                    0.5-i/(2*length_priority_country_list+1)
-                ) for i,d in enumerate(priority_country_list, start=1)
-            ]
-        )
-
-vip_dxcc = []
-if DXCC_VIP:
-    with open(DXCC_VIP) as f:
-        vip_dxcc = f.read().splitlines()
+# Loaded from static data snapshot in background by init, see set_static_data
+call_info = None
+country_to_dxcc: typing.Dict[str, int] = {}
+dxcc_exception: typing.List[int] = []
+priority_country: typing.Dict[str, float] = {}
+vip_dxcc: typing.List[str] = []
+valid_callsign: typing.Set[str] = set()
 
 LOCAL_STATES = {
     'my_callsign': '',
     'states_completed': False,
     'current_callsign': '',
-    'current_tx': ''
+    'current_tx': '',
+    'period': 0,
+    'started': 0.0,
+    'admission_ready': False,
+    'first_decode': False,
+    'replay_requested': False,
+    'compacted': 0.0
+}
+
+# Number of seconds between writing back expired and released from spam flags to queue
+COMPACT_INTERVAL = 60
+
+# Startup tasks running in background, new callsign is only added to queue after all of them are done
+STARTUP_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='startup')
+STARTUP_TASKS: typing.Dict[str, Future] = {}
+
+# Number of decodes rejected in each stage of filter_decode, from cheapest to most expensive
+FILTER_COUNTER = {
+    'decode': 0,
+    'parse': 0,
+    'exception': 0,
+    'startup': 0,
+    'replay': 0,
+    'cache': 0,
+    'dxcc': 0,
+    'worked': 0,
+    'validation': 0
 }
 
+# Counters served on RECEIVER_METRICS_PORT, the gauges are read when scraped, see start_metrics
+DECODES = REGISTRY.counter('wsjt_decodes_total', 'Decodes received from WSJT-X', ('band', 'mode'))
+PACKETS = REGISTRY.counter('wsjt_packets_total', 'Packets received from WSJT-X', ('type',))
+DROPPED = REGISTRY.counter('wsjt_packets_dropped_total', 'Packets dropped before being processed', ('reason',))
+QSOS = REGISTRY.counter('wsjt_qsos_total', 'QSOs logged by WSJT-X', ('band', 'mode'))
+
 NEXT_TRANSMIT = {
     True: {
         'GRID': 'SNR',
@@ -98,25 +121,353 @@ bind_addr = socket.gethostbyname(WSJTX_IP)
 
 grid_coll = db.grid
 call_coll = db.calls
+if RECEIVER_METRICS_PORT:
+    call_coll = TrackedQueue(call_coll)
 message_coll = db.message
+filtered_coll = db.filtered
+restart_coll = db.restart
+
+# Config that decides whether a rejected callsign is still rejected after restart
+REJECTED_CONFIG = json.dumps([MIN_DB, DXCC_EXCEPTION, WORK_ON_UNCONFIRMED_QSO, EXCLUDE_UNCONFIRMED_QSO_DATE_RANGE])
+
+REJECTED_CACHE: typing.Dict[tuple, dict] = {}
+
+# States kept for warm restart, WSJT-X states come back with the first status
+RESTART_STATES = [
+    'my_callsign',
+    'band',
+    'mode',
+    'current_callsign',
+    'last_tx',
+    'inactive_count',
+    'tries',
+    'transmit_counter',
+    'enable_transmit_counter'
+]
+
+# Snapshot from the previous run, waiting for the first status to be restored
+RESTART_SNAPSHOT: dict = {}
+
+# Time the queue of each band and mode stopped being used, removed after BAND_QUEUE_TIME
+FROZEN_QUEUES: typing.Dict[typing.Tuple[int, str], float] = {}
+
+# Latest message of every callsign, band and mode, changed message is written to database once every period
+MESSAGE_CACHE: typing.Dict[typing.Tuple[str, int, str], dict] = {}
+MESSAGE_DIRTY: typing.Set[typing.Tuple[str, int, str]] = set()
+# Message set before it was read from database, the rest of the fields are read the first time it's needed
+MESSAGE_UNREAD: typing.Set[typing.Tuple[str, int, str]] = set()
+# Latest grid of every callsign, written together with the messages
+GRID_CACHE: typing.Dict[str, typing.Optional[str]] = {}
+GRID_DIRTY: typing.Set[str] = set()
+MESSAGE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='message')
+MESSAGE_WRITE: typing.Optional[typing.Tuple[Future, typing.Set[typing.Tuple[str, int, str]], typing.Set[str]]] = None
+
+def add_rejected(data: dict, reason: str, min_db: int):
+    global REJECTED_CACHE
+
+    if not REJECTED_CACHE_TIME:
+        return
+
+    rejected_data = {
+        'callsign': data['callsign'],
+        'band': data['band'],
+        'mode': data['mode'],
+        'reason': reason,
+        'extra': data.get('extra', None),
+        'min_db': min_db,
+        'config': REJECTED_CONFIG,
+        'timestamp': data['timestamp']
+    }
+    REJECTED_CACHE[(data['callsign'], data['band'], data['mode'])] = rejected_data
+    filtered_coll.update_one(
+        {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
+        {'$set': rejected_data},
+        upsert=True
+    )
+
+def remove_rejected(**query):
+    global REJECTED_CACHE
+
+    for key in [k for k, v in REJECTED_CACHE.items() if all(v.get(i, None) == j for i, j in query.items())]:
+        REJECTED_CACHE.pop(key)
+    filtered_coll.delete_many(query)
+
+def get_rejected(data: dict, band: int, mode: str, min_db: int, now: float) -> str:
+
+    if not REJECTED_CACHE_TIME:
+        return ''
+
+    rejected_data = REJECTED_CACHE.get((data['callsign'], band, mode), None)
+    if not rejected_data:
+        return ''
+
+    if rejected_data['timestamp'] <= now - REJECTED_CACHE_TIME or \
+        rejected_data['min_db'] != min_db or \
+        (rejected_data['reason'] == 'low_snr' and data['SNR'] >= min_db) or \
+        (rejected_data['reason'] == 'not_for_us' and data.get('extra', None) != rejected_data['extra']):
+        remove_rejected(callsign=data['callsign'], band=band, mode=mode)
+        return ''
+
+    return rejected_data['reason']
+
+def load_rejected(now: float):
+    global REJECTED_CACHE
+
+    filtered_coll.delete_many(
+        {
+            '$or': [
+                {'config': {'$ne': REJECTED_CONFIG}},
+                {'timestamp': {'$lte': now - REJECTED_CACHE_TIME}}
+            ]
+        }
+    )
+    REJECTED_CACHE = {
+        (d['callsign'], d['band'], d['mode']): d for d in filtered_coll.find({}, {'_id': 0})
+    }
+
+def get_message(callsign: str, band: int, mode: str) -> dict:
+    key = (callsign, band, mode)
+    if key not in MESSAGE_CACHE or key in MESSAGE_UNREAD:
+        # Not found is cached too, so unknown callsign is only read from database once
+        MESSAGE_CACHE[key] = {
+            **(message_coll.find_one({'callsign': callsign, 'band': band, 'mode': mode}, {'_id': 0}) or {}),
+            **MESSAGE_CACHE.get(key, {})
+        }
+        MESSAGE_UNREAD.discard(key)
+    return dict(MESSAGE_CACHE[key])
+
+def set_message(callsign: str, band: int, mode: str, data: dict):
+    key = (callsign, band, mode)
+    if key not in MESSAGE_CACHE:
+        MESSAGE_UNREAD.add(key)
+    MESSAGE_CACHE.setdefault(key, {}).update(data)
+    MESSAGE_DIRTY.add(key)
+
+def get_grid(callsign: str) -> typing.Optional[str]:
+    if callsign not in GRID_CACHE:
+        GRID_CACHE[callsign] = (grid_coll.find_one({'callsign': callsign}) or {}).get('grid', None)
+    return GRID_CACHE[callsign]
+
+def set_grid(callsign: str, grid: str):
+    if GRID_CACHE.get(callsign, None) != grid:
+        GRID_CACHE[callsign] = grid
+        GRID_DIRTY.add(callsign)
+
+def write_messages(messages: typing.List[dict], grids: typing.List[dict]):
+    if messages:
+        message_coll.bulk_write([
+            UpdateOne(
+                {'callsign': m['callsign'], 'band': m['band'], 'mode': m['mode']},
+                {'$set': m},
+                upsert=True
+            ) for m in messages
+        ], ordered=False)
+    if grids:
+        grid_coll.bulk_write([
+            UpdateOne({'callsign': g['callsign']}, {'$set': g}, upsert=True) for g in grids
+        ], ordered=False)
+
+def wait_messages():
+    global MESSAGE_WRITE
+
+    if MESSAGE_WRITE is None:
+        return
+
+    future, keys, callsigns = MESSAGE_WRITE
+    MESSAGE_WRITE = None
+    try:
+        future.result()
+    except KeyboardInterrupt as e:
+        raise e
+    except:
+        logging.exception('[DB] Failed to write message, trying again next period!')
+        MESSAGE_DIRTY.update(k for k in keys if k in MESSAGE_CACHE)
+        GRID_DIRTY.update(callsigns)
+
+def flush_messages(wait: bool = False):
+    global MESSAGE_WRITE
+
+    wait_messages()
+    if MESSAGE_DIRTY or GRID_DIRTY:
+        keys = set(MESSAGE_DIRTY)
+        callsigns = set(GRID_DIRTY)
+        MESSAGE_DIRTY.clear()
+        GRID_DIRTY.clear()
+        MESSAGE_WRITE = MESSAGE_POOL.submit(
+            write_messages,
+            [dict(MESSAGE_CACHE[k]) for k in keys],
+            [{'callsign': c, 'grid': GRID_CACHE[c]} for c in callsigns]
+        ), keys, callsigns
+    if wait:
+        wait_messages()
+
+def remove_messages(query: dict):
+    # Write in progress has to finish first, otherwise it can bring the removed message back
+    if any(k.startswith('$') or isinstance(v, dict) for k, v in query.items()):
+        flush_messages(wait=True)
+        MESSAGE_CACHE.clear()
+        MESSAGE_UNREAD.clear()
+    else:
+        wait_messages()
+        for key in [k for k, v in MESSAGE_CACHE.items() if all(v.get(i, None) == j for i, j in query.items())]:
+            MESSAGE_CACHE.pop(key)
+            MESSAGE_DIRTY.discard(key)
+            MESSAGE_UNREAD.discard(key)
+    message_coll.delete_many(query)
+
+def save_snapshot(states: States, now: float):
 
-def filter_cq(data: dict, states: States) -> bool:
+    if not WARM_RESTART_TIME:
+        return
+
+    snapshot = states.get_states(*RESTART_STATES)
+    snapshot['even_frequencies'] = states.even_frequencies
+    snapshot['odd_frequencies'] = states.odd_frequencies
+    snapshot['timestamp'] = now
+    restart_coll.replace_one({'_id': 'receiver'}, snapshot, upsert=True)
+
+def load_snapshot(now: float) -> dict:
+    # Returns the snapshot if it's recent enough, and removes the queue that is too old
+    snapshot = restart_coll.find_one_and_delete({'_id': 'receiver'}) or {}
+    if not snapshot or snapshot['timestamp'] <= now - WARM_RESTART_TIME:
+        call_coll.delete_many({})
+        remove_messages({})
+        return {}
+
+    call_coll.delete_many({'timestamp': {'$lte': now - WARM_RESTART_TIME}})
+    remove_messages({'timestamp': {'$lte': now - WARM_RESTART_TIME}})
+    snapshot.pop('_id')
+    return snapshot
+
+def restore_snapshot(states: States, my_callsign: str, band: int, mode: str):
+    global RESTART_SNAPSHOT
+
+    snapshot = RESTART_SNAPSHOT
+    RESTART_SNAPSHOT = {}
+
+    if [snapshot['my_callsign'], snapshot['band'], snapshot['mode']] != [my_callsign, band, mode]:
+        logging.warning(
+            '[RESTART] [MODE: %s] [BAND: %s] '
+            '[MY CALLSIGN: %s] Different from WSJT-X, removing all message!',
+            snapshot['mode'], snapshot['band'], snapshot['my_callsign']
+        )
+        call_coll.delete_many({})
+        remove_messages({})
+        return
+
+    call_coll.delete_many({'$or': [{'band': {'$ne': band}}, {'mode': {'$ne': mode}}]})
+    remove_messages({'$or': [{'band': {'$ne': band}}, {'mode': {'$ne': mode}}]})
+
+    states.change_states(**{k: snapshot[k] for k in RESTART_STATES if k not in ['my_callsign', 'band', 'mode']})
+    if snapshot['even_frequencies']:
+        states.even_frequencies = snapshot['even_frequencies']
+    if snapshot['odd_frequencies']:
+        states.odd_frequencies = snapshot['odd_frequencies']
+    LOCAL_STATES['current_callsign'] = snapshot['current_callsign']
+
+    logging.info(
+        '[RESTART] [MODE: %s] [BAND: %s] '
+        'Continuing with %s message in queue',
+        mode, band, call_coll.count_documents({})
+    )
+
+def freeze_queue(band: int, mode: str, now: float):
+    FROZEN_QUEUES[(band, mode)] = now
+    logging.warning(
+        '[DB] [MODE: %s] [BAND: %s] Keeping '
+        '%s message for %s seconds',
+        mode, band, call_coll.count_documents({'band': band, 'mode': mode}), BAND_QUEUE_TIME
+    )
+
+def thaw_queue(band: int, mode: str):
+    if FROZEN_QUEUES.pop((band, mode), None) is None:
+        return
+    logging.info(
+        '[DB] [MODE: %s] [BAND: %s] Continuing with '
+        '%s message in queue',
+        mode, band, call_coll.count_documents({'band': band, 'mode': mode})
+    )
+
+def remove_frozen_queues(now: float):
+    for band, mode in [k for k, v in FROZEN_QUEUES.items() if v <= now - BAND_QUEUE_TIME]:
+        FROZEN_QUEUES.pop((band, mode))
+        logging.warning('[DB] [MODE: %s] [BAND: %s] Removing all message!', mode, band)
+        call_coll.delete_many({'band': band, 'mode': mode})
+        remove_messages({'band': band, 'mode': mode})
+
+def request_replay(states: States):
+    # Band activity of WSJT-X is sent again, so the queue is filled without waiting for the next period
+    if LOCAL_STATES['replay_requested'] or not LOCAL_STATES['states_completed'] or \
+        not LOCAL_STATES['admission_ready']:
+        return
+
+    LOCAL_STATES['replay_requested'] = True
+    states.replay()
+    logging.info('[REPLAY] Requesting band activity from WSJT-X')
+
+def is_recent_decode(packet: wsjtx.WSDecode, mode: str, now: float) -> bool:
+    # Decode from the current or the previous period, time of decode is milliseconds since midnight UTC
+    half = TIMING[mode]['half']
+    current_time = datetime.fromtimestamp(now, timezone.utc)
+    seconds = current_time.hour*3600 + current_time.minute*60 + current_time.second + current_time.microsecond/1e6
+    age = (seconds//half - packet.Time/1000//half) % (24*3600//half)
+    return age <= 1
+
+def cache_replayed_decode(packet: wsjtx.WSDecode, states_list: dict, now: float):
+    # Old decode is too late to answer, only the location and worked before are remembered
+    data = {'SNR': packet.SNR, **parsing_message(packet.Message)}
+    if 'type' not in data or data['callsign'] in callsign_exc:
+        return
+
+    band = states_list['band']
+    mode = states_list['mode']
+    if get_rejected(data, band, mode, states_list['min_db'], now):
+        return
+
+    latest_data = get_message(data['callsign'], band, mode)
+    if all([i in latest_data for i in ['country', 'dxcc', 'continent', 'isNewCallsign', 'isNewDXCC']]):
+        return
+
+    location_data = get_location_data(data['prefixed_callsign'])
+    if not location_data:
+        return
+
+    cache_data = {
+        'callsign': data['callsign'],
+        'band': band,
+        'mode': mode,
+        **{k: location_data[k] for k in ['country', 'dxcc', 'continent']},
+        'isNewCallsign': not done_coll.find_one({'callsign': data['callsign'], 'band': band, 'mode': mode}),
+        'isNewDXCC': not done_coll.find_one({'dxcc': location_data['dxcc'], 'band': band, 'mode': mode}),
+        'timestamp': now
+    }
+    set_message(data['callsign'], band, mode, cache_data)
+    if not cache_data['isNewCallsign']:
+        add_rejected({**data, 'band': band, 'mode': mode, 'timestamp': now}, 'worked', states_list['min_db'])
+
+def filter_cq(data: DecodeRecord, states: States) -> bool:
+
+    min_db = states.min_db
 
     if not data['isNewCallsign']:
         logging.warning('Already QSO with this callsign')
+        add_rejected(data, 'worked', min_db)
         return False
 
-    if data['SNR'] < states.min_db:
+    if data['SNR'] < min_db:
         logging.warning('The message\'s signal is below minimum threshold')
+        add_rejected(data, 'low_snr', min_db)
         return False
 
-    if DXCC_EXCEPTION and 'dxcc' in data and data['dxcc'] in DXCC_EXCEPTION:
+    if dxcc_exception and 'dxcc' in data and data['dxcc'] in dxcc_exception:
         logging.warning('The callsign is inside DXCC exception')
+        add_rejected(data, 'dxcc_exception', min_db)
         return False
 
     if data.get('extra', None):
         if (data['extra'] == 'DX' and data.get('country', '') == 'Indonesia') or data['extra'] != 'OC':
             logging.warning('The callsign specifically didn\'t want to call us')
+            add_rejected(data, 'not_for_us', min_db)
             return False
         
     if 'grid' in data and states.new_grid and not done_coll.find_one(
@@ -136,7 +487,7 @@ def filter_cq(data: dict, states: States) -> bool:
     
     return False
 
-def validate_callsign(data: dict) -> bool:
+def validate_callsign(data: DecodeRecord) -> bool:
     global valid_callsign, callsign_exc
 
     if data['isValid']:
@@ -146,6 +497,7 @@ def validate_callsign(data: dict) -> bool:
         data['isValid'] = True
         return True
     
+    call_info2 = get_call_info2()
     if call_info2 and call_info2.is_valid_callsign(data['callsign']):
         data['isValid'] = True
         return True
@@ -157,6 +509,69 @@ def validate_callsign(data: dict) -> bool:
 
     return False
 
+def filter_decode(data: DecodeRecord, states_list: dict, now: float) -> typing.Tuple[str, dict]:
+    global receiver_exc
+
+    band = states_list['band']
+    mode = states_list['mode']
+    min_db = states_list['min_db']
+    isCallingBusy = data['type'] in ['GRID', 'SNR', 'RSNR']
+
+    if isCallingBusy and not states_list['num_tries_call_busy']:
+        return 'exception', {}
+
+    if isCallingBusy and data['to'] in receiver_exc:
+        logging.warning('The Callsign is calling someone that is blacklisted!')
+        return 'exception', {}
+
+    if data['SNR'] < min_db:
+        logging.warning('The message\'s signal is below minimum threshold')
+        return 'exception', {}
+
+    if data.get('extra', None) and data['extra'] != 'OC':
+        logging.warning('The callsign specifically didn\'t want to call us')
+        return 'exception', {}
+
+    rejected_reason = get_rejected(data, band, mode, min_db, now)
+    STAGES.mark('rejected')
+    if rejected_reason:
+        logging.warning('[CALLSIGN: %s] Still rejected because of %s', data['callsign'], rejected_reason)
+        return 'cache', {}
+
+    location_data = get_location_data(data['prefixed_callsign'])
+    STAGES.mark('location')
+    if not location_data:
+        logging.warning('The Callsign\'s country is not found')
+        return 'dxcc', {}
+    data.update({
+        k: location_data[k] for k in ['country', 'dxcc', 'continent']
+    })
+
+    if dxcc_exception and data['dxcc'] in dxcc_exception:
+        logging.warning('The callsign is inside DXCC exception')
+        add_rejected({**data, 'band': band, 'mode': mode, 'timestamp': now}, 'dxcc_exception', min_db)
+        return 'dxcc', {}
+
+    latest_data = get_message(data['callsign'], band, mode)
+    if 'isNewCallsign' in latest_data:
+        data['isNewCallsign'] = latest_data['isNewCallsign']
+    else:
+        data['isNewCallsign'] = not done_coll.find_one({'callsign': data['callsign'], 'band': band, 'mode': mode})
+    STAGES.mark('worked')
+    if not data['isNewCallsign']:
+        logging.warning('Already QSO with this callsign')
+        add_rejected({**data, 'band': band, 'mode': mode, 'timestamp': now}, 'worked', min_db)
+        return 'worked', latest_data
+
+    data['isValid'] = latest_data.get('isValid', False)
+    isValid = not VALIDATE_CALLSIGN or validate_callsign(data)
+    STAGES.mark('validation')
+    if not isValid:
+        logging.warning('This callsign is probably not a valid callsign!')
+        return 'validation', latest_data
+
+    return '', latest_data
+
 def parsing_message(message: str) -> dict:
     message_type = ''
     matching = None
@@ -200,28 +615,60 @@ def get_grid_data(
     elif latest_data and 'grid' in latest_data:
         data['grid'] = latest_data['grid']
     else:
-        current_grid = (grid_coll.find_one({'callsign': callsign}) or {}).get('grid', None)
+        current_grid = get_grid(callsign)
         if not current_grid and 'latitude' in location_data:
+            from pyhamtools.locator import latlong_to_locator
             current_grid = latlong_to_locator(location_data['latitude'], location_data['longitude'])[:4]
         if current_grid:
             data['grid'] = current_grid
     
     return data
 
-def completing_data(data: dict, additional_data: dict, now: float = None, latest_data: dict = {}) -> dict:
+def get_expiry_data(timestamp: float, mode: str) -> dict:
+    # Expired and released from spam are checked when the queue is read, so nothing is swept after transmitting
+    # Half a period and 2 seconds earlier, same as the sweep after transmitting did
+    early = TIMING[mode]['half'] + 2
+    return {
+        'expiresAt': timestamp + EXPIRED_TIME - early if EXPIRED_TIME else None,
+        'spamUntil': timestamp + RELEASE_FROM_SPAM_TIME - early if RELEASE_FROM_SPAM_TIME else None
+    }
+
+def refresh_expiry(data: dict, now: float):
+    if data.get('expiresAt', None) is not None and data['expiresAt'] <= now and data.get('importance', 2) < 2:
+        data['expired'] = True
+    if data.get('isSpam', False) and data.get('spamUntil', None) is not None and data['spamUntil'] <= now:
+        data['isSpam'] = False
+
+def compact_queue(now: float):
+    # Write back the flags, so the queue in database looks the same as the transmitter sees it
+    LOCAL_STATES['compacted'] = now
+    if EXPIRED_TIME:
+        call_coll.update_many(
+            {'expired': False, 'importance': {'$lt': 2}, 'expiresAt': {'$lte': now}},
+            {'$set': {'expired': True}}
+        )
+    if RELEASE_FROM_SPAM_TIME:
+        call_coll.update_many(
+            {'isSpam': True, 'spamUntil': {'$lte': now}},
+            {'$set': {'isSpam': False}}
+        )
+
+def completing_data(data: DecodeRecord, additional_data: dict, now: float = None, latest_data: dict = {}) -> DecodeRecord:
     global vip_dxcc
 
-    location_data = get_location_data(data['prefixed_callsign'], latest_data)
+    location_data = get_location_data(data['prefixed_callsign'], latest_data or data)
     if location_data:
         data.update({
             k: location_data[k] for k in ['country', 'dxcc', 'continent']
         })
+    STAGES.mark('location')
     
     grid_data = get_grid_data(data['callsign'], data.get('grid', None), location_data)
     if grid_data:
         data.update(grid_data)
     if data['grid'] is None:
         data.pop('grid')
+    STAGES.mark('grid')
 
     data.update(additional_data)
 
@@ -230,31 +677,48 @@ def completing_data(data: dict, additional_data: dict, now: float = None, latest
     data['isReemerging'] = False
     data['isSpam'] = False
     data['isEven'] = (0 <= (data['Time']/1000)%TIMING[data['mode']]['full'] < TIMING[data['mode']]['half'])
-    data['isValid'] = latest_data.get('isValid', False)
+    data['isValid'] = data.get('isValid', latest_data.get('isValid', False))
     data['skipGrid'] = True
     data['nextTx'] = get_transmit_data_type(data)
-    data['isNewCallsign'] = latest_data.get('isNewCallsign', not done_coll.find_one(
-        {
-            'callsign': data['callsign'],
-            'band': data['band'],
-            'mode': data['mode']
-        }
-    ))
-    data['isNewDXCC'] = latest_data.get('isNewDXCC', not done_coll.find_one(
-        {
-            'dxcc': data.get('dxcc', 0),
-            'band': data['band'],
-            'mode': data['mode']
-        }
-    ))
+    if 'isNewCallsign' in latest_data:
+        data['isNewCallsign'] = latest_data['isNewCallsign']
+    elif 'isNewCallsign' not in data:
+        data['isNewCallsign'] = not done_coll.find_one(
+            {
+                'callsign': data['callsign'],
+                'band': data['band'],
+                'mode': data['mode']
+            }
+        )
+    if 'isNewDXCC' in latest_data:
+        data['isNewDXCC'] = latest_data['isNewDXCC']
+    else:
+        data['isNewDXCC'] = not done_coll.find_one(
+            {
+                'dxcc': data.get('dxcc', 0),
+                'band': data['band'],
+                'mode': data['mode']
+            }
+        )
+    STAGES.mark('worked')
     data['isVIPDXCC'] = data.get('country', None) in vip_dxcc
-    data['timestamp'] = now or datetime.now().timestamp()
+    data['timestamp'] = now or CLOCK.now()
+    data.update(get_expiry_data(data['timestamp'], data['mode']))
     
     return data
 
+def enqueue(data: DecodeRecord, now: float):
+    call_coll.update_one(
+        {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
+        {'$set': data.as_document()},
+        upsert=True
+    )
+    TRACE.enqueue(data, now)
+
 def get_state_data(callsign: str) -> dict:
 
     data = {}
+    call_info2 = get_call_info2()
     if call_info2:
         try:
             state_data = call_info2.get_all(callsign)
@@ -269,7 +733,7 @@ def get_state_data(callsign: str) -> dict:
     
     return data
 
-def get_transmit_data_type(data: dict) -> str:
+def get_transmit_data_type(data: DecodeRecord) -> str:
     global NEXT_TRANSMIT, LOCAL_STATES
 
     return NEXT_TRANSMIT.get(
@@ -278,6 +742,14 @@ def get_transmit_data_type(data: dict) -> str:
     ).get(data['type'], 'SNR' if data.get('skipGrid', True) else 'GRID')
 
 def process_wsjt(_data: bytes, ip_from: tuple, states: States):
+    STAGES.begin()
+    try:
+        process_packet(_data, ip_from, states)
+    finally:
+        STAGES.end()
+        DB_STATS.end()
+
+def process_packet(_data: bytes, ip_from: tuple, states: States):
     global callsign_exc, receiver_exc, LOCAL_STATES
 
     try:
@@ -286,22 +758,30 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
         raise e
     except (IOError, NotImplementedError):
         logging.exception('Something not right!')
+        DROPPED.inc(('invalid',))
         return
+    PACKETS.inc((type(packet).__name__[2:].lower(),))
+    STAGES.label(packet)
+    STAGES.mark('decode')
+    DB_STATS.label(packet)
 
     if isinstance(packet, wsjtx.WSHeartbeat):
 
-        logging.info(f'IP: {ip_from[0]} | Port: {ip_from[1]}')
+        logging.info('IP: %s | Port: %s', ip_from[0], ip_from[1])
         states.closed = False
+        request_replay(states)
     
     elif isinstance(packet, wsjtx.WSStatus):
 
-        now = datetime.now().timestamp()
-        logging.debug(f'[MY CALLSIGN: {packet.DeCall}] [MY GRID: {packet.DeGrid}] '
-            f'[DX CALLSIGN: {packet.DXCall}] [DX GRID: {packet.DXGrid}] '
-            f'[TX ENABLED: {packet.TXEnabled}] [DECODING: {packet.Decoding}] [TRANSMITTING: {packet.Transmitting}] '
-            f'[TXDF: {packet.TXdf}] [RXDF: {packet.RXdf}] [TX EVEN: {packet.TxEven}] '
-            f'[FREQUENCY: {packet.Frequency}] [MODE: {packet.Mode}] [LAST TX: {packet.LastTxMsg}] '
-            f'[TX HALTED: {packet.TxHaltClicked}]'
+        now = CLOCK.now()
+        logging.debug('[MY CALLSIGN: %s] [MY GRID: %s] '
+            '[DX CALLSIGN: %s] [DX GRID: %s] '
+            '[TX ENABLED: %s] [DECODING: %s] [TRANSMITTING: %s] '
+            '[TXDF: %s] [RXDF: %s] [TX EVEN: %s] '
+            '[FREQUENCY: %s] [MODE: %s] [LAST TX: %s] '
+            '[TX HALTED: %s]',
+            packet.DeCall, packet.DeGrid, packet.DXCall, packet.DXGrid, packet.TXEnabled, packet.Decoding, packet.Transmitting,
+            packet.TXdf, packet.RXdf, packet.TxEven, packet.Frequency, packet.Mode, packet.LastTxMsg, packet.TxHaltClicked
         )
         LOCAL_STATES['my_callsign'] = packet.DeCall or ''
         states.change_states(
@@ -321,11 +801,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
             'mode',
             'transmitting'
         )
+        STAGES.mark('states')
         
         latest_band = states_list['band']
         latest_mode = states_list['mode']
+        from pyhamtools.frequency import freq_to_band
         current_band: int = freq_to_band(packet.Frequency//1000)['band']
         current_mode = packet.Mode
+        if RESTART_SNAPSHOT:
+            restore_snapshot(states, packet.DeCall or '', current_band, current_mode)
         packet_last_tx = packet.LastTxMsg or ''
         isTransmitting = packet.Transmitting and (LOCAL_STATES['current_tx'] != packet_last_tx or states_list['transmitting'] != packet.Transmitting)
         isDoneTransmitting = not packet.Transmitting and states_list['transmitting'] != packet.Transmitting
@@ -338,28 +822,13 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
         if isTransmitting:
 
             logging.info(
-                f'[TX] [MODE: {current_mode}] [BAND: {current_band}] '
-                f'[FREQUENCY: {states.txdf}] {LOCAL_STATES["current_tx"]}'
+                '[TX] [MODE: %s] [BAND: %s] '
+                '[FREQUENCY: %s] %s',
+                current_mode, current_band, states.txdf, LOCAL_STATES['current_tx']
             )
 
         if isDoneTransmitting:
 
-            if EXPIRED_TIME:
-                call_coll.update_many(
-                    {
-                        'timestamp': {'$lte': now-EXPIRED_TIME+TIMING[current_mode]['half']+2}, 
-                        'importance': {'$lt': 2}
-                    },
-                    {'$set': {'expired': True}}
-                )
-            if RELEASE_FROM_SPAM_TIME:
-                call_coll.update_many(
-                    {
-                        'timestamp': {'$lte': now-RELEASE_FROM_SPAM_TIME+TIMING[current_mode]['half']+2}, 
-                        'isSpam': True
-                    },
-                    {'$set': {'isSpam': False}}
-                )
             if CALLSIGN_EXCEPTION:
                 try:
                     with open(CALLSIGN_EXCEPTION) as f:
@@ -398,6 +867,7 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     result = call_coll.find_one(
                         {'callsign': matched['to'], 'band': current_band, 'mode': current_mode}
                     ) or {}
+                    TRACE.step('tx', matched['to'], current_band, current_mode, now, matched['type'])
                 if not isSameMessage:
                     num_tries = result.get('num_tries', 0) + 1
                     states.change_states(
@@ -436,13 +906,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                         )
                         if result:
                             logging.warning(
-                                f'[DB] [MODE: {current_mode}] [BAND: {current_band}] '
-                                f'[CALLSIGN: {matched["to"]}] Max tried {result["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Max tried %s',
+                                current_mode, current_band, matched['to'], result['Message']
                             )
                         call_coll.update_one(
                             {'callsign': matched['to'], 'band': current_band, 'mode': current_mode},
                             {'$set': {'tried': True}}
                         )
+                        TRACE.step('tried', matched['to'], current_band, current_mode, now)
 
                     num_inactive_before_cut = result.get('num_inactive_before_cut', states_list['num_inactive_before_cut'])
                     if num_inactive_before_cut and states_list['inactive_count'] > num_inactive_before_cut:
@@ -452,13 +924,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                         )
                         if result:
                             logging.warning(
-                                f'[DB] [MODE: {current_mode}] [BAND: {current_band}] '
-                                f'[CALLSIGN: {matched["to"]}] Max tried after inactive {result["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Max tried after inactive %s',
+                                current_mode, current_band, matched['to'], result['Message']
                             )
                         call_coll.update_one(
                             {'callsign': matched['to'], 'band': current_band, 'mode': current_mode},
                             {'$set': {'expired': True}}
                         )
+                        TRACE.step('inactive', matched['to'], current_band, current_mode, now)
                     
                     if states_list['transmit_counter'] >= result.get('max_transmit_count', 2*states_list['max_tries']):
                         states.change_states(
@@ -468,13 +942,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                         )
                         if result:
                             logging.warning(
-                                f'[DB] [MODE: {current_mode}] [BAND: {current_band}] '
-                                f'[CALLSIGN: {matched["to"]}] Looping message {result["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Looping message %s',
+                                current_mode, current_band, matched['to'], result['Message']
                             )
                         call_coll.update_one(
                             {'callsign': matched['to'], 'band': current_band, 'mode': current_mode},
                             {'$set': {'tried': True, 'isSpam': True}}
                         )
+                        TRACE.step('spam', matched['to'], current_band, current_mode, now)
 
             else:
                 states.change_states(
@@ -484,12 +960,14 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 )
 
             if not isSameMessage and matched.get('type', None) == 'R73':
+                TRACE.step('r73', matched['to'], current_band, current_mode, now, matched['R73'])
                 qso_data = done_coll.find_one(
                     {'callsign': matched['to'], 'band': current_band, 'mode': current_mode, 'logScript': True}
                 ) or {}
                 if not qso_data:
-                    logging.info(f'Logging QSO: {matched["to"]} at band {current_band} in mode {current_mode}')
+                    logging.info('Logging QSO: %s at band %s in mode %s', matched['to'], current_band, current_mode)
                     states.log_qso()
+                    TRACE.step('log', matched['to'], current_band, current_mode, now)
                 current_data = call_coll.find_one_and_update(
                     {'callsign': matched['to'], 'band': current_band, 'mode': current_mode},
                     {'$set': {'isNewCallsign': False, 'isNewDXCC': False}}
@@ -518,7 +996,7 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     blacklist_data.update(grid_data)
                     if blacklist_data.get('grid', None) is None:
                         blacklist_data.pop('grid')
-                    if call_info2 and blacklist_data.get('country', None) == 'United States':
+                    if QRZ_USERNAME and blacklist_data.get('country', None) == 'United States':
                         if all([i in current_data for i in ['state', 'county']]):
                             blacklist_data.update({
                                 'state': current_data['state'],
@@ -528,9 +1006,11 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                             state_data = get_state_data(current_data.get('callsign', matched['to']))
                             blacklist_data.update(state_data)
                     done_coll.insert_one(blacklist_data)
+                    remove_rejected(callsign=matched['to'], band=current_band, mode=current_mode)
                     logging.info(
-                        f'[DB] [MODE: {current_mode}] [BAND: {current_band}] '
-                        f'[CALLSIGN: {matched["to"]}] Inserting to blacklist {LOCAL_STATES["current_tx"]}'
+                        '[DB] [MODE: %s] [BAND: %s] '
+                        '[CALLSIGN: %s] Inserting to blacklist %s',
+                        current_mode, current_band, matched['to'], LOCAL_STATES['current_tx']
                     )
             
             if matched.get('type', None) == 'R73':
@@ -551,8 +1031,9 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     )
                     if result:
                         logging.warning(
-                            f'[DB] [MODE: {current_mode}] [BAND: {current_band}] '
-                            f'[CALLSIGN: {matched["to"]}] Removing {result["Message"]}'
+                            '[DB] [MODE: %s] [BAND: %s] '
+                            '[CALLSIGN: %s] Removing %s',
+                            current_mode, current_band, matched['to'], result['Message']
                         )
             
             states_list = states.get_states(
@@ -564,7 +1045,7 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
             if states_list['num_disable_transmit']:
                 if states_list['transmitter_started']:
                     value = (states_list['enable_transmit_counter'] + 1) % states_list['num_disable_transmit']
-                    time.sleep(0.5)
+                    CLOCK.sleep(0.5)
                     if value == 0:
                         states.disable_transmit()
                     states.enable_monitoring()
@@ -574,15 +1055,24 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
 
         if isChangingBand:
             logging.warning('Changing band by user!')
-            logging.warning(f'[DB] [MODE: {latest_mode}] [BAND: {latest_band}] Removing all message!')
-            call_coll.delete_many({'band': latest_band, 'mode': latest_mode})
-            message_coll.delete_many({'band': latest_band, 'mode': latest_mode})
+            if not BAND_QUEUE_TIME:
+                logging.warning('[DB] [MODE: %s] [BAND: %s] Removing all message!', latest_mode, latest_band)
+                call_coll.delete_many({'band': latest_band, 'mode': latest_mode})
+                remove_messages({'band': latest_band, 'mode': latest_mode})
         
         if isChangingMode:
             logging.warning('Changing mode by user!')
-            logging.warning(f'[DB] [MODE: {latest_mode}] Removing all message!')
-            call_coll.delete_many({'mode': latest_mode})
-            message_coll.delete_many({'mode': latest_mode})
+            if not BAND_QUEUE_TIME:
+                logging.warning('[DB] [MODE: %s] Removing all message!', latest_mode)
+                call_coll.delete_many({'mode': latest_mode})
+                remove_messages({'mode': latest_mode})
+
+        if BAND_QUEUE_TIME:
+            if isChangingBand or isChangingMode:
+                freeze_queue(latest_band, latest_mode, now)
+                thaw_queue(current_band, current_mode)
+            if FROZEN_QUEUES:
+                remove_frozen_queues(now)
 
         states.change_states(
             band = current_band,
@@ -590,21 +1080,31 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
         )
 
         LOCAL_STATES['states_completed'] = True
+        request_replay(states)
 
     elif isinstance(packet, wsjtx.WSDecode):
 
         if not LOCAL_STATES['states_completed']:
             return
 
-        now = datetime.now().timestamp()
+        now = CLOCK.now()
 
         states_list = states.get_states(
             'band',
             'mode',
             'num_inactive_before_cut',
             'num_tries_call_busy',
-            'max_tries'
+            'max_tries',
+            'min_db'
         )
+        STAGES.mark('states')
+        DECODES.inc((states_list['band'], states_list['mode']))
+
+        # Replayed band activity is only added to queue if it's still possible to answer
+        if not packet.New and not is_recent_decode(packet, states_list['mode'], now):
+            FILTER_COUNTER['replay'] += 1
+            cache_replayed_decode(packet, states_list, now)
+            return
 
         if MIN_FREQUENCY <= packet.DeltaFrequency <= MAX_FREQUENCY:
             delta_time = packet.Time/1000
@@ -614,27 +1114,82 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 states.add_odd_frequency(packet.DeltaFrequency)
         
         logging.info(
-            f'[RX] [MODE: {states_list["mode"]}] [BAND: {states_list["band"]}] '
-            f'[FREQUENCY: {packet.DeltaFrequency}] [DB: {packet.SNR}] {packet.Message}'
+            '[RX] [MODE: %s] [BAND: %s] '
+            '[FREQUENCY: %s] [DB: %s] %s',
+            states_list['mode'], states_list['band'], packet.DeltaFrequency, packet.SNR, packet.Message
         )
-
-        data = packet.as_dict()
-        data.update(parsing_message(packet.Message))
+        STAGES.mark('log')
+
+        period = int(packet.Time/1000//TIMING[states_list['mode']]['half'])
+        if packet.New and period != LOCAL_STATES['period']:
+            if LOCAL_STATES['period']:
+                DB_STATS.report(LOCAL_STATES['period']*TIMING[states_list['mode']]['half'])
+            LOCAL_STATES['period'] = period
+            save_snapshot(states, now)
+            flush_messages()
+            logging.info('[FILTER] %s', ' | '.join([f'{k.upper()}: {v}' for k, v in FILTER_COUNTER.items()]))
+            for line in STAGES.summary().splitlines():
+                logging.info('[TIMING] %s', line)
+        FILTER_COUNTER['decode'] += 1
+        if not LOCAL_STATES['first_decode']:
+            LOCAL_STATES['first_decode'] = True
+            logging.info('[STARTUP] First decode after %.2f s', time.perf_counter() - LOCAL_STATES['started'])
+
+        STAGES.mark('period')
+        data = DecodeRecord.from_packet(packet.as_dict(), parsing_message(packet.Message))
+        STAGES.mark('parse')
 
         if 'type' not in data:
             logging.warning('Cannot parsing the message!')
+            FILTER_COUNTER['parse'] += 1
             return
 
         latest_data = call_coll.find_one_and_delete(
             {'callsign': data['callsign'], 'band': states_list['band'], 'mode': states_list['mode']}
         ) or {}
         latest_data.pop('_id', None)
+        STAGES.mark('queue')
         if latest_data:
+            refresh_expiry(latest_data, now)
             logging.warning(
-                f'[DB] [MODE: {states_list["mode"]}] [BAND: {states_list["band"]}] '
-                f'[CALLSIGN: {latest_data["callsign"]}] Removing {latest_data["Message"]}'
+                '[DB] [MODE: %s] [BAND: %s] '
+                '[CALLSIGN: %s] Removing %s',
+                states_list['mode'], states_list['band'], latest_data['callsign'], latest_data['Message']
             )
 
+        if data['callsign'] in callsign_exc:
+            logging.warning('The Callsign is blacklisted in callsign exception!')
+            FILTER_COUNTER['exception'] += 1
+            return
+
+        # Locator is remembered even when the decode is rejected, get_grid_data uses it for later messages
+        if data['type'] in ['CQ', 'GRID'] and data.get('grid', None):
+            set_grid(data['callsign'], data['grid'])
+
+        # Blacklist and valid callsign are not complete yet, the callsign will be decoded again later
+        # Station answering us is never held back, like filter_decode
+        if not latest_data and not LOCAL_STATES['admission_ready'] and \
+            data.get('to', None) != LOCAL_STATES['my_callsign'] and data['callsign'] != LOCAL_STATES['current_callsign']:
+            FILTER_COUNTER['startup'] += 1
+            return
+
+        # Message that is not for us and not in queue is only added to queue after passing all filter,
+        # so reject it before the expensive completing_data
+        message_data = None
+        if not latest_data and data.get('to', None) != LOCAL_STATES['my_callsign'] and \
+            data['callsign'] != LOCAL_STATES['current_callsign']:
+            rejected_stage, message_data = filter_decode(data, states_list, now)
+            if rejected_stage:
+                # Only the parsed fields and what the filter found are kept, the rest is completed once admitted
+                set_message(data['callsign'], states_list['band'], states_list['mode'], {
+                    **data.as_document(),
+                    'band': states_list['band'],
+                    'mode': states_list['mode'],
+                    'timestamp': now
+                })
+                FILTER_COUNTER[rejected_stage] += 1
+                return
+
         additional_data = {
             'band': states_list['band'],
             'mode': states_list['mode'],
@@ -642,24 +1197,17 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
             'max_transmit_count': 2*states_list['max_tries'],
             'num_inactive_before_cut': states_list['num_inactive_before_cut']
         }
+        if not latest_data and message_data is None:
+            message_data = get_message(data['callsign'], states_list['band'], states_list['mode'])
         completing_data(
             data,
             additional_data,
             now,
-            latest_data or message_coll.find_one(
-                {'callsign': data['callsign'], 'band': states_list['band'], 'mode': states_list['mode']}
-            ) or {}
-        )
-
-        message_coll.update_one(
-            {'callsign': data['callsign'], 'band': states_list['band'], 'mode': states_list['mode']},
-            {'$set': data},
-            upsert=True
+            latest_data or message_data
         )
 
-        if data['callsign'] in callsign_exc:
-            logging.warning('The Callsign is blacklisted in callsign exception!')
-            return
+        set_message(data['callsign'], states_list['band'], states_list['mode'], data)
+        STAGES.mark('message')
 
         if 'country' not in data:
             logging.warning('The Callsign\'s country is not found')
@@ -673,13 +1221,11 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
         if data['num_inactive_before_cut'] and data['callsign'] == LOCAL_STATES['current_callsign']:
             states.inactive_count = 0
 
-        if data['type'] == 'CQ':
+        TRACE.candidate(data, latest_data, now)
+        if data.get('to', None) == LOCAL_STATES['my_callsign']:
+            TRACE.step('message', data['callsign'], data['band'], data['mode'], now, data['type'])
 
-            if data.get('grid', None):
-                grid_coll.update_one({'callsign': data['callsign']}, {'$set': {
-                    'callsign': data['callsign'],
-                    'grid': data['grid']
-                }}, upsert=True)
+        if data['type'] == 'CQ':
 
             if latest_data:
                 if latest_data.get('to', None) == LOCAL_STATES['my_callsign'] and latest_data.get('R73', None) != '73':
@@ -691,10 +1237,12 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                             latest_data['expired'] = False
                             latest_data['tried'] = False
                             latest_data['timestamp'] = data['timestamp']
+                            latest_data.update(get_expiry_data(data['timestamp'], states_list['mode']))
                             latest_data['isReemerging'] = True
                         logging.info(
-                            f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                            f'[CALLSIGN: {latest_data["callsign"]}] Adding back {latest_data["Message"]}'
+                            '[DB] [MODE: %s] [BAND: %s] '
+                            '[CALLSIGN: %s] Adding back %s',
+                            latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                         )
                         call_coll.update_one(
                             {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -704,8 +1252,9 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                         return
                 if latest_data['isSpam'] and latest_data['nextTx'] == data['nextTx']:
                     logging.info(
-                        f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                        f'[CALLSIGN: {latest_data["callsign"]}] Adding back to spam {latest_data["Message"]}'
+                        '[DB] [MODE: %s] [BAND: %s] '
+                        '[CALLSIGN: %s] Adding back to spam %s',
+                        latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                     )
                     call_coll.update_one(
                         {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -722,19 +1271,17 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 return
 
             logging.info(
-                f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                '[DB] [MODE: %s] [BAND: %s] '
+                '[CALLSIGN: %s] Adding %s',
+                data['mode'], data['band'], data['callsign'], data['Message']
             )
             data['importance'] = 1 + priority_country.get(data['country'], 0)
             logging.info(
-                f'[DB] [NEW CALLSIGN: {data["isNewCallsign"]}] '
-                f'[IMPORTANCE: {data["importance"]}] [CALLSIGN: {data["callsign"]}]'
-            )
-            call_coll.update_one(
-                {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                {'$set': data},
-                upsert=True
+                '[DB] [NEW CALLSIGN: %s] '
+                '[IMPORTANCE: %s] [CALLSIGN: %s]',
+                data['isNewCallsign'], data['importance'], data['callsign']
             )
+            enqueue(data, now)
 
         elif data['type'] == 'R73':
 
@@ -744,24 +1291,21 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     if states.transmitting:
                         matched = parsing_message(LOCAL_STATES['current_tx'])
                         if matched['to'] == data['callsign']:
-                            logging.warning(f'[TX] Halting the transmitting: {LOCAL_STATES["current_tx"]}')
+                            logging.warning('[TX] Halting the transmitting: %s', LOCAL_STATES['current_tx'])
                             states.halt_transmit()
                     return
 
                 else:
                     
                     logging.info(
-                        f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                        f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                        '[DB] [MODE: %s] [BAND: %s] '
+                        '[CALLSIGN: %s] Adding %s',
+                        data['mode'], data['band'], data['callsign'], data['Message']
                     )
                     data['importance'] = 4 + priority_country.get(data['country'], 0)
                     if latest_data and latest_data['nextTx'] == data['nextTx']:
                         data['isSpam'] = latest_data.get('isSpam', False)
-                    call_coll.update_one(
-                        {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                        {'$set': data},
-                        upsert=True
-                    )
+                    enqueue(data, now)
 
             else:
 
@@ -775,10 +1319,12 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                                 latest_data['expired'] = False
                                 latest_data['tried'] = False
                                 latest_data['timestamp'] = data['timestamp']
+                                latest_data.update(get_expiry_data(data['timestamp'], states_list['mode']))
                                 latest_data['isReemerging'] = True
                             logging.info(
-                                f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                                f'[CALLSIGN: {latest_data["callsign"]}] Adding back {latest_data["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Adding back %s',
+                                latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                             )
                             call_coll.update_one(
                                 {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -788,8 +1334,9 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                             return
                     if latest_data['isSpam'] and latest_data['nextTx'] == data['nextTx']:
                         logging.info(
-                            f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                            f'[CALLSIGN: {latest_data["callsign"]}] Adding back to spam {latest_data["Message"]}'
+                            '[DB] [MODE: %s] [BAND: %s] '
+                            '[CALLSIGN: %s] Adding back to spam %s',
+                            latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                         )
                         call_coll.update_one(
                             {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -806,34 +1353,26 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     return
 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 data['importance'] = 1 + priority_country.get(data['country'], 0)
                 logging.info(
-                    f'[DB] [NEW CALLSIGN: {data["isNewCallsign"]}] '
-                    f'[IMPORTANCE: {data["importance"]}] [CALLSIGN: {data["callsign"]}]'
-                )
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
+                    '[DB] [NEW CALLSIGN: %s] '
+                    '[IMPORTANCE: %s] [CALLSIGN: %s]',
+                    data['isNewCallsign'], data['importance'], data['callsign']
                 )
+                enqueue(data, now)
 
         elif data['type'] == 'GRID':
 
-            if data.get('grid', None):
-                grid_coll.update_one({'callsign': data['callsign']}, {'$set': {
-                    'callsign': data['callsign'],
-                    'grid': data['grid']
-                }}, upsert=True
-            )
-
             if data['to'] == LOCAL_STATES['my_callsign']:
 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 if GRID_HIGHER_THAN_CQ:
                     data['importance'] = 1.5 + priority_country.get(data['country'], 0)
@@ -841,11 +1380,7 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     data['importance'] = 1 + priority_country.get(data['country'], 0)
                 if latest_data and latest_data['nextTx'] == data['nextTx']:
                     data['isSpam'] = latest_data.get('isSpam', False)
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
-                )
+                enqueue(data, now)
 
             else:
 
@@ -859,10 +1394,12 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                                 latest_data['expired'] = False
                                 latest_data['tried'] = False
                                 latest_data['timestamp'] = data['timestamp']
+                                latest_data.update(get_expiry_data(data['timestamp'], states_list['mode']))
                                 latest_data['isReemerging'] = True
                             logging.info(
-                                f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                                f'[CALLSIGN: {latest_data["callsign"]}] Adding back {latest_data["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Adding back %s',
+                                latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                             )
                             call_coll.update_one(
                                 {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -872,8 +1409,9 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                             return
                     if latest_data['isSpam'] and latest_data['nextTx'] == data['nextTx']:
                         logging.info(
-                            f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                            f'[CALLSIGN: {latest_data["callsign"]}] Adding back to spam {latest_data["Message"]}'
+                            '[DB] [MODE: %s] [BAND: %s] '
+                            '[CALLSIGN: %s] Adding back to spam %s',
+                            latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                         )
                         call_coll.update_one(
                             {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -897,13 +1435,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     return
 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 data['importance'] = 1 + priority_country.get(data['country'], 0)
                 logging.info(
-                    f'[DB] [NEW CALLSIGN: {data["isNewCallsign"]}] '
-                    f'[IMPORTANCE: {data["importance"]}] [CALLSIGN: {data["callsign"]}]'
+                    '[DB] [NEW CALLSIGN: %s] '
+                    '[IMPORTANCE: %s] [CALLSIGN: %s]',
+                    data['isNewCallsign'], data['importance'], data['callsign']
                 )
                 data['tries'] = states_list['num_tries_call_busy']
                 if data['isVIPDXCC']:
@@ -911,28 +1451,21 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 data['tried'] = latest_data.get('tried', False)
                 if latest_data and latest_data['nextTx'] == data['nextTx']:
                     data['isSpam'] = latest_data.get('isSpam', False)
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
-                )
+                enqueue(data, now)
 
         elif data['type'] == 'SNR':
 
             if data['to'] == LOCAL_STATES['my_callsign']:
                 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 data['importance'] = 2 + priority_country.get(data['country'], 0)
                 if latest_data and latest_data['nextTx'] == data['nextTx']:
                     data['isSpam'] = latest_data.get('isSpam', False)
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
-                )
+                enqueue(data, now)
 
             else:
                 
@@ -946,10 +1479,12 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                                 latest_data['expired'] = False
                                 latest_data['tried'] = False
                                 latest_data['timestamp'] = data['timestamp']
+                                latest_data.update(get_expiry_data(data['timestamp'], states_list['mode']))
                                 latest_data['isReemerging'] = True
                             logging.info(
-                                f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                                f'[CALLSIGN: {latest_data["callsign"]}] Adding back {latest_data["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Adding back %s',
+                                latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                             )
                             call_coll.update_one(
                                 {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -959,8 +1494,9 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                             return
                     if latest_data['isSpam'] and latest_data['nextTx'] == data['nextTx']:
                         logging.info(
-                            f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                            f'[CALLSIGN: {latest_data["callsign"]}] Adding back to spam {latest_data["Message"]}'
+                            '[DB] [MODE: %s] [BAND: %s] '
+                            '[CALLSIGN: %s] Adding back to spam %s',
+                            latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                         )
                         call_coll.update_one(
                             {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -984,13 +1520,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     return
 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 data['importance'] = 1 + priority_country.get(data['country'], 0)
                 logging.info(
-                    f'[DB] [NEW CALLSIGN: {data["isNewCallsign"]}] '
-                    f'[IMPORTANCE: {data["importance"]}] [CALLSIGN: {data["callsign"]}]'
+                    '[DB] [NEW CALLSIGN: %s] '
+                    '[IMPORTANCE: %s] [CALLSIGN: %s]',
+                    data['isNewCallsign'], data['importance'], data['callsign']
                 )
                 data['tries'] = states_list['num_tries_call_busy']
                 if data['isVIPDXCC']:
@@ -998,28 +1536,21 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 data['tried'] = latest_data.get('tried', False)
                 if latest_data and latest_data['nextTx'] == data['nextTx']:
                     data['isSpam'] = latest_data.get('isSpam', False)
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
-                )
+                enqueue(data, now)
 
         elif data['type'] == 'RSNR':
 
             if data['to'] == LOCAL_STATES['my_callsign']:
                 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 data['importance'] = 3 + priority_country.get(data['country'], 0)
                 if latest_data and latest_data['nextTx'] == data['nextTx']:
                     data['isSpam'] = latest_data.get('isSpam', False)
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
-                )
+                enqueue(data, now)
 
             else:
                 
@@ -1033,10 +1564,12 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                                 latest_data['expired'] = False
                                 latest_data['tried'] = False
                                 latest_data['timestamp'] = data['timestamp']
+                                latest_data.update(get_expiry_data(data['timestamp'], states_list['mode']))
                                 latest_data['isReemerging'] = True
                             logging.info(
-                                f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                                f'[CALLSIGN: {latest_data["callsign"]}] Adding back {latest_data["Message"]}'
+                                '[DB] [MODE: %s] [BAND: %s] '
+                                '[CALLSIGN: %s] Adding back %s',
+                                latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                             )
                             call_coll.update_one(
                                 {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -1046,8 +1579,9 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                             return
                     if latest_data['isSpam'] and latest_data['nextTx'] == data['nextTx']:
                         logging.info(
-                            f'[DB] [MODE: {latest_data["mode"]}] [BAND: {latest_data["band"]}] '
-                            f'[CALLSIGN: {latest_data["callsign"]}] Adding back to spam {latest_data["Message"]}'
+                            '[DB] [MODE: %s] [BAND: %s] '
+                            '[CALLSIGN: %s] Adding back to spam %s',
+                            latest_data['mode'], latest_data['band'], latest_data['callsign'], latest_data['Message']
                         )
                         call_coll.update_one(
                             {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
@@ -1071,13 +1605,15 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                     return
 
                 logging.info(
-                    f'[DB] [MODE: {data["mode"]}] [BAND: {data["band"]}] '
-                    f'[CALLSIGN: {data["callsign"]}] Adding {data["Message"]}'
+                    '[DB] [MODE: %s] [BAND: %s] '
+                    '[CALLSIGN: %s] Adding %s',
+                    data['mode'], data['band'], data['callsign'], data['Message']
                 )
                 data['importance'] = 1 + priority_country.get(data['country'], 0)
                 logging.info(
-                    f'[DB] [NEW CALLSIGN: {data["isNewCallsign"]}] '
-                    f'[IMPORTANCE: {data["importance"]}] [CALLSIGN: {data["callsign"]}]'
+                    '[DB] [NEW CALLSIGN: %s] '
+                    '[IMPORTANCE: %s] [CALLSIGN: %s]',
+                    data['isNewCallsign'], data['importance'], data['callsign']
                 )
                 data['tries'] = states_list['num_tries_call_busy']
                 if data['isVIPDXCC']:
@@ -1085,14 +1621,10 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 data['tried'] = latest_data.get('tried', False)
                 if latest_data and latest_data['nextTx'] == data['nextTx']:
                     data['isSpam'] = latest_data.get('isSpam', False)
-                call_coll.update_one(
-                    {'callsign': data['callsign'], 'band': data['band'], 'mode': data['mode']},
-                    {'$set': data},
-                    upsert=True
-                )
+                enqueue(data, now)
 
     elif isinstance(packet, wsjtx.WSADIF):
-        logging.info(f'LOGGED ADIF: {packet.ADIF}')
+        logging.info('LOGGED ADIF: %s', packet.ADIF)
 
         result_data, _ = read_from_string(packet.ADIF)
         logged_data = result_data[0]
@@ -1100,6 +1632,8 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
             'band',
             'mode'
         )
+        QSOS.inc((states_list['band'], states_list['mode']))
+        TRACE.logged(logged_data['CALL'], states_list['band'], states_list['mode'], CLOCK.now())
 
         done_coll.update_one(
             {'callsign': logged_data['CALL'], 'logScript': True, **states_list},
@@ -1108,6 +1642,7 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
                 'timestamp': datetime.strptime(f'{logged_data["QSO_DATE_OFF"]}{logged_data["TIME_OFF"][:4]}+0000', '%Y%m%d%H%M%z').timestamp()
             }}
         )
+        remove_rejected(callsign=logged_data['CALL'], **states_list)
 
     elif isinstance(packet, wsjtx.WSClose):
         logging.warning(packet)
@@ -1117,50 +1652,51 @@ def process_wsjt(_data: bytes, ip_from: tuple, states: States):
     else:
         logging.debug(packet)
 
-def init(sock: socket.socket, states: States):
+def set_static_data(data: dict):
+    global call_info, country_to_dxcc, dxcc_exception, priority_country, vip_dxcc, valid_callsign
 
-    logging.info('Initializing...')
-    now = datetime.now().timestamp()
-    states.r.flushdb()
-    states.new_grid = NEW_GRID
-    states.new_dxcc = NEW_DXCC
-    states.min_db = MIN_DB
-    states.num_inactive_before_cut = NUM_INACTIVE_BEFORE_CUT
-    states.num_tries_call_busy = NUM_TRIES_CALL_BUSY
-    states.num_disable_transmit = NUM_DISABLE_TRANSMIT
-    states.max_tries = MAX_TRIES
+    call_info = data['call_info']
+    country_to_dxcc = data['country_to_dxcc']
+    dxcc_exception = [country_to_dxcc.get(i,0) for i in DXCC_EXCEPTION]
+    priority_country = data['priority_country']
+    vip_dxcc = data['vip_dxcc']
+    valid_callsign = data['valid_callsign']
 
-    done_coll.update_many({'logScript': True, 'timestamp': {'$lte': now - 15*60}}, {'$unset': {'logScript': ''}})
-    call_coll.delete_many({})
-    message_coll.delete_many({})
+def update_blacklist() -> bool:
+    # Runs in background while receiving, returns True if some logs are deleted from blacklist
+    deleted = False
 
     if QRZ_API_KEY:
         logging.info('Checking QRZ Logbook...')
-        if NUM_DAYS_LOG:
-            now = datetime.now()
-            previous = now - timedelta(days=NUM_DAYS_LOG)
-            now_str = now.strftime('%Y-%m-%d')
-            previous_str = previous.strftime('%Y-%m-%d')
-            logging.info(f'Getting log from {previous_str} to {now_str}...')
-            res = requests.post(
-                'https://logbook.qrz.com/api',
-                data=f'KEY={QRZ_API_KEY}&ACTION=FETCH&OPTION=BETWEEN:{previous_str}+{now_str}'
+        try:
+            if NUM_DAYS_LOG:
+                now = datetime.now()
+                previous = now - timedelta(days=NUM_DAYS_LOG)
+                now_str = now.strftime('%Y-%m-%d')
+                previous_str = previous.strftime('%Y-%m-%d')
+                logging.info('Getting log from %s to %s...', previous_str, now_str)
+                logging.info('Parsing the log and putting to database while downloading...')
+                stats = adif_parser(fetch_qrz_log(f'BETWEEN:{previous_str}+{now_str}'))
+            else:
+                logging.info('Getting logs modified since the last sync...')
+                # Unconfirmed logs deleted below only come back with full sync, so do it when the deleted range changes
+                sync_config = [WORK_ON_UNCONFIRMED_QSO, EXCLUDE_UNCONFIRMED_QSO_DATE_RANGE]
+                if any(isinstance(v, int) for v in EXCLUDE_UNCONFIRMED_QSO_DATE_RANGE.values()):
+                    sync_config.append(datetime.now().strftime('%Y-%m-%d'))
+                stats = sync_qrz_log(json.dumps(sync_config))
+            logging.info(
+                '[DB] Imported %s QSO in %s round trips, %.0f QSO/s',
+                stats['qso'], stats['round_trips'], stats['qso']/max(stats['seconds'], 1e-9)
             )
-        else:
-            logging.info(f'Getting all log...')
-            res = requests.post('https://logbook.qrz.com/api', data=f'KEY={QRZ_API_KEY}&ACTION=FETCH')
-        if res.ok:
-            logging.info('Parsing the log and putting to database...')
-            result_str = res.text.replace('&lt;','<').replace('&gt;','>').replace('\n', ' ')
-            result_adif = re.search(r'ADIF=(.*<eor>)', result_str)
-            if result_adif:
-                adif_parser(result_adif.group(1))
+        except QRZLogbookError as e:
+            logging.warning('[DB] Failed to get log from QRZ Logbook: %s', e)
     
     from_date = EXCLUDE_UNCONFIRMED_QSO_DATE_RANGE.get('from', None)
     to_date = EXCLUDE_UNCONFIRMED_QSO_DATE_RANGE.get('to', None)
     if WORK_ON_UNCONFIRMED_QSO:
         logging.info('[DB] Removing unconfirmed log from blacklist...')
-        done_coll.delete_many({'confirmed': False})
+        delete_result = done_coll.delete_many({'confirmed': False})
+        deleted = bool(delete_result.deleted_count)
     elif not (from_date is None and to_date is None):
         def get_datetime(config_data: typing.Union[str, int, None], default: datetime) -> datetime:
             if config_data is None:
@@ -1185,7 +1721,67 @@ def init(sock: socket.socket, states: States):
         )
 
         if delete_result.deleted_count:
-            logging.info(f'[DB] Deleting unconfirmed logs from {from_date} to {to_date}: {delete_result.deleted_count} logs')
+            logging.info('[DB] Deleting unconfirmed logs from %s to %s: %s logs', from_date, to_date, delete_result.deleted_count)
+            deleted = True
+
+    return deleted
+
+def check_startup():
+    # Called from the receiving loop, so the result is applied in the same thread as process_wsjt
+    for name, future in list(STARTUP_TASKS.items()):
+        if not future.done():
+            continue
+        STARTUP_TASKS.pop(name)
+        try:
+            result = future.result()
+        except KeyboardInterrupt as e:
+            raise e
+        except:
+            logging.exception('[STARTUP] Failed to %s!', name.replace('_', ' '))
+            result = None
+
+        if name == 'load_static_data':
+            if result is None:
+                raise RuntimeError('Static data is required to process decodes')
+            set_static_data(result)
+            logging.info('[STARTUP] %s valid callsigns loaded', len(valid_callsign))
+        elif name == 'update_blacklist' and result:
+            remove_rejected(reason='worked')
+        logging.info('[STARTUP] %s done after %.2f s', name, time.perf_counter() - LOCAL_STATES['started'])
+
+        if not STARTUP_TASKS:
+            LOCAL_STATES['admission_ready'] = True
+            logging.info('[STARTUP] Adding new callsign to queue after %.2f s', time.perf_counter() - LOCAL_STATES['started'])
+
+def init(sock: socket.socket, states: States):
+    global RESTART_SNAPSHOT
+
+    logging.info('Initializing...')
+    STAGES.begin('init')
+    LOCAL_STATES['started'] = time.perf_counter()
+    now = CLOCK.now()
+    states.r.flushdb()
+    states.new_grid = NEW_GRID
+    states.new_dxcc = NEW_DXCC
+    states.min_db = MIN_DB
+    states.num_inactive_before_cut = NUM_INACTIVE_BEFORE_CUT
+    states.num_tries_call_busy = NUM_TRIES_CALL_BUSY
+    states.num_disable_transmit = NUM_DISABLE_TRANSMIT
+    states.max_tries = MAX_TRIES
+    STAGES.mark('states')
+
+    done_coll.update_many({'logScript': True, 'timestamp': {'$lte': now - 15*60}}, {'$unset': {'logScript': ''}})
+    STAGES.mark('log_script')
+    if WARM_RESTART_TIME:
+        RESTART_SNAPSHOT = load_snapshot(now)
+    else:
+        call_coll.delete_many({})
+        remove_messages({})
+    STAGES.mark('queue')
+
+    if REJECTED_CACHE_TIME:
+        load_rejected(CLOCK.now())
+    STAGES.mark('rejected')
     
     if MULTICAST:
         sock.bind(('', WSJTX_PORT))
@@ -1195,24 +1791,69 @@ def init(sock: socket.socket, states: States):
         sock.bind((WSJTX_IP, WSJTX_PORT))
 
     states.receiver_started = True
-    
+    logging.info('[STARTUP] Listening after %.2f s', time.perf_counter() - LOCAL_STATES['started'])
+
+    STARTUP_TASKS['load_static_data'] = STARTUP_POOL.submit(static_data.get)
+    STARTUP_TASKS['update_blacklist'] = STARTUP_POOL.submit(update_blacklist)
+    STAGES.end('listen')
+
     logging.info('Done Initializing!')
 
+def start_metrics(sock: socket.socket):
+    port = sock.getsockname()[1]
+    REGISTRY.counter(
+        'wsjt_filter_rejected_total', 'Decodes rejected by filter stage', ('stage',),
+        lambda: {(k,): v for k, v in FILTER_COUNTER.items() if k != 'decode'}
+    )
+    REGISTRY.counter(
+        'wsjt_udp_drops_total', 'Datagrams from WSJT-X dropped by the kernel because receiver was behind', (),
+        lambda: {(): udp_socket_stats(port)['drops']}
+    )
+    REGISTRY.gauge(
+        'wsjt_udp_receive_queue_bytes', 'Bytes from WSJT-X waiting in the socket to be read by receiver', (),
+        lambda: {(): udp_socket_stats(port)['receive_queue']}
+    )
+    REGISTRY.gauge(
+        'wsjt_message_pending', 'Changed messages waiting to be written to database', (),
+        lambda: {(): len(MESSAGE_DIRTY)}
+    )
+    if isinstance(call_coll, TrackedQueue):
+        call_coll.reload()
+        REGISTRY.gauge(
+            'wsjt_queue_entries', 'Entries in queue by importance, including expired, tried, spam and other bands', ('importance',),
+            call_coll.tiers
+        )
+    DB_STATS.latency = REGISTRY.histogram('wsjt_db_seconds', 'Time of MongoDB and Redis commands', ('backend',))
+    serve(RECEIVER_METRICS_PORT, METRICS_HOST)
+
 def main(sock: socket.socket, states_list: typing.Dict[str, States]):
     global IP_LOCK
 
+    DB_STATS.process = 'receiver'
+    if RECEIVER_METRICS_PORT:
+        start_metrics(sock)
     ip_from = None
     socks = [sock]
+    capture = CaptureWriter(CAPTURE_LOCATION) if CAPTURE_LOCATION else None
 
     init(sock, states_list[''])
 
     while True:
         try:
+            if STARTUP_TASKS:
+                check_startup()
             t = select.select(socks, [], [], 0.5)
             fds, _, _ = typing.cast(typing.Tuple[typing.List[socket.socket], list, list], t)
+            if not fds and capture:
+                capture.flush()
+            if not fds and (EXPIRED_TIME or RELEASE_FROM_SPAM_TIME):
+                now = CLOCK.now()
+                if now - LOCAL_STATES['compacted'] >= COMPACT_INTERVAL:
+                    compact_queue(now)
             for fdin in fds:
                 _data, ip_from = fdin.recvfrom(1024)
                 if IP_LOCK and (IP_LOCK[0] != ip_from[0] or IP_LOCK[1] != ip_from[1]):
+                    DROPPED.inc(('ip_lock',))
                     continue
                 if not IP_LOCK:
                     IP_LOCK = [ip_from[0], ip_from[1]]
@@ -1223,31 +1864,40 @@ def main(sock: socket.socket, states_list: typing.Dict[str, States]):
                     states_list[''].enable_monitoring()
                     states_list[''].change_frequency((MAX_FREQUENCY+MIN_FREQUENCY)//2)
                     states_list[''].use_RR73()
+                if capture:
+                    capture.write(CLOCK.now(), _data)
                 process_wsjt(_data, ip_from, states_list[''])
         except KeyboardInterrupt:
             logging.exception('User interrupt here!')
             states_list[''].receiver_started = False
-            call_coll.delete_many({})
-            message_coll.delete_many({})
+            if WARM_RESTART_TIME and LOCAL_STATES['states_completed']:
+                flush_messages(wait=True)
+                save_snapshot(states_list[''], CLOCK.now())
+            else:
+                call_coll.delete_many({})
+                remove_messages({})
             break
         except:
             logging.exception('Something not right!')
             states_list[''].receiver_started = False
-            call_coll.delete_many({})
-            message_coll.delete_many({})
+            if WARM_RESTART_TIME and LOCAL_STATES['states_completed']:
+                flush_messages(wait=True)
+                save_snapshot(states_list[''], CLOCK.now())
+            else:
+                call_coll.delete_many({})
+                remove_messages({})
             break
+
+    STARTUP_POOL.shutdown(wait=False, cancel_futures=True)
+    MESSAGE_POOL.shutdown()
+    if capture:
+        capture.close()
     
 if __name__ == '__main__':
-    file_handlers = handlers.RotatingFileHandler(os.path.join(CURRENT_DIR, 'log', 'receiver.log'), maxBytes=10*1024*1024, backupCount=5)
+    file_handlers = BatchRotatingFileHandler(os.path.join(CURRENT_DIR, 'log', 'receiver.log'), maxBytes=10*1024*1024, backupCount=5)
     file_handlers.setLevel(logging.DEBUG if DEBUGGING else logging.INFO)
-    stream_handlers = logging.StreamHandler()
+    stream_handlers = BatchStreamHandler()
     stream_handlers.setLevel(logging.DEBUG if DEBUGGING else logging.INFO)
-    logging.basicConfig(
-        format='[%(asctime)s] [%(levelname)s] %(message)s',
-        level=logging.DEBUG,
-        handlers=[
-            file_handlers,
-            stream_handlers
-        ])
+    start_logging(file_handlers, stream_handlers)
     
     main(sock_wsjt, STATES_LIST)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import bisect, json, logging, time, typing
+
+# Upper bounds of histogram buckets in seconds, the last bucket has no upper bound
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Histogram(object):
+    __slots__ = ('counts', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0]*(len(BUCKETS) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, p: float) -> float:
+        # Upper bound of the bucket holding the percentile, the maximum for the last bucket
+        rank = p*self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                return min(BUCKETS[i], self.maximum) if i < len(BUCKETS) else self.maximum
+        return 0.0
+
+class StageTimer(object):
+    """Time spent in every stage of a packet, kept as histogram per packet kind and stage
+
+    mark(stage) gives the time since the previous mark to the stage, so the stages of a packet add up to its total
+    """
+
+    def __init__(self, slow_threshold: float, slow_location: str = ''):
+        self.slow_threshold = slow_threshold
+        self.slow_location = slow_location
+        self.histograms: typing.Dict[typing.Tuple[str, str], Histogram] = {}
+        self.kind = ''
+        self.message = ''
+        self.stages: typing.Dict[str, float] = {}
+        self.started = 0.0
+        self.last = 0.0
+
+    def begin(self, kind: str = ''):
+        self.kind = kind
+        self.message = ''
+        self.stages = {}
+        self.started = self.last = time.perf_counter()
+
+    def label(self, packet: typing.Any):
+        self.kind = type(packet).__name__[2:].lower()
+        self.message = getattr(packet, 'Message', '') or ''
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def end(self, stage: str = 'handle'):
+        self.mark(stage)
+        total = self.last - self.started
+        for name, seconds in self.stages.items():
+            self.histogram(self.kind, name).add(seconds)
+        self.histogram(self.kind, 'total').add(total)
+        if total >= self.slow_threshold:
+            self.write_slow(total)
+
+    def histogram(self, kind: str, stage: str) -> Histogram:
+        key = (kind, stage)
+        histogram = self.histograms.get(key, None)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def write_slow(self, total: float):
+        record = json.dumps({
+            'time': time.time(),
+            'kind': self.kind,
+            'message': self.message,
+            'total_ms': round(total*1000, 3),
+            'stages_ms': {k: round(v*1000, 3) for k, v in sorted(self.stages.items(), key=lambda s: -s[1])}
+        })
+        if not self.slow_location:
+            logging.warning('[SLOW PACKET] %s', record)
+            return
+        try:
+            with open(self.slow_location, 'a') as f:
+                f.write(record + '\n')
+        except OSError:
+            logging.exception('Failed to write slow packet!')
+
+    def summary(self) -> str:
+        lines = []
+        for kind in sorted({k for k, _ in self.histograms}):
+            total = self.histograms[(kind, 'total')]
+            stages = sorted(
+                [(s, h) for (k, s), h in self.histograms.items() if k == kind and s != 'total'],
+                key=lambda s: -s[1].total
+            )
+            lines.append(
+                f'{kind.upper()}: {total.count} packets, mean {1000*total.total/max(total.count, 1):.2f} ms, '
+                f'p95 {1000*total.percentile(0.95):.2f} ms, max {1000*total.maximum:.2f} ms | ' +
+                ' | '.join(
+                    f'{s} {100*h.total/max(total.total, 1e-9):.0f}% p95 {1000*h.percentile(0.95):.2f} ms'
+                    for s, h in stages
+                )
+            )
+        return '\n'.join(lines)
+
+class NullStageTimer(StageTimer):
+    """Used when STAGE_TIMING is disabled, every call does nothing"""
+
+    def __init__(self):
+        super().__init__(float('inf'))
+
+    def begin(self, kind: str = ''):
+        pass
+
+    def label(self, packet: typing.Any):
+        pass
+
+    def mark(self, stage: str):
+        pass
+
+    def end(self, stage: str = 'handle'):
+        pass
+
+    def summary(self) -> str:
+        return ''
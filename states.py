@@ -2,6 +2,8 @@ import json, redis, socket, wsjtx
 
 from enum import Enum
 
+from db_stats import instrument_redis
+
 TIMING = {
     'FT4': {
         'half': 7.5,
@@ -21,7 +23,7 @@ class States(object):
     
     def __init__(self, redis_host: str = '127.0.0.1', redis_port: int = 6379, multicast: bool = False):
         
-        self.r = redis.Redis(host=redis_host, port=redis_port, db=0, decode_responses=True)
+        self.r = instrument_redis(redis.Redis(host=redis_host, port=redis_port, db=0, decode_responses=True))
 
         if multicast:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
@@ -413,6 +415,11 @@ class States(object):
 
         self.sock.sendto(packet.raw(), (self.ip, self.port))
 
+    def replay(self):
+        packet = wsjtx.WSReplay()
+
+        self.sock.sendto(packet.raw(), (self.ip, self.port))
+
     def enable_monitoring(self):
         packet = wsjtx.WSEnableTx()
         packet.NewTxMsgIdx = 11
@@ -0,0 +1,146 @@
+import csv, hashlib, json, mmap, os, pickle, threading, time, typing
+
+from config import CTY_LOCATION, COUNTRY_TO_DXCC_LOCATION, DXCC_PRIORITY, DXCC_VIP, VALID_CALLSIGN_LOCATION, STATIC_DATA_LOCATION
+
+# Change this when the content of snapshot is changed
+STATIC_DATA_VERSION = 1
+
+STATIC_DATA: typing.Optional[dict] = None
+STATIC_DATA_LOCK = threading.Lock()
+
+def source_files() -> typing.Dict[str, str]:
+    return {
+        'cty': CTY_LOCATION,
+        'country_to_dxcc': COUNTRY_TO_DXCC_LOCATION,
+        'priority_country': DXCC_PRIORITY,
+        'vip_dxcc': DXCC_VIP,
+        'valid_callsign': VALID_CALLSIGN_LOCATION
+    }
+
+def file_signature(filename: str) -> typing.Optional[typing.Tuple[int, int]]:
+    # Missing file is a valid source, same as before when it's read with try except
+    if not filename or not os.path.exists(filename):
+        return None
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+def file_hash(filename: str) -> typing.Optional[str]:
+    if not filename or not os.path.exists(filename):
+        return None
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024*1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def compile_static_data() -> dict:
+    from pyhamtools import LookupLib, Callinfo
+
+    data = {'call_info': Callinfo(LookupLib(filename=CTY_LOCATION))}
+
+    with open(COUNTRY_TO_DXCC_LOCATION) as f:
+        data['country_to_dxcc'] = json.load(f)
+
+    data['priority_country'] = {}
+    if DXCC_PRIORITY:
+        with open(DXCC_PRIORITY) as f:
+            priority_country_list = f.read().splitlines()
+            length_priority_country_list = len(priority_country_list)
+            data['priority_country'] = dict(
+                [
+                    (
+                        d,
+                        0.5-i/(2*length_priority_country_list+1)
+                    ) for i,d in enumerate(priority_country_list, start=1)
+                ]
+            )
+
+    data['vip_dxcc'] = []
+    if DXCC_VIP:
+        with open(DXCC_VIP) as f:
+            data['vip_dxcc'] = f.read().splitlines()
+
+    data['valid_callsign'] = set()
+    if VALID_CALLSIGN_LOCATION:
+        try:
+            with open(VALID_CALLSIGN_LOCATION) as f:
+                for r in csv.reader(f):
+                    data['valid_callsign'].add(r[0])
+        except KeyboardInterrupt as e:
+            raise e
+        except:
+            pass
+
+    return data
+
+def build(location: str = STATIC_DATA_LOCATION) -> dict:
+    sources = {
+        k: {'filename': v, 'signature': file_signature(v), 'hash': file_hash(v)}
+        for k, v in source_files().items()
+    }
+    snapshot = {
+        'version': STATIC_DATA_VERSION,
+        'sources': sources,
+        'data': compile_static_data()
+    }
+
+    # Write to temporary file first, so other process never load half written snapshot
+    temp_location = f'{location}.{os.getpid()}.tmp'
+    with open(temp_location, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_location, location)
+
+    return snapshot
+
+def is_valid(snapshot: dict) -> bool:
+    if snapshot.get('version', None) != STATIC_DATA_VERSION:
+        return False
+
+    files = source_files()
+    if set(files) != set(snapshot['sources']):
+        return False
+
+    for k, filename in files.items():
+        source = snapshot['sources'][k]
+        if source['filename'] != filename:
+            return False
+        if source['signature'] == file_signature(filename):
+            continue
+        # Only the modified time changed, like after copying the file
+        if source['hash'] is None or source['hash'] != file_hash(filename):
+            return False
+
+    return True
+
+def load(location: str = STATIC_DATA_LOCATION) -> dict:
+    snapshot = None
+    try:
+        with open(location, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            snapshot = pickle.loads(m)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        pass
+
+    if snapshot is None or not is_valid(snapshot):
+        snapshot = build(location)
+
+    return snapshot['data']
+
+def get() -> dict:
+    global STATIC_DATA
+
+    with STATIC_DATA_LOCK:
+        if STATIC_DATA is None:
+            STATIC_DATA = load()
+        return STATIC_DATA
+
+if __name__ == '__main__':
+    print('Compiling static data...')
+    start = time.perf_counter()
+    snapshot = build()
+    print(f'Compiled in {time.perf_counter() - start:.2f} s: {STATIC_DATA_LOCATION}')
+    for k, v in snapshot['sources'].items():
+        print(f'{k:<20} {v["filename"]} {"missing" if v["hash"] is None else v["hash"][:12]}')
+
+    start = time.perf_counter()
+    load()
+    print(f'Loaded in {time.perf_counter() - start:.3f} s')
@@ -1,12 +1,15 @@
-import time, typing
-from datetime import datetime
+import typing
 from pymongo import MongoClient
 from states import States
+from clock import Clock
 from config import *
+from db_stats import STATS as DB_STATS, mongo_listeners
+from metrics import REGISTRY, serve
+from qso_trace import NullQsoTracer, QsoTracer
 import logging
-from logging import handlers
+from handler import BatchRotatingFileHandler, BatchStreamHandler, start_logging
 
-mongo_client = MongoClient(MONGO_HOST, MONGO_PORT)
+mongo_client = MongoClient(MONGO_HOST, MONGO_PORT, event_listeners=mongo_listeners())
 db = mongo_client.wsjt
 call_coll = db.calls
 hold_coll = db.holds
@@ -19,6 +22,17 @@ STATES_LIST: typing.Dict[str, States] = {
 
 IS_EVEN = None
 
+# Replaced when captured packets are replayed, see benchmarks/replay.py
+CLOCK: Clock = Clock()
+
+# Served on TRANSMITTER_METRICS_PORT, latency is from the decode of the message to the reply
+REPLY_LATENCY = REGISTRY.histogram(
+    'wsjt_reply_seconds', 'Time from decode to reply', ('mode',), (1.0, 2.5, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0)
+)
+
+# Replies are added to the trace of the queue, does nothing unless QSO_TRACE_LOCATION is set
+TRACE: QsoTracer = QsoTracer(QSO_TRACE_LOCATION) if QSO_TRACE_LOCATION else NullQsoTracer()
+
 def calculate_best_frequency(freq: list) -> int:
 
     d = sorted(set(freq))
@@ -33,6 +47,13 @@ def calculate_best_frequency(freq: list) -> int:
     
     return curr_best
 
+def queue_filter(now: float) -> list:
+    # Expired and released from spam are written by receiver only once in a while, so check the time here
+    return [
+        {'$or': [{'expiresAt': None}, {'expiresAt': {'$gt': now}}, {'importance': {'$gte': 2}}]},
+        {'$or': [{'isSpam': False}, {'spamUntil': {'$lte': now}}]}
+    ]
+
 def replying(states: States, CURRENT_DATA: dict, txOdd: bool, renew_frequency: bool = True) -> bool:
 
     if txOdd:
@@ -46,7 +67,11 @@ def replying(states: States, CURRENT_DATA: dict, txOdd: bool, renew_frequency: b
     states.current_callsign = CURRENT_DATA['callsign']
     states.reply(CURRENT_DATA, best_frequency, CURRENT_DATA.get('skipGrid', True), txOdd)
     states.transmit_phase = True
-    logging.info('Replying to: '+CURRENT_DATA['callsign'])
+    if 'timestamp' in CURRENT_DATA:
+        REPLY_LATENCY.observe(CLOCK.now() - CURRENT_DATA['timestamp'], (CURRENT_DATA['mode'],))
+    if 'traceId' in CURRENT_DATA:
+        TRACE.write(CURRENT_DATA['traceId'], CLOCK.now(), 'reply', CURRENT_DATA.get('nextTx', None))
+    logging.info('Replying to: %s', CURRENT_DATA['callsign'])
     return True
 
 def transmitting(now: float, states: States):
@@ -55,7 +80,7 @@ def transmitting(now: float, states: States):
     if states.transmit_phase:
         states.enable_monitoring()
         states.transmit_phase = False
-        time.sleep(0.5)
+        CLOCK.sleep(0.5)
         return
 
     STATES_LIST_LOCAL = states.get_states(
@@ -72,7 +97,7 @@ def transmitting(now: float, states: States):
             'band': STATES_LIST_LOCAL['band'],
             'expired': False,
             'tried': False,
-            'isSpam': False},
+            '$and': queue_filter(now)},
             sort=states.sort_by) or {}
     else:
         CURRENT_DATA = call_coll.find_one({
@@ -80,7 +105,7 @@ def transmitting(now: float, states: States):
             'band': STATES_LIST_LOCAL['band'],
             'expired': False,
             'tried': False,
-            'isSpam': False,
+            '$and': queue_filter(now),
             'isEven': IS_EVEN},
             sort=states.sort_by) or {}
     
@@ -107,7 +132,7 @@ def transmitting(now: float, states: States):
         IS_EVEN,
         STATES_LIST_LOCAL['tries']%STATES_LIST_LOCAL['max_tries_change_freq'] == 0
     )
-    time.sleep(TIMING[CURRENT_DATA['mode']]['half']/2)
+    CLOCK.sleep(TIMING[CURRENT_DATA['mode']]['half']/2)
 
 def init(states: States):
     logging.info('Initializing...')
@@ -119,10 +144,14 @@ def init(states: States):
 def main(states_list: typing.Dict[str, States]):
     global IS_EVEN
     
+    DB_STATS.process = 'transmitter'
+    if TRANSMITTER_METRICS_PORT:
+        DB_STATS.latency = REGISTRY.histogram('wsjt_db_seconds', 'Time of MongoDB and Redis commands', ('backend',))
+        serve(TRANSMITTER_METRICS_PORT, METRICS_HOST)
     logging.info('Waiting for receiver receive heartbeat...')
     while not states_list[''].receiver_started:
-        now = datetime.now().timestamp()
-        time.sleep(0.5)
+        now = CLOCK.now()
+        CLOCK.sleep(0.5)
 
     init(states_list[''])
     while True:
@@ -135,12 +164,15 @@ def main(states_list: typing.Dict[str, States]):
                 raise ValueError('WSJT-X Closed!')
             if not states_list_local['receiver_started']:
                 raise ValueError('Receiver Stopped!')
-            now = datetime.now().timestamp()
+            now = CLOCK.now()
             if now%TIMING['FT8']['half'] < TIMING['FT8']['half'] - 0.2:
-                time.sleep(0.02)
+                CLOCK.sleep(0.02)
                 continue
+            DB_STATS.report(now//TIMING['FT8']['half']*TIMING['FT8']['half'])
+            DB_STATS.begin('transmitting')
             transmitting(now, states_list[''])
-            time.sleep(0.5)
+            DB_STATS.end()
+            CLOCK.sleep(0.5)
         except KeyboardInterrupt:
             states_list[''].transmitter_started = False
             states_list[''].transmit_phase = False
@@ -162,16 +194,10 @@ def main(states_list: typing.Dict[str, States]):
             break
 
 if __name__ == '__main__':
-    file_handlers = handlers.RotatingFileHandler(os.path.join(CURRENT_DIR, 'log', 'transmitter.log'), maxBytes=10*1024*1024, backupCount=5)
+    file_handlers = BatchRotatingFileHandler(os.path.join(CURRENT_DIR, 'log', 'transmitter.log'), maxBytes=10*1024*1024, backupCount=5)
     file_handlers.setLevel(logging.INFO)
-    stream_handlers = logging.StreamHandler()
+    stream_handlers = BatchStreamHandler()
     stream_handlers.setLevel(logging.DEBUG if DEBUGGING else logging.INFO)
-    logging.basicConfig(
-        format='[%(asctime)s] [%(levelname)s] %(message)s',
-        level=logging.DEBUG,
-        handlers=[
-            file_handlers,
-            stream_handlers
-        ])
+    start_logging(file_handlers, stream_handlers)
     
     main(STATES_LIST)
\ No newline at end of file
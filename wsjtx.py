@@ -99,6 +99,14 @@ class _WSPacket:
     self._encode()
     return self._packet[:self._index]
 
+  def _reserve(self, size):
+    # Statuses and ADIF can be longer than the initial buffer
+    if self._index + size <= len(self._packet):
+      return
+    packet = ctypes.create_string_buffer(max(2*len(self._packet), self._index + size))
+    ctypes.memmove(packet, self._packet, self._index)
+    self._packet = packet
+
   def _decode(self):
     # in here depending on the Packet Type we create the class to handle the packet!
     magic, schema, pkt_type = SHEAD.unpack_from(self._packet)
@@ -133,15 +141,14 @@ class _WSPacket:
     return string.decode('utf-8')
 
   def _set_string(self, string):
-    fmt = ''
     if string is None:
-      string = b''
-      length = -1
-    else:
-      string = string.encode('utf-8')
-      length = len(string)
+      self._set_int32(-1)
+      return
 
+    string = string.encode('utf-8')
+    length = len(string)
     fmt = '!i{:d}s'.format(length)
+    self._reserve(struct.calcsize(fmt))
     struct.pack_into(fmt, self._packet, self._index, length, string)
     self._index += struct.calcsize(fmt)
 
@@ -154,12 +161,20 @@ class _WSPacket:
       time_offset = self._get_int32()
     return (date_off, time_off, time_spec, time_offset)
 
+  def _set_datetime(self, date_off, time_off, time_spec, time_offset):
+    self._set_longlong(date_off)
+    self._set_uint32(time_off)
+    self._set_byte(time_spec)
+    if time_spec == 2:
+      self._set_int32(time_offset)
+
   def _get_data(self, fmt):
     data, *_ = struct.unpack_from(fmt, self._packet, self._index)
     self._index += struct.calcsize(fmt)
     return data
 
   def _set_data(self, fmt, value):
+    self._reserve(struct.calcsize(fmt))
     struct.pack_into(fmt, self._packet, self._index, value)
     self._index += struct.calcsize(fmt)
 
@@ -353,110 +368,243 @@ class WSStatus(_WSPacket):
     self._data['GenMsg'] = self._get_string()
     self._data['TxHaltClicked'] = self._get_bool()
 
+  def _encode(self):
+    super()._encode()
+    self._set_longlong(self._data.get('Frequency', 0))
+    self._set_string(self._data.get('Mode', 'FT8'))
+    self._set_string(self._data.get('DXCall', ''))
+    self._set_string(self._data.get('Report', ''))
+    self._set_string(self._data.get('TXMode', self._data.get('Mode', 'FT8')))
+    self._set_bool(self._data.get('TXEnabled', False))
+    self._set_bool(self._data.get('Transmitting', False))
+    self._set_bool(self._data.get('Decoding', False))
+    self._set_uint32(self._data.get('RXdf', 1500))
+    self._set_uint32(self._data.get('TXdf', 1500))
+    self._set_string(self._data.get('DeCall', ''))
+    self._set_string(self._data.get('DeGrid', ''))
+    self._set_string(self._data.get('DXGrid', ''))
+    self._set_bool(self._data.get('TXWatchdog', False))
+    self._set_string(self._data.get('SubMode', ''))
+    self._set_bool(self._data.get('Fastmode', False))
+    self._set_byte(self._data.get('SpecialOPMode', 0))
+    self._set_uint32(self._data.get('FrequencyTolerance', 0xffffffff))
+    self._set_uint32(self._data.get('TRPeriod', 0xffffffff))
+    self._set_string(self._data.get('ConfigName', 'Default'))
+    self._set_string(self._data.get('LastTxMsg', ''))
+    self._set_uint32(self._data.get('QSOProgress', 0))
+    self._set_bool(self._data.get('TxEven', False))
+    self._set_bool(self._data.get('CQOnly', False))
+    self._set_string(self._data.get('GenMsg', ''))
+    self._set_bool(self._data.get('TxHaltClicked', False))
+
   @property
   def Frequency(self) -> int:
     return self._data['Frequency']
 
+  @Frequency.setter
+  def Frequency(self, val):
+    self._data['Frequency'] = int(val)
+
   @property
   def Mode(self) -> str:
     return self._data['Mode']
 
+  @Mode.setter
+  def Mode(self, val):
+    self._data['Mode'] = val
+
   @property
   def DXCall(self) -> typing.Optional[str]:
     return self._data['DXCall']
 
+  @DXCall.setter
+  def DXCall(self, val):
+    self._data['DXCall'] = val
+
   @property
   def Report(self) -> str:
     return self._data['Report']
 
+  @Report.setter
+  def Report(self, val):
+    self._data['Report'] = val
+
   @property
   def TXMode(self) -> str:
     return self._data['TXMode']
 
+  @TXMode.setter
+  def TXMode(self, val):
+    self._data['TXMode'] = val
+
   @property
   def TXEnabled(self) -> bool:
     return self._data['TXEnabled']
 
+  @TXEnabled.setter
+  def TXEnabled(self, val):
+    self._data['TXEnabled'] = bool(val)
+
   @property
   def Transmitting(self) -> bool:
     return self._data['Transmitting']
 
+  @Transmitting.setter
+  def Transmitting(self, val):
+    self._data['Transmitting'] = bool(val)
+
   @property
   def Decoding(self) -> bool:
     return self._data['Decoding']
 
+  @Decoding.setter
+  def Decoding(self, val):
+    self._data['Decoding'] = bool(val)
+
   @property
   def RXdf(self) -> int:
     return self._data['RXdf']
 
+  @RXdf.setter
+  def RXdf(self, val):
+    self._data['RXdf'] = int(val)
+
   @property
   def TXdf(self) -> int:
     return self._data['TXdf']
 
+  @TXdf.setter
+  def TXdf(self, val):
+    self._data['TXdf'] = int(val)
+
   @property
   def DeCall(self) -> typing.Optional[str]:
     return self._data['DeCall']
 
+  @DeCall.setter
+  def DeCall(self, val):
+    self._data['DeCall'] = val
+
   @property
   def DeGrid(self) -> typing.Optional[str]:
     return self._data['DeGrid']
 
+  @DeGrid.setter
+  def DeGrid(self, val):
+    self._data['DeGrid'] = val
+
   @property
   def DXGrid(self) -> typing.Optional[str]:
     return self._data['DXGrid']
 
+  @DXGrid.setter
+  def DXGrid(self, val):
+    self._data['DXGrid'] = val
+
   @property
   def TXWatchdog(self) -> bool:
     return self._data['TXWatchdog']
 
+  @TXWatchdog.setter
+  def TXWatchdog(self, val):
+    self._data['TXWatchdog'] = bool(val)
+
   @property
   def SubMode(self) -> typing.Optional[str]:
     return self._data['SubMode']
 
+  @SubMode.setter
+  def SubMode(self, val):
+    self._data['SubMode'] = val
+
   @property
   def Fastmode(self) -> bool:
     return self._data['Fastmode']
 
+  @Fastmode.setter
+  def Fastmode(self, val):
+    self._data['Fastmode'] = bool(val)
+
   @property
   def SpecialOPMode(self) -> bytes:
     return self._data['SpecialOPMode']
 
+  @SpecialOPMode.setter
+  def SpecialOPMode(self, val):
+    self._data['SpecialOPMode'] = int(val)
+
   @property
   def FrequencyTolerance(self) -> int:
     return self._data['FrequencyTolerance']
 
+  @FrequencyTolerance.setter
+  def FrequencyTolerance(self, val):
+    self._data['FrequencyTolerance'] = int(val)
+
   @property
   def TRPeriod(self) -> int:
     return self._data['TRPeriod']
 
+  @TRPeriod.setter
+  def TRPeriod(self, val):
+    self._data['TRPeriod'] = int(val)
+
   @property
   def ConfigName(self) -> str:
     return self._data['ConfigName']
 
+  @ConfigName.setter
+  def ConfigName(self, val):
+    self._data['ConfigName'] = val
+
   @property
   def LastTxMsg(self) -> typing.Optional[str]:
     return self._data['LastTxMsg']
 
+  @LastTxMsg.setter
+  def LastTxMsg(self, val):
+    self._data['LastTxMsg'] = val
+
   @property
   def QSOProgress(self) -> int:
     return self._data['QSOProgress']
 
+  @QSOProgress.setter
+  def QSOProgress(self, val):
+    self._data['QSOProgress'] = int(val)
+
   @property
   def TxEven(self) -> bool:
     return self._data['TxEven']
 
+  @TxEven.setter
+  def TxEven(self, val):
+    self._data['TxEven'] = bool(val)
+
   @property
   def CQOnly(self) -> bool:
     return self._data['CQOnly']
 
+  @CQOnly.setter
+  def CQOnly(self, val):
+    self._data['CQOnly'] = bool(val)
+
   @property
   def GenMsg(self) -> typing.Optional[str]:
     return self._data['GenMsg']
 
+  @GenMsg.setter
+  def GenMsg(self, val):
+    self._data['GenMsg'] = val
+
   @property
   def TxHaltClicked(self) -> bool:
     return self._data['TxHaltClicked']
 
+  @TxHaltClicked.setter
+  def TxHaltClicked(self, val):
+    self._data['TxHaltClicked'] = bool(val)
+
 
 class WSDecode(_WSPacket):
   """Packet Type 2  Decode  (Out)"""
@@ -477,6 +625,18 @@ class WSDecode(_WSPacket):
     self._data['LowConfidence'] = self._get_bool()
     self._data['OffAir'] = self._get_bool()
 
+  def _encode(self):
+    super()._encode()
+    self._set_bool(self._data.get('New', True))
+    self._set_uint32(self.Time)
+    self._set_int32(self.SNR)
+    self._set_double(self._data.get('DeltaTime', 0.0))
+    self._set_uint32(self.DeltaFrequency)
+    self._set_string(self._data.get('Mode', '~'))
+    self._set_string(self.Message)
+    self._set_bool(self._data.get('LowConfidence', False))
+    self._set_bool(self._data.get('OffAir', False))
+
   def __repr__(self):
     keys = [
       'New',
@@ -508,38 +668,74 @@ class WSDecode(_WSPacket):
   def New(self) -> bool:
     return self._data['New']
 
+  @New.setter
+  def New(self, val):
+    self._data['New'] = bool(val)
+
   @property
   def Time(self) -> int:
     return self._data['Time']
 
+  @Time.setter
+  def Time(self, val):
+    self._data['Time'] = int(val)
+
   @property
   def SNR(self) -> int:
     return self._data['SNR']
 
+  @SNR.setter
+  def SNR(self, val):
+    self._data['SNR'] = int(val)
+
   @property
   def DeltaTime(self) -> float:
     return self._data['DeltaTime']
 
+  @DeltaTime.setter
+  def DeltaTime(self, val):
+    self._data['DeltaTime'] = float(val)
+
   @property
   def DeltaFrequency(self) -> int:
     return self._data['DeltaFrequency']
 
+  @DeltaFrequency.setter
+  def DeltaFrequency(self, val):
+    self._data['DeltaFrequency'] = int(val)
+
   @property
   def Mode(self) -> str:
     return self._data['Mode']
 
+  @Mode.setter
+  def Mode(self, val):
+    self._data['Mode'] = val
+
   @property
   def Message(self) -> str:
     return self._data['Message']
 
+  @Message.setter
+  def Message(self, val):
+    self._data['Message'] = val
+
   @property
   def LowConfidence(self) -> bool:
     return self._data['LowConfidence']
 
+  @LowConfidence.setter
+  def LowConfidence(self, val):
+    self._data['LowConfidence'] = bool(val)
+
   @property
   def OffAir(self) -> bool:
     return self._data['OffAir']
 
+  @OffAir.setter
+  def OffAir(self, val):
+    self._data['OffAir'] = bool(val)
+
 
 class WSClear(_WSPacket):
   """Packet Type 3  Clear (Out/In)"""
@@ -601,6 +797,17 @@ class WSReply(_WSPacket):
     self._set_bool(self._data.get('LowConfidence', False))
     self._set_byte(self._data.get('Modifiers', Modifiers.NoModifier.value))
 
+  def _decode(self):
+    super()._decode()
+    self._data['Time'] = self._get_uint32()
+    self._data['SNR'] = self._get_int32()
+    self._data['DeltaTime'] = round(self._get_double(), 3)
+    self._data['DeltaFrequency'] = self._get_uint32()
+    self._data['Mode'] = self._get_string()
+    self._data['Message'] = self._get_string()
+    self._data['LowConfidence'] = self._get_bool()
+    self._data['Modifiers'] = self._get_byte()
+
   @property
   def Time(self):
     return self._data.get('Time')
@@ -697,74 +904,156 @@ class WSLogged(_WSPacket):
     self._data['TimeOnSpec'] = dt_tuple[2]
     self._data['TimeOnOffset'] = dt_tuple[3]
 
+  def _encode(self):
+    super()._encode()
+    self._set_datetime(self.DateOff, self.TimeOff, self._data.get('TimeOffSpec', 1), self._data.get('TimeOffOffset', 0))
+    self._set_string(self.DXCall)
+    self._set_string(self._data.get('DXGrid', ''))
+    self._set_longlong(self.DialFrequency)
+    self._set_string(self.Mode)
+    self._set_string(self._data.get('ReportSent', ''))
+    self._set_string(self._data.get('ReportReceived', ''))
+    self._set_string(self._data.get('TXPower', ''))
+    self._set_string(self._data.get('Comments', ''))
+    self._set_string(self._data.get('Name', ''))
+    self._set_datetime(self.DateOn, self.TimeOn, self._data.get('TimeOnSpec', 1), self._data.get('TimeOnOffset', 0))
+
   @property
   def DateOff(self):
     return self._data['DateOff']
 
+  @DateOff.setter
+  def DateOff(self, val):
+    self._data['DateOff'] = int(val)
+
   @property
   def TimeOff(self):
     return self._data['TimeOff']
 
+  @TimeOff.setter
+  def TimeOff(self, val):
+    self._data['TimeOff'] = int(val)
+
   @property
   def TimeOffSpec(self):
     return self._data['TimeOffSpec']
 
+  @TimeOffSpec.setter
+  def TimeOffSpec(self, val):
+    self._data['TimeOffSpec'] = int(val)
+
   @property
   def TimeOffOffset(self):
     return self._data['TimeOffOffset']
 
+  @TimeOffOffset.setter
+  def TimeOffOffset(self, val):
+    self._data['TimeOffOffset'] = int(val)
+
   @property
   def DXCall(self):
     return self._data['DXCall']
 
+  @DXCall.setter
+  def DXCall(self, val):
+    self._data['DXCall'] = val
+
   @property
   def DXGrid(self):
     return self._data['DXGrid']
 
+  @DXGrid.setter
+  def DXGrid(self, val):
+    self._data['DXGrid'] = val
+
   @property
   def DialFrequency(self):
     return self._data['DialFrequency']
 
+  @DialFrequency.setter
+  def DialFrequency(self, val):
+    self._data['DialFrequency'] = int(val)
+
   @property
   def Mode(self):
     return self._data['Mode']
 
+  @Mode.setter
+  def Mode(self, val):
+    self._data['Mode'] = val
+
   @property
   def ReportSent(self):
     return self._data['ReportSent']
 
+  @ReportSent.setter
+  def ReportSent(self, val):
+    self._data['ReportSent'] = val
+
   @property
   def ReportReceived(self):
     return self._data['ReportReceived']
 
+  @ReportReceived.setter
+  def ReportReceived(self, val):
+    self._data['ReportReceived'] = val
+
   @property
   def TXPower(self):
     return self._data['TXPower']
 
+  @TXPower.setter
+  def TXPower(self, val):
+    self._data['TXPower'] = val
+
   @property
   def Comments(self):
     return self._data['Comments']
 
+  @Comments.setter
+  def Comments(self, val):
+    self._data['Comments'] = val
+
   @property
   def Name(self):
     return self._data['Name']
 
+  @Name.setter
+  def Name(self, val):
+    self._data['Name'] = val
+
   @property
   def DateOn(self):
     return self._data['DateOn']
 
+  @DateOn.setter
+  def DateOn(self, val):
+    self._data['DateOn'] = int(val)
+
   @property
   def TimeOn(self):
     return self._data['TimeOn']
 
+  @TimeOn.setter
+  def TimeOn(self, val):
+    self._data['TimeOn'] = int(val)
+
   @property
   def TimeOnSpec(self):
     return self._data['TimeOnSpec']
 
+  @TimeOnSpec.setter
+  def TimeOnSpec(self, val):
+    self._data['TimeOnSpec'] = int(val)
+
   @property
   def TimeOnOffset(self):
     return self._data['TimeOnOffset']
 
+  @TimeOnOffset.setter
+  def TimeOnOffset(self, val):
+    self._data['TimeOnOffset'] = int(val)
+
 
 class WSClose(_WSPacket):
   """Packet Type 6 Close (Out/In)"""
@@ -795,12 +1084,16 @@ class WSHaltTx(_WSPacket):
   def __init__(self, pkt=None):
     super().__init__(pkt)
     self._packet_type = PacketType.HALTTX
-    self._data['mode'] = False
+    self._data.setdefault('mode', False)
 
   def _encode(self):
     super()._encode()
     self._set_bool(self._data['mode'])
 
+  def _decode(self):
+    super()._decode()
+    self._data['mode'] = self._get_bool()
+
   @property
   def mode(self):
     return self._data['mode']
@@ -823,6 +1116,11 @@ class WSFreeText(_WSPacket):
     self._set_string(self._data.get('text', ''))
     self._set_bool(self._data.get('send', True))
 
+  def _decode(self):
+    super()._decode()
+    self._data['text'] = self._get_string()
+    self._data['send'] = self._get_bool()
+
   @property
   def text(self):
     return self._data.get('text', '')
@@ -849,6 +1147,112 @@ class WSWSPRDecode(_WSPacket):
     super().__init__(pkt)
     self._packet_type = PacketType.WSPRDECODE
 
+  def _decode(self):
+    super()._decode()
+    self._data['New'] = self._get_bool()
+    self._data['Time'] = self._get_uint32()
+    self._data['SNR'] = self._get_int32()
+    self._data['DeltaTime'] = round(self._get_double(), 3)
+    self._data['Frequency'] = self._get_longlong()
+    self._data['Drift'] = self._get_int32()
+    self._data['Callsign'] = self._get_string()
+    self._data['Grid'] = self._get_string()
+    self._data['Power'] = self._get_int32()
+    self._data['OffAir'] = self._get_bool()
+
+  def _encode(self):
+    super()._encode()
+    self._set_bool(self._data.get('New', True))
+    self._set_uint32(self.Time)
+    self._set_int32(self.SNR)
+    self._set_double(self._data.get('DeltaTime', 0.0))
+    self._set_longlong(self.Frequency)
+    self._set_int32(self._data.get('Drift', 0))
+    self._set_string(self.Callsign)
+    self._set_string(self._data.get('Grid', ''))
+    self._set_int32(self._data.get('Power', 37))
+    self._set_bool(self._data.get('OffAir', False))
+
+  @property
+  def New(self) -> bool:
+    return self._data['New']
+
+  @New.setter
+  def New(self, val):
+    self._data['New'] = bool(val)
+
+  @property
+  def Time(self) -> int:
+    return self._data['Time']
+
+  @Time.setter
+  def Time(self, val):
+    self._data['Time'] = int(val)
+
+  @property
+  def SNR(self) -> int:
+    return self._data['SNR']
+
+  @SNR.setter
+  def SNR(self, val):
+    self._data['SNR'] = int(val)
+
+  @property
+  def DeltaTime(self) -> float:
+    return self._data['DeltaTime']
+
+  @DeltaTime.setter
+  def DeltaTime(self, val):
+    self._data['DeltaTime'] = float(val)
+
+  @property
+  def Frequency(self) -> int:
+    return self._data['Frequency']
+
+  @Frequency.setter
+  def Frequency(self, val):
+    self._data['Frequency'] = int(val)
+
+  @property
+  def Drift(self) -> int:
+    return self._data['Drift']
+
+  @Drift.setter
+  def Drift(self, val):
+    self._data['Drift'] = int(val)
+
+  @property
+  def Callsign(self) -> str:
+    return self._data['Callsign']
+
+  @Callsign.setter
+  def Callsign(self, val):
+    self._data['Callsign'] = val
+
+  @property
+  def Grid(self) -> str:
+    return self._data['Grid']
+
+  @Grid.setter
+  def Grid(self, val):
+    self._data['Grid'] = val
+
+  @property
+  def Power(self) -> int:
+    return self._data['Power']
+
+  @Power.setter
+  def Power(self, val):
+    self._data['Power'] = int(val)
+
+  @property
+  def OffAir(self) -> bool:
+    return self._data['OffAir']
+
+  @OffAir.setter
+  def OffAir(self, val):
+    self._data['OffAir'] = bool(val)
+
 class WSLocation(_WSPacket):
   """Packet Type 11 Location (In)"""
 
@@ -867,6 +1271,10 @@ class WSADIF(_WSPacket):
     super()._decode()
     self._data['ADIF'] = self._get_string()
 
+  def _encode(self):
+    super()._encode()
+    self._set_string(self.ADIF)
+
   def __str__(self):
     return ''.join(self._data['ADIF'].split('\n'))
 
@@ -883,6 +1291,10 @@ class WSADIF(_WSPacket):
   def ADIF(self):
     return self._data['ADIF']
 
+  @ADIF.setter
+  def ADIF(self, val):
+    self._data['ADIF'] = val
+
 
 class WSHighlightCallsign(_WSPacket):
   """
@@ -981,6 +1393,16 @@ class WSEnableTx(_WSPacket):
     self._set_string(self._data.get('CmdCheck', ''))
     self._set_uint32(self._data.get('Offset', 200))
     self._set_longlong(self._data.get('Frequency', 0))
+
+  def _decode(self):
+    super()._decode()
+    self._data['NewTxMsgIdx'] = self._get_uint32()
+    self._data['GenMsg'] = self._get_string()
+    self._data['SkipGrid'] = self._get_bool()
+    self._data['UseRR73'] = self._get_bool()
+    self._data['CmdCheck'] = self._get_string()
+    self._data['Offset'] = self._get_uint32()
+    self._data['Frequency'] = self._get_longlong()
   
   @property
   def NewTxMsgIdx(self):
@@ -1057,6 +1479,18 @@ class WSEnqueueDecode(_WSPacket):
     self._data['IsDX'] = self._get_bool()
     self._data['Modifier'] = self._get_bool()
 
+  def _encode(self):
+    super()._encode()
+    self._set_bool(self._data.get('AutoGen', False))
+    self._set_uint32(self.Time)
+    self._set_int32(self.SNR)
+    self._set_double(self._data.get('DeltaTime', 0.0))
+    self._set_uint32(self.DeltaFrequency)
+    self._set_string(self._data.get('Mode', '~'))
+    self._set_string(self.Message)
+    self._set_bool(self._data.get('IsDX', False))
+    self._set_bool(self._data.get('Modifier', False))
+
   def __repr__(self):
     keys = [
       'AutoGen',
@@ -1088,38 +1522,74 @@ class WSEnqueueDecode(_WSPacket):
   def AutoGen(self) -> bool:
     return self._data['AutoGen']
 
+  @AutoGen.setter
+  def AutoGen(self, val):
+    self._data['AutoGen'] = bool(val)
+
   @property
   def Time(self) -> int:
     return self._data['Time']
 
+  @Time.setter
+  def Time(self, val):
+    self._data['Time'] = int(val)
+
   @property
   def SNR(self) -> int:
     return self._data['SNR']
 
+  @SNR.setter
+  def SNR(self, val):
+    self._data['SNR'] = int(val)
+
   @property
   def DeltaTime(self) -> float:
     return self._data['DeltaTime']
 
+  @DeltaTime.setter
+  def DeltaTime(self, val):
+    self._data['DeltaTime'] = float(val)
+
   @property
   def DeltaFrequency(self) -> int:
     return self._data['DeltaFrequency']
 
+  @DeltaFrequency.setter
+  def DeltaFrequency(self, val):
+    self._data['DeltaFrequency'] = int(val)
+
   @property
   def Mode(self) -> str:
     return self._data['Mode']
 
+  @Mode.setter
+  def Mode(self, val):
+    self._data['Mode'] = val
+
   @property
   def Message(self) -> str:
     return self._data['Message']
 
+  @Message.setter
+  def Message(self, val):
+    self._data['Message'] = val
+
   @property
   def IsDX(self) -> bool:
     return self._data['IsDX']
 
+  @IsDX.setter
+  def IsDX(self, val):
+    self._data['IsDX'] = bool(val)
+
   @property
   def Modifier(self) -> bool:
     return self._data['Modifier']
 
+  @Modifier.setter
+  def Modifier(self, val):
+    self._data['Modifier'] = bool(val)
+
 def wstime2datetime(qtm):
   """wsjtx time containd the number of milliseconds since midnight"""
   tday_midnight = datetime.combine(datetime.utcnow(), datetime.min.time())
@@ -1130,6 +1600,10 @@ def datetime2wstime(dtime):
   tday_midnight = datetime.combine(datetime.utcnow(), datetime.min.time())
   return int((dtime - tday_midnight).total_seconds() * 1000)
 
+def datetime2wsdate(dtime):
+  """wsjtx date (QDate) contains the julian day number"""
+  return dtime.toordinal() + 1721425
+
 def ft8_decode(pkt):
   """Look at the packets header and return a class corresponding to the packet"""
   magic, _, pkt_type = SHEAD.unpack_from(pkt)
@@ -1144,8 +1618,13 @@ def ft8_decode(pkt):
     PacketType.REPLY.value: WSReply,
     PacketType.QSOLOGGED.value: WSLogged,
     PacketType.CLOSE.value: WSClose,
+    PacketType.REPLAY.value: WSReplay,
+    PacketType.HALTTX.value: WSHaltTx,
+    PacketType.FREETEXT.value: WSFreeText,
+    PacketType.WSPRDECODE.value: WSWSPRDecode,
     PacketType.LOGGEDADIF.value: WSADIF,
     PacketType.HIGHLIGHTCALLSIGN.value: WSHighlightCallsign,
+    PacketType.ENABLETX.value: WSEnableTx,
     PacketType.ENQUEUEDECODE.value: WSEnqueueDecode
   }
 